@@ -3,9 +3,15 @@ import threading
 import time
 import shutil
 import getpass
+import contextlib
+
+# Only used to start our own key agent (see run_agent).
+import subprocess  # nosec B404
+import sys
+from collections.abc import Mapping
+from typing import Any, Optional
+from itertools import islice
 from colorama import Fore, Style  # type: ignore
-import pyperclip  # type: ignore
-from zxcvbn import zxcvbn  # type: ignore
 
 from core.exceptions import (
     HIBPConnectionError,
@@ -13,12 +19,17 @@ from core.exceptions import (
     AuthenticationError,
     VaultMigrationRequired,
 )
-from core.vault import VaultManager
+from core.vault import VAULT_FORMAT, VaultManager
 from core.crypto import HarpocratesCrypto
 from core.generator import PasswordGenerator
-from core.importer import import_from_csv
-from core.auditor import PasswordAuditor
 from core.secure_memory import SecureString
+from core.batch import run_batch
+from core.saver import flush_all
+from core import profiler
+from core.agent import AgentClient, KeyAgent, default_socket_path
+from core.config import config
+from core.kdf import calibrate
+from core.compression import check_algorithm
 
 BANNER = r"""
     ██╗  ██╗ █████╗ ██████╗ ██████╗  ██████╗  ██████╗██████╗  █████╗ ████████╗███████╗███████╗
@@ -33,7 +44,7 @@ BANNER = r"""
     ------------------------------------------------------------------------------------------
 """
 
-INACTIVITY_TIMEOUT = 300  # 5 minutes
+INACTIVITY_TIMEOUT = config.inactivity_timeout  # 5 minutes by default
 last_activity_time = time.time()
 
 
@@ -51,10 +62,21 @@ def auto_lock_monitor() -> None:
                 + "\n[!] Session locked due to inactivity. Exiting for security."
                 + Style.RESET_ALL
             )
+            try:
+                # os._exit skips every cleanup, so write-behind changes go first.
+                flush_all()
+            except HarpocratesError as e:
+                print(Fore.RED + f"[!] Unsaved changes lost: {e}" + Style.RESET_ALL)
             os._exit(0)
 
 
+# Clipboard, strength meter, importer and HIBP client are imported by the
+# commands that use them, so the password prompt is not kept waiting on them.
+
+
 def secure_copy(data: str) -> None:
+    import pyperclip  # type: ignore
+
     try:
         pyperclip.copy(data)
         print("\n[i] Clipboard: data copied. It will be cleaned in 20 s.")
@@ -74,6 +96,8 @@ def secure_copy(data: str) -> None:
 
 
 def check_strength(pw: str) -> str:
+    from zxcvbn import zxcvbn  # type: ignore
+
     results = zxcvbn(pw)
     score = results["score"]
     if score < 3:
@@ -105,10 +129,11 @@ class CommandDispatcher:
         update_activity()
         cmd = self.commands.get(op)
         if cmd:
-            return cmd()
+            with profiler.command(cmd.__name__.removeprefix("cmd_")):
+                return cmd()
         return True  # Continue loop if invalid command
 
-    def entry_action_menu(self, entry: dict[str, str], index: int) -> bool:
+    def entry_action_menu(self, entry: Mapping[str, Any], index: int) -> bool:
         while True:
             update_activity()
             print(
@@ -145,14 +170,23 @@ class CommandDispatcher:
         return False
 
     def cmd_list(self) -> bool:
-        entries = self.vault.get_entries()
+        entries = self.vault.list_entries()
         print(f"\nID    | {'SERVICE':<40} | USERNAME")
         print("-" * 60)
-        for i, e in enumerate(entries):
-            print(f"{i:<4} | {e['title']:<40} | {e['username']}")
-        sel = input("\nID to manage (Enter to go back): ")
-        if sel.isdigit() and int(sel) < len(entries):
-            self.entry_action_menu(entries[int(sel)], int(sel))
+        page_size = 50
+        for page_no, page in enumerate(entries.pages(page_size)):
+            for i, e in enumerate(page, page_no * page_size):
+                print(f"{i:<4} | {e['title']:<40} | {e['username']}")
+            more = (page_no + 1) * page_size < len(entries)
+            prompt = "ID to manage, N for more (Enter to go back): "
+            sel = input(
+                "\n" + (prompt if more else "ID to manage (Enter to go back): ")
+            )
+            if more and sel.strip().lower() == "n":
+                continue
+            if sel.isdigit() and int(sel) < len(entries):
+                self.entry_action_menu(self.vault.get_entry(int(sel)), int(sel))
+            break
         return True
 
     def cmd_add(self) -> bool:
@@ -182,15 +216,15 @@ class CommandDispatcher:
         return True
 
     def cmd_search(self) -> bool:
-        q = input("Search: ").lower()
-        entries = self.vault.get_entries()
-        res = [(i, e) for i, e in enumerate(entries) if q in e["title"].lower()]
+        q = input("Search: ")
+        res = self.vault.search(q)
         for i, (idx, e) in enumerate(res):
-            print(f"[{i}] {e['title']}")
+            print(f"[{i}] {e['title']:<40} {e['username']}")
         if res:
             sel = input("Select ID: ")
             if sel.isdigit() and int(sel) < len(res):
-                self.entry_action_menu(res[int(sel)][1], res[int(sel)][0])
+                idx = res[int(sel)][0]
+                self.entry_action_menu(self.vault.get_entry(idx), idx)
         return True
 
     def cmd_generate(self) -> bool:
@@ -201,12 +235,17 @@ class CommandDispatcher:
         return True
 
     def cmd_import(self) -> bool:
-        path = input("CSV Path: ").strip('"')
+        from core.importer import import_file
+
+        path = input("Export path (.csv, Bitwarden .json, KeePass .xml): ").strip('"')
+        report = input("Report file for skipped rows (blank for none): ").strip('"')
         if input("Import? (y/n): ").lower() == "y":
-            qty, msg = import_from_csv(path, self.vault)
+            # Entries and the audit event are written in a single save.
+            with self.vault.transaction():
+                qty, msg = import_file(path, self.vault, report_path=report or None)
+                if qty > 0:
+                    self.vault.add_audit_event("IMPORT", f"Imported {qty} items")
             print(msg)
-            if qty > 0:
-                self.vault.add_audit_event("IMPORT", f"Imported {qty} items")
         return True
 
     def cmd_exit(self) -> bool:
@@ -216,51 +255,86 @@ class CommandDispatcher:
     def cmd_backup(self) -> bool:
         import os as os_mod
 
+        # A backup must be self-contained: fold pending journal records first.
+        self.vault.flush()
+        self.vault.compact_journal()
         bk = f"backup_{os_mod.urandom(6).hex()}.hpro"
-        shutil.copy("vault.hpro", bk)
+        shutil.copy(self.vault.vault_path, bk)
         if os.name == "posix":
             os.chmod(bk, 0o600)
+        if os.path.isdir(self.vault.log_archive.directory):
+            shutil.copytree(self.vault.log_archive.directory, bk + ".logs")
         self.vault.add_audit_event("BACKUP", f"Created {bk}")
         print(Fore.GREEN + f"[✓] Backup created securely: {bk}" + Style.RESET_ALL)
         return True
 
     def cmd_audit(self) -> bool:
-        logs = self.vault.get_logs()
         is_valid = self.vault.verify_log_integrity()
         status_color = Fore.GREEN if is_valid else Fore.RED
         status_text = "VALID" if is_valid else "COMPROMISED"
 
         print(
             Fore.CYAN
-            + f"\n--- FORENSIC LOG ({len(logs)}) [CHAIN: {status_color}{status_text}{Fore.CYAN}] ---"
+            + f"\n--- FORENSIC LOG ({self.vault.log_count()}) [CHAIN: {status_color}{status_text}{Fore.CYAN}] ---"
             + Style.RESET_ALL
         )
-        for log_entry in logs[:15]:
-            print(
-                f"{log_entry['timestamp']} | {log_entry['action']:<10} | {log_entry['details']}"
+        # Archived segments are decrypted only when paging reaches them.
+        records = self.vault.iter_logs()
+        while True:
+            try:
+                page = list(islice(records, 15))
+            except HarpocratesError as e:
+                print(Fore.RED + f"[!] Cannot read log archive: {e}" + Style.RESET_ALL)
+                page = []
+            for log_entry in page:
+                print(
+                    f"{log_entry['timestamp']} | {log_entry['action']:<10} | {log_entry['details']}"
+                )
+            more = "[N] Older / " if len(page) == 15 else ""
+            ans = input(
+                f"\n{more}[F] Full chain verification (background) / Enter to return: "
             )
-        input("\nPress Enter to return...")
-        return True
+            ans = ans.strip().lower()
+            if ans == "n" and more:
+                continue
+            if ans == "f":
+                self.vault.start_full_log_verification(self._report_full_verification)
+                print("[i] Verifying the whole history in the background...")
+            return True
+
+    @staticmethod
+    def _report_full_verification(is_valid: bool) -> None:
+        if is_valid:
+            print(Fore.GREEN + "\n[✓] Full audit chain verified." + Style.RESET_ALL)
+        else:
+            print(Fore.RED + "\n[!] Full audit chain is COMPROMISED." + Style.RESET_ALL)
 
     def cmd_hibp(self) -> bool:
-        print(
-            Fore.YELLOW
-            + "\n[!] Connecting to HaveIBeenPwned (K-Anonymity)..."
-            + Style.RESET_ALL
+        from core.auditor import BreachScanner, PasswordAuditor
+
+        backend = PasswordAuditor.get_backend()
+        source = (
+            "HaveIBeenPwned (K-Anonymity)" if backend.remote else "offline database"
+        )
+        print(Fore.YELLOW + f"\n[!] Checking against {source}..." + Style.RESET_ALL)
+        PasswordAuditor.use_persistent_cache(
+            self.vault.vault_path + ".hibpcache",
+            self.vault.derive_subkey("hibp-cache"),
         )
         try:
             entries = self.vault.get_entries()
             bad_count = 0
+            scanner = BreachScanner(backend)
+            pairs = ((i, e["password"]) for i, e in enumerate(entries))
 
-            for e in entries:
-                print(f"[*] Analyzing {e['title']}...", end="", flush=True)
-                c = PasswordAuditor.check_pwned(e["password"])
+            # Results stream in as each SHA-1 range completes, not in list order.
+            for done, (i, c) in enumerate(scanner.scan(pairs), 1):
+                print(f"[{done}/{len(entries)}] {entries[i]['title']}...", end="")
                 if c > 0:
                     print(Fore.RED + f" PWNED! ({c} times)" + Style.RESET_ALL)
                     bad_count += 1
                 else:
                     print(Fore.GREEN + " OK" + Style.RESET_ALL)
-                time.sleep(1.5)
 
             if bad_count > 0:
                 self.vault.add_audit_event(
@@ -279,6 +353,9 @@ class CommandDispatcher:
 
         except HIBPConnectionError as e:
             print(Fore.RED + f"\n[!] Network Error during scan: {e}" + Style.RESET_ALL)
+        finally:
+            # Ranges fetched before an error are still worth keeping.
+            PasswordAuditor.save_cache()
         return True
 
 
@@ -296,31 +373,59 @@ def _handle_new_vault(vault: VaultManager, crypto: HarpocratesCrypto) -> None:
     print(BANNER)
 
 
-def _authenticate_vault(vault: VaultManager) -> bool:
+def _apply_storage_settings(vault: VaultManager) -> None:
+    """
+    Applies VAULT_CODEC / VAULT_COMPRESSION when they are set explicitly;
+    otherwise the vault keeps what its header records, whatever the host.
+    """
+    if config.vault_compression and vault.compression != config.vault_compression:
+        # Only the index is compressed: takes effect on the next save.
+        vault.compression = check_algorithm(config.vault_compression)
+    if config.vault_codec is None or vault.payload_codec == config.vault_codec:
+        return
+    print(f"[*] Converting vault payload to {config.vault_codec}...")
+    vault.convert_payload(config.vault_codec)
+    vault.add_audit_event("SYSTEM", f"Vault payload converted to {config.vault_codec}")
+
+
+def _unlock(vault: VaultManager) -> None:
+    """Unlocks with the key agent when it holds the key, else asks for credentials."""
+    if vault.agent.available():
+        try:
+            vault.load_vault()
+            print("[*] Unlocked with the key agent.")
+            return
+        except AuthenticationError:
+            pass
+
     m_pass_raw = getpass.getpass("[?] Master Password: ")
     s_key_raw = getpass.getpass("[?] Secret Key: ")
+    with (
+        SecureString(m_pass_raw) as m_pass_sec,
+        SecureString(s_key_raw) as s_key_sec,
+    ):
+        vault.load_vault(m_pass_sec.decode("utf-8"), s_key_sec.decode("utf-8"))
 
-    try:
-        with (
-            SecureString(m_pass_raw) as m_pass_sec,
-            SecureString(s_key_raw) as s_key_sec,
-        ):
-            vault.load_vault(m_pass_sec.decode("utf-8"), s_key_sec.decode("utf-8"))
 
+def _authenticate_vault(vault: VaultManager) -> bool:
+    try:
+        _unlock(vault)
+        _apply_storage_settings(vault)
         vault.add_audit_event("LOGIN", "Access via CLI")
         print(Fore.GREEN + "\n[✓] Access Granted." + Style.RESET_ALL)
         return True
 
-    except VaultMigrationRequired:
+    except VaultMigrationRequired as e:
         print(
             Fore.YELLOW
-            + "\n[!] WARNING: Vault is using an older format (v1.x)."
+            + f"\n[!] WARNING: Vault is using an older format. {e}"
             + Style.RESET_ALL
         )
-        ans = input("Migrate vault to v2 format? (y/n): ")
+        ans = input(f"Migrate vault to v{VAULT_FORMAT} format? (y/n): ")
         if ans.lower() == "y":
-            vault.migrate_to_v2()
-            vault.add_audit_event("SYSTEM", "Vault migrated to v2.0.0 format")
+            vault.migrate()
+            vault.add_audit_event("SYSTEM", f"Vault migrated to v{VAULT_FORMAT} format")
+            _apply_storage_settings(vault)
             print(
                 Fore.GREEN
                 + "[✓] Migration successful. Access Granted."
@@ -347,6 +452,210 @@ def _authenticate_vault(vault: VaultManager) -> bool:
     return False
 
 
+def run_calibrate(target_ms: float, max_memory_mib: int) -> None:
+    """Benchmarks Argon2id here and offers to re-wrap the vault key with the result."""
+    print(f"[*] Calibrating Argon2id for a {target_ms:.0f} ms unlock...")
+    params, seconds = calibrate(target_ms / 1000, max_memory_mib * 1024)
+    print(f"[✓] {params.describe()}: {seconds * 1000:.0f} ms on this machine.")
+
+    vault = VaultManager()
+    if not os.path.exists(vault.vault_path):
+        print("\nNo vault yet. To create it with these costs, set:")
+        print(f"    ARGON2_MEMORY_COST={params.memory_cost}")
+        print(f"    ARGON2_ITERATIONS={params.iterations}")
+        print(f"    ARGON2_LANES={params.lanes}")
+        return
+    if input("Re-wrap the vault key with these parameters? (y/n): ").lower() != "y":
+        return
+
+    m_pass_raw = getpass.getpass("[?] Master Password: ")
+    s_key_raw = getpass.getpass("[?] Secret Key: ")
+    try:
+        with (
+            SecureString(m_pass_raw) as m_pass_sec,
+            SecureString(s_key_raw) as s_key_sec,
+        ):
+            master, secret = m_pass_sec.decode("utf-8"), s_key_sec.decode("utf-8")
+            vault.load_vault(master, secret)
+            vault.change_kdf_params(master, secret, params)
+        vault.add_audit_event("SYSTEM", f"Key derivation re-tuned: {params.describe()}")
+        print(Fore.GREEN + "[✓] Vault key re-wrapped." + Style.RESET_ALL)
+    except VaultMigrationRequired:
+        print(Fore.YELLOW + "[!] Open and migrate the vault first." + Style.RESET_ALL)
+    except AuthenticationError:
+        print(
+            Fore.RED + "[!] Incorrect Master Password or Secret Key." + Style.RESET_ALL
+        )
+
+
+def run_passwd(new_secret_key: bool) -> None:
+    """Changes the Master Password (and optionally the Secret Key) of the vault."""
+    vault = VaultManager()
+    m_pass_raw = getpass.getpass("[?] Current Master Password: ")
+    s_key_raw = getpass.getpass("[?] Current Secret Key: ")
+    new_m_raw = getpass.getpass("[?] New Master Password: ")
+    if getpass.getpass("[?] Confirm New Master Password: ") != new_m_raw:
+        print(Fore.RED + "[!] The passwords do not match." + Style.RESET_ALL)
+        return
+    new_s_raw = vault.crypto.generate_secret_key() if new_secret_key else s_key_raw
+    try:
+        with (
+            SecureString(m_pass_raw) as m_pass_sec,
+            SecureString(s_key_raw) as s_key_sec,
+            SecureString(new_m_raw) as new_m_sec,
+            SecureString(new_s_raw) as new_s_sec,
+        ):
+            master, secret = m_pass_sec.decode("utf-8"), s_key_sec.decode("utf-8")
+            vault.load_vault(master, secret)
+            vault.change_credentials(
+                master, secret, new_m_sec.decode("utf-8"), new_s_sec.decode("utf-8")
+            )
+        vault.add_audit_event("SYSTEM", "Master credentials changed")
+        print(Fore.GREEN + "[✓] Credentials changed." + Style.RESET_ALL)
+        if new_secret_key:
+            print(f"\nNEW SECRET KEY: {new_s_raw}\nTHIS KEY WILL ONLY BE SHOWN NOW!")
+    except VaultMigrationRequired:
+        print(Fore.YELLOW + "[!] Open and migrate the vault first." + Style.RESET_ALL)
+    except AuthenticationError:
+        print(
+            Fore.RED + "[!] Incorrect Master Password or Secret Key." + Style.RESET_ALL
+        )
+    finally:
+        vault.close()
+
+
+def run_rekey() -> None:
+    """Re-encrypts the whole vault under a new random data key."""
+    vault = VaultManager()
+    m_pass_raw = getpass.getpass("[?] Master Password: ")
+    s_key_raw = getpass.getpass("[?] Secret Key: ")
+    try:
+        with (
+            SecureString(m_pass_raw) as m_pass_sec,
+            SecureString(s_key_raw) as s_key_sec,
+        ):
+            master, secret = m_pass_sec.decode("utf-8"), s_key_sec.decode("utf-8")
+            vault.load_vault(master, secret)
+            print("[*] Re-encrypting entries and archived logs...")
+            vault.rotate_data_key(master, secret)
+        vault.add_audit_event("SYSTEM", "Vault data key rotated")
+        print(Fore.GREEN + "[✓] Vault re-encrypted under a new key." + Style.RESET_ALL)
+    except VaultMigrationRequired:
+        print(Fore.YELLOW + "[!] Open and migrate the vault first." + Style.RESET_ALL)
+    except AuthenticationError:
+        print(
+            Fore.RED + "[!] Incorrect Master Password or Secret Key." + Style.RESET_ALL
+        )
+    finally:
+        vault.close()
+
+
+def run_agent(timeout: Optional[float], foreground: bool, stop: bool) -> None:
+    """Starts (in the background by default) or stops the key-caching agent."""
+    client = AgentClient()
+    if stop:
+        print("[✓] Agent stopped." if client.stop() else "[!] No agent is running.")
+        return
+    if foreground:
+        agent = KeyAgent(timeout=timeout)
+        print(f"[*] Key agent on {agent.path} (idle timeout {agent.timeout:.0f} s).")
+        agent.serve_forever()
+        return
+    if client.ping():
+        print("[!] An agent is already running.")
+        return
+
+    # A detached copy of this program in --foreground mode, like ssh-agent's fork.
+    # The argv is our own interpreter and entry script plus fixed arguments (the
+    # timeout is a float), with no shell, so no user text reaches a command line.
+    command = [sys.executable]
+    if not getattr(sys, "frozen", False):
+        command.append(os.path.abspath(sys.argv[0]))
+    command += ["agent", "--foreground"]
+    if timeout is not None:
+        command += ["--timeout", str(timeout)]
+    subprocess.Popen(  # nosec B603
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    for _ in range(50):
+        if client.ping():
+            print(f"[✓] Key agent started on {default_socket_path()}.")
+            return
+        time.sleep(0.1)
+    print(Fore.RED + "[!] The key agent did not start." + Style.RESET_ALL)
+
+
+def run_batch_mode(source: str, atomic: bool = False) -> bool:
+    """
+    Unlocks once (key agent first) and runs JSON commands from a file or
+    stdin ("-"), writing JSON lines to stdout. Messages go to stderr so the
+    output stays machine-readable. Returns whether every command succeeded.
+    """
+    vault = VaultManager()
+    try:
+        with contextlib.redirect_stdout(sys.stderr), profiler.command("unlock"):
+            _unlock(vault)
+            _apply_storage_settings(vault)
+    except VaultMigrationRequired as e:
+        print(
+            f"[!] Vault needs migration; open it interactively first. {e}",
+            file=sys.stderr,
+        )
+        return False
+    except AuthenticationError:
+        print("[!] Authentication Failed.", file=sys.stderr)
+        return False
+
+    stream = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        # The login event and every change in the batch share a single save.
+        with profiler.command("batch"):
+            summary = run_batch(
+                vault, stream, sys.stdout, atomic, ("LOGIN", "Access via batch")
+            )
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        vault.close()
+    return bool(summary["ok"])
+
+
+def run_import(
+    source: str, fmt: Optional[str] = None, report: Optional[str] = None
+) -> bool:
+    """
+    Unlocks once (key agent first) and streams an export from a file or
+    stdin ("-") into the vault. Returns whether anything was imported.
+    """
+    from core.importer import import_file
+
+    vault = VaultManager()
+    try:
+        with profiler.command("unlock"):
+            _unlock(vault)
+            _apply_storage_settings(vault)
+    except VaultMigrationRequired as e:
+        print(f"[!] Vault needs migration; open it interactively first. {e}")
+        return False
+    except AuthenticationError:
+        print("[!] Authentication Failed.")
+        return False
+
+    try:
+        with profiler.command("import"), vault.transaction():
+            qty, msg = import_file(source, vault, fmt, report)
+            if qty > 0:
+                vault.add_audit_event("IMPORT", f"Imported {qty} items")
+        print(msg)
+    finally:
+        vault.close()
+    return qty > 0
+
+
 def run_cli() -> None:
     print("\033[2J\033[H", end="")
     print(BANNER)
@@ -361,18 +670,23 @@ def run_cli() -> None:
     if not os.path.exists(vault.vault_path):
         _handle_new_vault(vault, crypto)
 
-    if _authenticate_vault(vault):
+    with profiler.command("unlock"):
+        authenticated = _authenticate_vault(vault)
+    if authenticated:
         dispatcher = CommandDispatcher(vault)
-        while True:
-            update_activity()
-            print(f"\n{'-'*30} MAIN MENU v2.0.0 {'-'*40}")
-            print("1. List         2. Search      3. Add")
-            print("4. Generate     5. Import      6. Backup")
-            print("7. Audit Log    8. HIBP Scan   9. Exit")
-            op = input("\n> ").strip()
-
-            if not dispatcher.dispatch(op):
-                break
+        try:
+            while True:
+                update_activity()
+                print(f"\n{'-'*30} MAIN MENU v2.0.0 {'-'*40}")
+                print("1. List         2. Search      3. Add")
+                print("4. Generate     5. Import      6. Backup")
+                print("7. Audit Log    8. HIBP Scan   9. Exit")
+                op = input("\n> ").strip()
+
+                if not dispatcher.dispatch(op):
+                    break
+        finally:
+            vault.close()
 
 
 if __name__ == "__main__":
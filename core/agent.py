@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import socket
+import stat
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Optional
+
+from core.config import config
+from core.exceptions import HarpocratesError
+from core.kdf import KdfParams
+from core.secure_memory import wipe_buffer
+
+_MAX_MESSAGE = 4096
+_ACCEPT_POLL = 0.5  # seconds between idle checks while waiting for clients
+
+
+def agent_supported() -> bool:
+    return hasattr(socket, "AF_UNIX") and hasattr(os, "getuid")
+
+
+def default_socket_path() -> str:
+    """Per-user socket in a private directory, like ssh-agent's."""
+    if config.agent_socket:
+        return config.agent_socket
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(base, f"harpocrates-{os.getuid()}", "agent.sock")
+
+
+def _peer_uid(conn: socket.socket) -> Optional[int]:
+    """Uid of the process at the other end, where the OS reports it."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = conn.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    uid: int = struct.unpack("3i", creds)[1]
+    return uid
+
+
+def _private(info: os.stat_result) -> bool:
+    return info.st_uid == os.getuid() and not info.st_mode & 0o077
+
+
+def key_id(salt: bytes, params: KdfParams) -> str:
+    """
+    Names a cached key by what it was derived with (never the credentials):
+    a re-keyed vault gets a fresh salt, so a stale key is simply not found.
+    """
+    material = salt + json.dumps(params.to_header(), sort_keys=True).encode("utf-8")
+    return hashlib.sha256(material).hexdigest()
+
+
+def _read_message(conn: socket.socket) -> dict[str, Any]:
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(_MAX_MESSAGE)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > _MAX_MESSAGE:
+            raise ValueError("message too large")
+    message = json.loads(data)
+    if not isinstance(message, dict):
+        raise ValueError("message is not an object")
+    return message
+
+
+def _send_message(conn: socket.socket, message: dict[str, Any]) -> None:
+    conn.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+class KeyAgent:
+    """
+    Holds derived vault keys in memory so later processes can unlock without
+    running Argon2 again. Clients talk to it over a Unix socket in a 0700
+    directory owned by the user (and, where the OS reports it, connections
+    from other uids are refused). After `timeout` seconds without a key
+    being used, every key is wiped and the agent exits, like the CLI's
+    inactivity auto-lock.
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, timeout: Optional[float] = None
+    ) -> None:
+        self.path: str = path or default_socket_path()
+        self.timeout: float = config.agent_timeout if timeout is None else timeout
+        self._keys: dict[str, bytearray] = {}
+        self._last_used = time.monotonic()
+        self._stopped = threading.Event()
+
+    def _prepare_directory(self) -> None:
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.stat(directory)
+        if info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise HarpocratesError(
+                f"Agent directory {directory} must be private to the current user."
+            )
+        if os.path.exists(self.path):
+            if AgentClient(self.path).ping():
+                raise HarpocratesError(f"An agent is already running at {self.path}.")
+            os.unlink(self.path)
+
+    def _peer_allowed(self, conn: socket.socket) -> bool:
+        # Without SO_PEERCRED the private directory is the only gate.
+        return _peer_uid(conn) in (None, os.getuid())
+
+    def serve_forever(self, ready: Optional[threading.Event] = None) -> None:
+        if not agent_supported():
+            raise HarpocratesError("The key agent needs Unix domain sockets.")
+        self._prepare_directory()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        try:
+            server.listen()
+            server.settimeout(_ACCEPT_POLL)
+            if ready is not None:
+                ready.set()
+            while not self._stopped.is_set():
+                if time.monotonic() - self._last_used > self.timeout:
+                    break
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                with conn:
+                    conn.settimeout(5)
+                    self._handle(conn)
+        finally:
+            self._wipe()
+            server.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _handle(self, conn: socket.socket) -> None:
+        try:
+            if not self._peer_allowed(conn):
+                return
+            request = _read_message(conn)
+            _send_message(conn, self._dispatch(request))
+        except (OSError, ValueError, KeyError, TypeError):
+            # A broken client must not take the agent down.
+            return
+
+    def _dispatch(self, request: dict[str, Any]) -> dict[str, Any]:
+        op = request.get("op")
+        if op == "get":
+            key = self._keys.get(str(request["id"]))
+            if key is None:
+                return {"ok": True, "key": None}
+            self._last_used = time.monotonic()
+            return {"ok": True, "key": key.hex()}
+        if op == "put":
+            self._forget(str(request["id"]))
+            self._keys[str(request["id"])] = bytearray.fromhex(request["key"])
+            self._last_used = time.monotonic()
+            return {"ok": True}
+        if op == "forget":
+            self._forget(str(request["id"]))
+            return {"ok": True}
+        if op == "status":
+            idle = time.monotonic() - self._last_used
+            return {
+                "ok": True,
+                "keys": len(self._keys),
+                "expires_in": self.timeout - idle,
+            }
+        if op == "stop":
+            self._stopped.set()
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown op {op!r}"}
+
+    def _forget(self, name: str) -> None:
+        key = self._keys.pop(name, None)
+        if key is not None:
+            wipe_buffer(key)
+
+    def _wipe(self) -> None:
+        for name in list(self._keys):
+            self._forget(name)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class AgentClient:
+    """
+    Client side of the key agent. Every call degrades to "no key" if the
+    agent is gone or cannot be trusted: nothing is sent unless the socket
+    and its directory belong to this user and are closed to others, and
+    the process listening runs as this user. A socket planted by another
+    local user (e.g. in a shared /tmp) never sees a key.
+    """
+
+    def __init__(self, path: Optional[str] = None, timeout: float = 2.0) -> None:
+        self.path: Optional[str] = path
+        self.timeout = timeout
+
+    def _socket_path(self) -> str:
+        return self.path or default_socket_path()
+
+    def available(self) -> bool:
+        """Whether an agent socket this user started is in place."""
+        if not agent_supported():
+            return False
+        path = self._socket_path()
+        try:
+            directory = os.lstat(os.path.dirname(path) or ".")
+            sock = os.lstat(path)
+        except OSError:
+            return False
+        return (
+            stat.S_ISDIR(directory.st_mode)
+            and _private(directory)
+            and stat.S_ISSOCK(sock.st_mode)
+            and _private(sock)
+        )
+
+    def _call(self, request: dict[str, Any]) -> Optional[dict[str, Any]]:
+        if not self.available():
+            return None
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+                conn.settimeout(self.timeout)
+                conn.connect(self._socket_path())
+                if _peer_uid(conn) not in (None, os.getuid()):
+                    return None
+                _send_message(conn, request)
+                response = _read_message(conn)
+        except (OSError, ValueError):
+            return None
+        return response if response.get("ok") else None
+
+    def ping(self) -> bool:
+        return self.status() is not None
+
+    def status(self) -> Optional[dict[str, Any]]:
+        return self._call({"op": "status"})
+
+    def get_key(self, name: str) -> Optional[bytes]:
+        response = self._call({"op": "get", "id": name})
+        if not response or not response.get("key"):
+            return None
+        try:
+            return bytes.fromhex(response["key"])
+        except (TypeError, ValueError):
+            return None
+
+    def put_key(self, name: str, key: bytes) -> None:
+        self._call({"op": "put", "id": name, "key": key.hex()})
+
+    def forget(self, name: str) -> None:
+        self._call({"op": "forget", "id": name})
+
+    def stop(self) -> bool:
+        return self._call({"op": "stop"}) is not None
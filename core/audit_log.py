@@ -0,0 +1,30 @@
+import hashlib
+import json
+from typing import Any
+
+GENESIS_PREV_HASH = "0" * 64
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def canonical_record(record: dict[str, Any]) -> bytes:
+    """
+    Serialization covered by the chain: the record without its own cached
+    hash, as sorted-key ASCII JSON. It is independent of how the vault
+    payload is stored (JSON or binary), so converting a vault between codecs
+    never changes a hash; every option is spelled out to keep it stable.
+    """
+    content = {k: v for k, v in record.items() if k != "hash"}
+    return json.dumps(
+        content, sort_keys=True, ensure_ascii=True, separators=(", ", ": ")
+    ).encode("utf-8")
+
+
+def record_digest(record: dict[str, Any]) -> str:
+    """SHA-256 of a log record, as referenced by the next record's prev_hash."""
+    return hashlib.sha256(canonical_record(record)).hexdigest()
+
+
+def stamp_hash(record: dict[str, Any]) -> dict[str, Any]:
+    """Stores the record's own digest next to it so appends never rehash history."""
+    record["hash"] = record_digest(record)
+    return record
@@ -1,39 +1,204 @@
-from functools import lru_cache
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 import hashlib
+import threading
+import time
+from typing import Iterable, Iterator, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from core import profiler
+from core.config import config
 from core.exceptions import HIBPConnectionError
+from core.hibp_cache import RangeCache
 
 
-class PasswordAuditor:
-    @staticmethod
-    @lru_cache(maxsize=512)
-    def check_pwned(password: str) -> int:
-        """Checks if a password has been leaked using HIBP K-Anonymity."""
-        # SHA1 requerido por HIBP API para K-Anonymity
-        sha1_password = (
-            hashlib.sha1(password.encode("utf-8"), usedforsecurity=False)
-            .hexdigest()
-            .upper()
-        )
+def _sha1_parts(password: str) -> tuple[str, str]:
+    """Splits the uppercase SHA-1 of a password into (5-char prefix, suffix)."""
+    # SHA1 requerido por HIBP API para K-Anonymity
+    sha1_password = (
+        hashlib.sha1(password.encode("utf-8"), usedforsecurity=False)
+        .hexdigest()
+        .upper()
+    )
+    return sha1_password[:5], sha1_password[5:]
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is available. A non-positive rate disables limiting."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+class PwnedRangeBackend(ABC):
+    """Source of Pwned Passwords counts, addressed by SHA-1 prefix/suffix."""
 
-        prefix = sha1_password[:5]
-        suffix = sha1_password[5:]
+    # Remote backends are subject to the public API's rate limits.
+    remote: bool = True
 
-        url = f"https://api.pwnedpasswords.com/range/{prefix}"
-        headers = {"User-Agent": "Harpocrates-Vault-Security-Auditor"}
+    @abstractmethod
+    def lookup(self, prefix: str, suffix: str) -> int:
+        """Returns how many times the hash prefix+suffix appears in breaches."""
 
+    def range_counts(self, prefix: str, suffixes: Iterable[str]) -> dict[str, int]:
+        """Looks up several suffixes sharing one prefix (one range query if possible)."""
+        return {suffix: self.lookup(prefix, suffix) for suffix in suffixes}
+
+
+class OnlineRangeBackend(PwnedRangeBackend):
+    """
+    Queries the HIBP range API (K-Anonymity: only the prefix leaves the host).
+    Requests share a keep-alive connection pool and a token-bucket limiter,
+    so the backend can be used from several scanner threads at once. Range
+    responses are kept in a prefix-keyed RangeCache.
+    """
+
+    url = "https://api.pwnedpasswords.com/range/{prefix}"
+
+    def __init__(
+        self, rate: float = config.hibp_rate, pool_size: int = config.hibp_workers
+    ) -> None:
+        self.limiter = TokenBucket(rate)
+        self.cache = RangeCache()
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "Harpocrates-Vault-Security-Auditor"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("https://", adapter)
+
+    def fetch_range(self, prefix: str) -> str:
+        """Returns the raw 'SUFFIX:COUNT' lines of one range (cached by prefix)."""
+        body = self.cache.get(prefix)
+        if body is not None:
+            return body
+        self.limiter.acquire()
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            with profiler.span("hibp_request"):
+                response = self.session.get(self.url.format(prefix=prefix), timeout=10)
             response.raise_for_status()
-
-            for line in response.text.splitlines():
-                h, _, count = line.partition(":")
-                if h == suffix:
-                    return int(count)
-            return 0
+            body = str(response.text)
         except requests.RequestException as e:
             raise HIBPConnectionError(f"Failed to connect to HIBP API: {e}") from e
+        self.cache.put(prefix, body)
+        return body
+
+    def range_counts(self, prefix: str, suffixes: Iterable[str]) -> dict[str, int]:
+        wanted = set(suffixes)
+        counts = dict.fromkeys(wanted, 0)
+        for line in self.fetch_range(prefix).splitlines():
+            h, _, count = line.partition(":")
+            if h in wanted:
+                counts[h] = int(count)
+        return counts
+
+    def lookup(self, prefix: str, suffix: str) -> int:
+        return self.range_counts(prefix, [suffix])[suffix]
+
+
+class BreachScanner:
+    """
+    Checks many passwords at once: entries are grouped by SHA-1 prefix so each
+    range is queried only once, ranges are fetched concurrently, and results
+    are yielded as soon as their range completes.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[PwnedRangeBackend] = None,
+        workers: int = config.hibp_workers,
+    ) -> None:
+        self.backend = backend or PasswordAuditor.get_backend()
+        self.workers = max(1, workers)
+
+    def scan(self, passwords: Iterable[tuple[int, str]]) -> Iterator[tuple[int, int]]:
+        """Yields (key, breach count) for every (key, password) pair, in completion order."""
+        groups: dict[str, list[tuple[int, str]]] = {}
+        for key, password in passwords:
+            prefix, suffix = _sha1_parts(password)
+            groups.setdefault(prefix, []).append((key, suffix))
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            pending: dict[Future[dict[str, int]], str] = {
+                executor.submit(
+                    self.backend.range_counts, prefix, {s for _, s in members}
+                ): prefix
+                for prefix, members in groups.items()
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    prefix = pending.pop(future)
+                    counts = future.result()
+                    for key, suffix in groups[prefix]:
+                        yield key, counts[suffix]
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class PasswordAuditor:
+    _backend: Optional[PwnedRangeBackend] = None
+
+    @classmethod
+    def get_backend(cls) -> PwnedRangeBackend:
+        """Returns the configured backend (HIBP_BACKEND), created on first use."""
+        if cls._backend is None:
+            if config.hibp_backend == "offline":
+                from core.hibp_offline import OfflineRangeDatabase
+
+                cls._backend = OfflineRangeDatabase(config.hibp_offline_db)
+            else:
+                cls._backend = OnlineRangeBackend()
+        return cls._backend
+
+    @classmethod
+    def set_backend(cls, backend: Optional[PwnedRangeBackend]) -> None:
+        """Overrides the backend; None falls back to the configured one."""
+        cls._backend = backend
+        cls.clear_cache()
+
+    @staticmethod
+    def check_pwned(password: str) -> int:
+        """Checks if a password has been leaked using HIBP K-Anonymity."""
+        prefix, suffix = _sha1_parts(password)
+        return PasswordAuditor.get_backend().lookup(prefix, suffix)
+
+    @classmethod
+    def use_persistent_cache(cls, path: str, key: bytes) -> None:
+        """Persists the range cache of the active backend, encrypted with key."""
+        backend = cls.get_backend()
+        if isinstance(backend, OnlineRangeBackend):
+            backend.cache.attach(path, key)
+
+    @classmethod
+    def save_cache(cls) -> None:
+        backend = cls._backend
+        if isinstance(backend, OnlineRangeBackend):
+            backend.cache.save()
 
     @classmethod
     def clear_cache(cls) -> None:
-        cls.check_pwned.cache_clear()
+        """Forgets every cached range (persisted as empty on the next save)."""
+        backend = cls._backend
+        if isinstance(backend, OnlineRangeBackend):
+            backend.cache.clear()
@@ -0,0 +1,204 @@
+import json
+from typing import Any, Iterable, Optional, TextIO
+
+from core.generator import PasswordGenerator
+from core.vault import VaultManager
+
+# Fields a batch command may set; id and timestamps belong to the vault.
+EDITABLE_FIELDS = ("title", "username", "password", "url", "notes")
+
+
+class BatchCommandError(ValueError):
+    """A single batch command is malformed or refers to a missing entry."""
+
+
+class _Rollback(Exception):
+    """Aborts the batch transaction after a failed command in atomic mode."""
+
+
+def _entry_index(vault: VaultManager, command: dict[str, Any]) -> int:
+    """Resolves "id" (stable across deletes) or "index" to a position."""
+    if "id" in command:
+        index = vault.index_of(str(command["id"]))
+        if index is None:
+            raise BatchCommandError(f"no entry with id {command['id']!r}")
+        return index
+    index = command.get("index")
+    if not isinstance(index, int) or isinstance(index, bool):
+        raise BatchCommandError('expected "id" or an integer "index"')
+    if not 0 <= index < len(vault.list_entries()):
+        raise BatchCommandError(f"no entry at index {index}")
+    return index
+
+
+def _fields(source: dict[str, Any]) -> dict[str, str]:
+    unknown = set(source) - set(EDITABLE_FIELDS)
+    if unknown:
+        raise BatchCommandError(f"unknown fields: {', '.join(sorted(unknown))}")
+    if not all(isinstance(v, str) for v in source.values()):
+        raise BatchCommandError("field values must be strings")
+    return dict(source)
+
+
+def _index_data(vault: VaultManager, index: int) -> dict[str, Any]:
+    return {"index": index, **vault.list_entries()[index]}
+
+
+def _op_get(vault: VaultManager, command: dict[str, Any]) -> dict[str, Any]:
+    index = _entry_index(vault, command)
+    return {"entry": {"index": index, **vault.get_entry(index)}}
+
+
+def _op_add(vault: VaultManager, command: dict[str, Any]) -> dict[str, Any]:
+    fields = _fields({k: v for k, v in command.items() if k in EDITABLE_FIELDS})
+    if not fields.get("title") or not fields.get("username"):
+        raise BatchCommandError('"title" and "username" are required')
+    generated = not fields.get("password")
+    if generated:
+        length = command.get("length", 24)
+        if not isinstance(length, int) or not 8 <= length <= 256:
+            raise BatchCommandError('"length" must be an integer from 8 to 256')
+        fields["password"] = PasswordGenerator.generate(length)
+    vault.add_entry(
+        fields["title"],
+        fields["username"],
+        fields["password"],
+        fields.get("url", ""),
+        fields.get("notes", ""),
+    )
+    result: dict[str, Any] = {
+        "entry": _index_data(vault, len(vault.list_entries()) - 1)
+    }
+    if generated:
+        # The caller has no other way to learn a generated password.
+        result["password"] = fields["password"]
+    return result
+
+
+def _op_update(vault: VaultManager, command: dict[str, Any]) -> dict[str, Any]:
+    index = _entry_index(vault, command)
+    fields = command.get("fields")
+    if not isinstance(fields, dict) or not fields:
+        raise BatchCommandError('"fields" must be a non-empty object')
+    vault.update_entry(index, _fields(fields))
+    return {"entry": _index_data(vault, index)}
+
+
+def _op_delete(vault: VaultManager, command: dict[str, Any]) -> dict[str, Any]:
+    index = _entry_index(vault, command)
+    entry_id = vault.list_entries()[index].get("id")
+    vault.delete_entry(index)
+    return {"id": entry_id}
+
+
+def _op_search(vault: VaultManager, command: dict[str, Any]) -> dict[str, Any]:
+    query = command.get("query")
+    if not isinstance(query, str):
+        raise BatchCommandError('"query" must be a string')
+    hits = vault.search(query, int(command.get("limit", 50)))
+    return {"results": [{"index": i, **entry} for i, entry in hits]}
+
+
+def _op_export(vault: VaultManager, command: dict[str, Any]) -> dict[str, Any]:
+    """Every entry with its secrets, or only the matches of "query"."""
+    query = command.get("query")
+    if query is None:
+        indexes: Iterable[int] = range(len(vault.list_entries()))
+    else:
+        indexes = [i for i, _ in vault.search(str(query), len(vault.list_entries()))]
+    return {"entries": [{"index": i, **vault.get_entry(i)} for i in indexes]}
+
+
+OPERATIONS = {
+    "get": _op_get,
+    "add": _op_add,
+    "update": _op_update,
+    "delete": _op_delete,
+    "search": _op_search,
+    "export": _op_export,
+}
+MUTATIONS = frozenset({"add", "update", "delete"})
+
+
+def _execute(vault: VaultManager, line: str) -> dict[str, Any]:
+    try:
+        command = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise BatchCommandError(f"invalid JSON: {e.msg}") from e
+    if not isinstance(command, dict):
+        raise BatchCommandError("a command must be a JSON object")
+    op = command.get("op")
+    handler = OPERATIONS.get(str(op))
+    if handler is None:
+        raise BatchCommandError(f"unknown op {op!r}")
+    # A failing command is its own savepoint: it leaves no partial change.
+    with vault.transaction():
+        return {"op": op, **handler(vault, command)}
+
+
+def run_batch(
+    vault: VaultManager,
+    lines: Iterable[str],
+    out: TextIO,
+    atomic: bool = False,
+    event: Optional[tuple[str, str]] = None,
+) -> dict[str, Any]:
+    """
+    Runs one JSON command per input line against an unlocked vault and writes
+    one JSON result per line to `out`. All mutations, and the audit `event`
+    if given (e.g. the batch login), share one transaction, so the vault is
+    saved once at the end. A failed command is reported and skipped; with
+    `atomic`, it discards every change instead. The summary, written as the
+    last line and returned, is only written once the save has finished (or
+    failed): "saved" means the changes are on disk. Called inside an open
+    transaction, the save is left to that transaction.
+    """
+    applied = failed = changed = 0
+    first_error: Optional[int] = None
+    error: Optional[str] = None
+    try:
+        with vault.transaction():
+            if event is not None:
+                vault.add_audit_event(*event)
+            try:
+                with vault.transaction():
+                    for number, line in enumerate(lines, 1):
+                        if not line.strip() or line.lstrip().startswith("#"):
+                            continue
+                        try:
+                            result = {
+                                "ok": True,
+                                "line": number,
+                                **_execute(vault, line),
+                            }
+                            applied += 1
+                            changed += result["op"] in MUTATIONS
+                        except (BatchCommandError, ValueError, TypeError) as e:
+                            result = {"ok": False, "line": number, "error": str(e)}
+                            failed += 1
+                            first_error = first_error or number
+                        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        out.flush()
+                    if atomic and failed:
+                        raise _Rollback()
+            except _Rollback:
+                changed = 0
+                error = f"rolled back: line {first_error} failed"
+        # In write-behind mode the commit above only scheduled the save.
+        vault.flush()
+    except Exception as e:
+        changed = 0
+        error = f"save failed, no change was written: {e}"
+
+    summary: dict[str, Any] = {
+        "ok": failed == 0 and error is None,
+        "op": "commit",
+        "applied": applied,
+        "failed": failed,
+        "saved": changed > 0,
+    }
+    if error is not None:
+        summary["error"] = error
+    out.write(json.dumps(summary) + "\n")
+    out.flush()
+    return summary
@@ -0,0 +1,46 @@
+import lzma
+import zlib
+from typing import Callable, Union
+
+from core.exceptions import HarpocratesError, VaultCorruptError
+from core.secure_memory import wipe_buffer
+
+NO_COMPRESSION = "none"
+
+_Codec = tuple[Callable[[bytes], bytes], Callable[[Union[bytes, bytearray]], bytes]]
+
+# Fast default level for zlib; lzma trades save time for the smallest file.
+_COMPRESSORS: dict[str, _Codec] = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+
+ALGORITHMS = (NO_COMPRESSION, *_COMPRESSORS)
+
+
+def check_algorithm(name: str) -> str:
+    if name not in ALGORITHMS:
+        raise HarpocratesError(
+            f"Unknown compression '{name}' (expected one of: {', '.join(ALGORITHMS)})."
+        )
+    return name
+
+
+def compress(name: str, data: bytes) -> bytes:
+    """Compresses a serialized payload before it is sealed."""
+    if name == NO_COMPRESSION:
+        return data
+    return _COMPRESSORS[check_algorithm(name)][0](data)
+
+
+def decompress(name: str, plaintext: bytearray) -> bytearray:
+    """Inflates a decrypted payload into a new buffer and wipes the compressed one."""
+    if name == NO_COMPRESSION:
+        return plaintext
+    try:
+        return bytearray(_COMPRESSORS[name][1](plaintext))
+    except (zlib.error, lzma.LZMAError) as e:
+        raise VaultCorruptError(f"Unexpected data corruption: {e}") from e
+    finally:
+        wipe_buffer(plaintext)
+        del plaintext[:]
@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 
 
 class Settings:
@@ -10,6 +11,21 @@ class Settings:
     def __init__(self) -> None:
         self.vault_path: str = os.getenv("VAULT_PATH", "vault.hpro")
         self.debug: bool = os.getenv("DEBUG", "False").lower() in ("true", "1", "t")
+        # Per-phase timings reported at exit: "1" for a text breakdown on stderr,
+        # or a file path to write them as JSON (--profile / --profile-json).
+        # "0", "false" and the like leave profiling off instead of naming a file.
+        self.profile: str = os.getenv("HARPOCRATES_PROFILE", "")
+        if self.profile.lower() in ("false", "0", "f", "no", "off", "none"):
+            self.profile = ""
+
+        # Seconds without activity before the CLI locks (exits) and the key agent
+        # forgets its keys; the agent can use its own AGENT_TIMEOUT.
+        self.inactivity_timeout: float = float(os.getenv("INACTIVITY_TIMEOUT", 300))
+        self.agent_timeout: float = float(
+            os.getenv("AGENT_TIMEOUT", self.inactivity_timeout)
+        )
+        # Key agent socket; empty means a private per-user directory in the runtime dir.
+        self.agent_socket: str = os.getenv("HARPOCRATES_AGENT_SOCKET", "")
 
         # Cryptography defaults based on OWASP recommendations
         self.argon2_memory_cost: int = int(os.getenv("ARGON2_MEMORY_COST", 64 * 1024))
@@ -21,5 +37,52 @@ class Settings:
         self.aes_nonce_size: int = int(os.getenv("AES_NONCE_SIZE", 12))
         self.salt_size: int = int(os.getenv("SALT_SIZE", 16))
 
+        # Encoding of the sealed vault payload: "json" or "binary" (compact,
+        # faster to load). Unset: new vaults use json and existing ones keep the
+        # codec recorded in their header; set, an existing vault is converted.
+        self.vault_codec: Optional[str] = os.getenv("VAULT_CODEC", "").lower() or None
+        # Compression of the sealed index (entries metadata and audit log) before
+        # encryption: "none", "zlib" or "lzma". Entry secrets are never compressed.
+        # Unset, an existing vault keeps the compression recorded in its header.
+        self.vault_compression: Optional[str] = (
+            os.getenv("VAULT_COMPRESSION", "").lower() or None
+        )
+
+        # Append-only journal: mutations are appended to a sidecar log and
+        # folded back into the vault once the threshold is reached.
+        self.journal_enabled: bool = os.getenv("VAULT_JOURNAL", "False").lower() in (
+            "true",
+            "1",
+            "t",
+        )
+        self.journal_compact_threshold: int = int(
+            os.getenv("JOURNAL_COMPACT_THRESHOLD", 256)
+        )
+
+        # Write-behind: seconds of quiet after a change before one background
+        # save writes everything pending (0 saves synchronously on every change).
+        self.write_behind_delay: float = float(os.getenv("WRITE_BEHIND_DELAY", 0))
+
+        # Audit log rotation: the live log moves to an encrypted archive segment
+        # once it holds this many records or its oldest record is this old (0 disables).
+        self.log_segment_max_records: int = int(
+            os.getenv("LOG_SEGMENT_MAX_RECORDS", 5000)
+        )
+        self.log_segment_max_age_days: int = int(
+            os.getenv("LOG_SEGMENT_MAX_AGE_DAYS", 365)
+        )
+
+        # Breach lookups: "online" (HIBP range API) or "offline" (local range database).
+        self.hibp_backend: str = os.getenv("HIBP_BACKEND", "online").lower()
+        self.hibp_offline_db: str = os.getenv("HIBP_OFFLINE_DB", "pwned-passwords.hpdb")
+        # Vault scans: concurrent range fetches over a pooled session, rate limited.
+        self.hibp_workers: int = int(os.getenv("HIBP_WORKERS", 8))
+        self.hibp_rate: float = float(os.getenv("HIBP_RATE", 10))
+        # Range responses cached by SHA-1 prefix, persisted encrypted next to the vault.
+        self.hibp_cache_ttl: float = float(os.getenv("HIBP_CACHE_TTL", 7 * 24 * 3600))
+        self.hibp_cache_max_bytes: int = (
+            int(os.getenv("HIBP_CACHE_MAX_MB", 64)) * 1024 * 1024
+        )
+
 
 config = Settings()
@@ -1,10 +1,15 @@
 import secrets
-from typing import Union
-from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+from typing import Optional, Union
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.exceptions import InvalidTag
 from core.exceptions import AuthenticationError, VaultCorruptError
+from core import profiler
 from core.config import config
+from core.kdf import KdfParams, derive_key
+from core.secure_memory import wipe_buffer
+
+GCM_TAG_SIZE = 16
 
 
 class HarpocratesCrypto:
@@ -17,21 +22,19 @@ class HarpocratesCrypto:
         """Generates a random 32-byte Secret Key in URL-safe base64."""
         return secrets.token_urlsafe(32)
 
+    @profiler.timed("derive_session_key")
     def derive_session_key(
-        self, master_password: str, secret_key: str, salt: bytes
+        self,
+        master_password: str,
+        secret_key: str,
+        salt: bytes,
+        params: Optional[KdfParams] = None,
     ) -> bytes:
-        """Derives the AES-GCM key using Argon2id."""
+        """Derives the AES-GCM key using Argon2id (configured costs by default)."""
         combined_pass = (master_password + secret_key).encode("utf-8")
-        kdf = Argon2id(
-            salt=salt,
-            length=self.key_len,
-            iterations=config.argon2_iterations,
-            lanes=config.argon2_lanes,
-            memory_cost=config.argon2_memory_cost,
-            ad=None,
-            secret=None,
+        return derive_key(
+            combined_pass, salt, params or KdfParams.from_config(), self.key_len
         )
-        return kdf.derive(combined_pass)
 
     def encrypt_with_session_key(
         self, plaintext_data: Union[str, bytes], session_key: bytes, salt: bytes
@@ -62,3 +65,97 @@ class HarpocratesCrypto:
             ) from e
         except Exception as e:
             raise VaultCorruptError(f"Unexpected data corruption: {e}") from e
+
+    @profiler.timed("encrypt")
+    def seal_record(
+        self, plaintext_data: Union[str, bytes], session_key: bytes, aad: bytes
+    ) -> bytes:
+        """Encrypts a standalone record bound to its context via associated data."""
+        if isinstance(plaintext_data, str):
+            plaintext_data = plaintext_data.encode("utf-8")
+
+        nonce = secrets.token_bytes(self.nonce_size)
+        return nonce + AESGCM(session_key).encrypt(nonce, plaintext_data, aad)
+
+    def generate_data_key(self) -> bytes:
+        """Random key that encrypts the vault contents (wrapped by the derived key)."""
+        return secrets.token_bytes(self.key_len)
+
+    def wrap_key(self, kek: bytes, data_key: bytes, aad: bytes) -> bytes:
+        """Seals the data key under the key derived from the credentials."""
+        return self.seal_record(data_key, kek, aad)
+
+    def unwrap_key(self, kek: bytes, wrapped: bytes, aad: bytes) -> bytes:
+        """Opens a wrapped data key; wrong credentials fail authentication."""
+        data_key = self.open_record(wrapped, kek, aad)
+        if len(data_key) != self.key_len:
+            raise VaultCorruptError("Wrapped vault key has an invalid length.")
+        return data_key
+
+    def open_record(self, sealed: bytes, session_key: bytes, aad: bytes) -> bytes:
+        """Decrypts a record produced by seal_record, checking its associated data."""
+        try:
+            nonce = sealed[: self.nonce_size]
+            return AESGCM(session_key).decrypt(nonce, sealed[self.nonce_size :], aad)
+        except InvalidTag as e:
+            raise AuthenticationError(
+                "Record authentication failed or data is corrupted."
+            ) from e
+        except Exception as e:
+            raise VaultCorruptError(f"Unexpected data corruption: {e}") from e
+
+    def open_record_into(
+        self, sealed: memoryview, session_key: bytes, aad: bytes
+    ) -> bytearray:
+        """
+        Zero-copy variant of open_record: reads nonce, ciphertext and tag in
+        place (e.g. from a memory-mapped file) and decrypts straight into a
+        single bytearray the caller can wipe with wipe_buffer.
+        """
+        return self._decrypt_into(
+            sealed[: self.nonce_size], sealed[self.nonce_size :], session_key, aad
+        )
+
+    def decrypt_into_buffer(
+        self, encrypted_bytes: memoryview, session_key: bytes
+    ) -> bytearray:
+        """Zero-copy variant of decrypt_with_session_key for legacy single-blob vaults."""
+        start = self.salt_size + self.nonce_size
+        return self._decrypt_into(
+            encrypted_bytes[self.salt_size : start],
+            encrypted_bytes[start:],
+            session_key,
+            None,
+        )
+
+    @profiler.timed("decrypt")
+    def _decrypt_into(
+        self,
+        nonce: memoryview,
+        ciphertext_and_tag: memoryview,
+        session_key: bytes,
+        aad: Optional[bytes],
+    ) -> bytearray:
+        if len(nonce) != self.nonce_size or len(ciphertext_and_tag) < GCM_TAG_SIZE:
+            raise VaultCorruptError("Unexpected data corruption: record is truncated.")
+
+        ciphertext = ciphertext_and_tag[:-GCM_TAG_SIZE]
+        tag = bytes(ciphertext_and_tag[-GCM_TAG_SIZE:])
+        decryptor = Cipher(
+            algorithms.AES(session_key), modes.GCM(bytes(nonce), tag)
+        ).decryptor()
+        if aad is not None:
+            decryptor.authenticate_additional_data(aad)
+
+        # update_into needs room for one extra block beyond the input length.
+        plaintext = bytearray(len(ciphertext) + 15)
+        written = decryptor.update_into(ciphertext, plaintext)
+        try:
+            decryptor.finalize()
+        except InvalidTag as e:
+            wipe_buffer(plaintext)
+            raise AuthenticationError(
+                "Authentication failed or vault is corrupted."
+            ) from e
+        del plaintext[written:]
+        return plaintext
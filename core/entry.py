@@ -0,0 +1,87 @@
+import sys
+from collections.abc import Iterator, Mapping, MutableMapping
+from typing import Any, Optional
+
+# Known entry fields, stored in slots. Index fields first, then the sealed body.
+ENTRY_FIELDS = (
+    "id",
+    "title",
+    "username",
+    "url",
+    "created_at",
+    "updated_at",
+    "password",
+    "notes",
+)
+_SLOTS = frozenset(ENTRY_FIELDS)
+# Values commonly shared by many entries (the same e-mail everywhere).
+_INTERNED = frozenset(("username",))
+
+
+class Entry(MutableMapping[str, Any]):
+    """
+    Compact vault entry. Known fields live in slots instead of a per-entry
+    hash table, which is most of the memory of a large unlocked vault; keys
+    from other schema versions go to a small overflow dict. Behaves like the
+    dict it replaces, so callers keep using entry["title"], get, update, etc.
+    A missing field (e.g. a body not decrypted yet) is simply absent.
+    """
+
+    __slots__ = ENTRY_FIELDS + ("_extra",)
+
+    def __init__(self, fields: Optional[Mapping[str, Any]] = None) -> None:
+        self._extra: Optional[dict[str, Any]] = None
+        if fields:
+            for key, value in fields.items():
+                self[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _SLOTS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _SLOTS:
+            if key in _INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in _SLOTS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+            if not self._extra:
+                self._extra = None
+
+    def __contains__(self, key: object) -> bool:
+        if key in _SLOTS:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for name in ENTRY_FIELDS:
+            if hasattr(self, name):
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Entry({dict(self)!r})"
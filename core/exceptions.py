@@ -28,6 +28,12 @@ class HIBPConnectionError(HarpocratesError):
     pass
 
 
+class HIBPDatabaseError(HIBPConnectionError):
+    """Raised when the offline breach database is missing or malformed."""
+
+    pass
+
+
 class VaultMigrationRequired(HarpocratesError):
     """Raised when the vault requires migration to a newer format."""
 
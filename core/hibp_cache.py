@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+from core.config import config
+from core.crypto import HarpocratesCrypto
+from core.exceptions import HarpocratesError
+
+CACHE_MAGIC = b"HPRC1"
+
+
+class RangeCache:
+    """
+    Cache of HIBP range responses keyed by the 5-character SHA-1 prefix.
+
+    Only prefixes and public range bodies are stored, never passwords. Entries
+    expire after `ttl` seconds and the least recently used ones are evicted
+    once the bodies exceed `max_bytes`. When attached to a file and a key
+    (derived from the vault session key) the cache survives restarts as a
+    single AES-GCM sealed record.
+    """
+
+    def __init__(
+        self,
+        ttl: float = config.hibp_cache_ttl,
+        max_bytes: int = config.hibp_cache_max_bytes,
+    ) -> None:
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.crypto = HarpocratesCrypto()
+        self._ranges: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._path: Optional[str] = None
+        self._key: Optional[bytes] = None
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._ranges)
+
+    def get(self, prefix: str) -> Optional[str]:
+        with self._lock:
+            item = self._ranges.get(prefix)
+            if item is None:
+                return None
+            fetched_at, body = item
+            if time.time() - fetched_at > self.ttl:
+                self._drop(prefix)
+                return None
+            self._ranges.move_to_end(prefix)
+            return body
+
+    def put(self, prefix: str, body: str, fetched_at: Optional[float] = None) -> None:
+        with self._lock:
+            if prefix in self._ranges:
+                self._drop(prefix)
+            self._ranges[prefix] = (fetched_at or time.time(), body)
+            self._size += len(body)
+            while self._size > self.max_bytes and len(self._ranges) > 1:
+                self._drop(next(iter(self._ranges)))
+            self._dirty = True
+
+    def _drop(self, prefix: str) -> None:
+        _, body = self._ranges.pop(prefix)
+        self._size -= len(body)
+        self._dirty = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ranges.clear()
+            self._size = 0
+            self._dirty = True
+
+    def attach(self, path: str, key: bytes) -> None:
+        """Binds the cache to an encrypted file and merges what it contains."""
+        if self._path == path and self._key == key:
+            return
+        self._path, self._key = path, key
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            if not raw.startswith(CACHE_MAGIC):
+                raise ValueError("unknown cache format")
+            plaintext = self.crypto.open_record(
+                raw[len(CACHE_MAGIC) :], key, CACHE_MAGIC
+            )
+            stored = json.loads(zlib.decompress(plaintext))
+        except (HarpocratesError, ValueError, zlib.error):
+            # A cache is disposable: drop it if it is stale, corrupt or from another key.
+            os.remove(path)
+            return
+        # Oldest first, so the LRU order survives the round trip.
+        for prefix, fetched_at, body in stored["ranges"]:
+            if prefix not in self._ranges and time.time() - fetched_at <= self.ttl:
+                self.put(prefix, body, fetched_at)
+        self._dirty = False
+
+    def save(self) -> None:
+        """Writes the cache back to its file if anything changed since attach/save."""
+        if self._path is None or self._key is None or not self._dirty:
+            return
+        with self._lock:
+            ranges = [[p, t, body] for p, (t, body) in self._ranges.items()]
+            self._dirty = False
+        payload = zlib.compress(json.dumps({"ranges": ranges}).encode("utf-8"))
+        sealed = CACHE_MAGIC + self.crypto.seal_record(payload, self._key, CACHE_MAGIC)
+
+        tmp_path = self._path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(sealed)
+        os.replace(tmp_path, self._path)
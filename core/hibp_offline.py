@@ -0,0 +1,164 @@
+import argparse
+import bisect
+import mmap
+import os
+import struct
+from typing import Iterable, Iterator, Optional
+from core.auditor import PwnedRangeBackend
+from core.exceptions import HIBPDatabaseError
+
+DB_MAGIC = b"HPHIBP01"
+PREFIX_BITS = 20
+BUCKETS = 1 << PREFIX_BITS
+
+# Each record: SHA-1 digest without its first two bytes (the rest of the
+# 5-hex-char prefix is kept for simplicity) followed by the breach count.
+KEY_SIZE = 18
+_RECORD = struct.Struct(f">{KEY_SIZE}sI")
+_HEADER = struct.Struct("<8sQ")
+_OFFSET = struct.Struct("<Q")
+TABLE_OFFSET = _HEADER.size
+RECORDS_OFFSET = TABLE_OFFSET + (BUCKETS + 1) * _OFFSET.size
+
+
+class _BucketKeys:
+    """Sequence view over the keys of one prefix bucket, for bisect."""
+
+    def __init__(self, mapping: mmap.mmap, first: int, count: int) -> None:
+        self._mapping = mapping
+        self._first = first
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> bytes:
+        pos = RECORDS_OFFSET + (self._first + i) * _RECORD.size
+        return self._mapping[pos : pos + KEY_SIZE]
+
+
+class OfflineRangeDatabase(PwnedRangeBackend):
+    """
+    Local Pwned Passwords database for air-gapped hosts.
+
+    The file holds a table of 2^20 + 1 record offsets (one bucket per 5-hex
+    SHA-1 prefix, as used by the range API) followed by fixed-width records
+    sorted by hash. A lookup is two table reads and a binary search inside
+    the bucket, straight from a read-only memory mapping.
+    """
+
+    remote = False
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._mapping: Optional[mmap.mmap] = None
+
+    def _open(self) -> mmap.mmap:
+        if self._mapping is None:
+            try:
+                with open(self.path, "rb") as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as e:
+                raise HIBPDatabaseError(
+                    f"Offline breach database unavailable: {self.path} ({e})"
+                ) from e
+            if len(mapping) < RECORDS_OFFSET:
+                mapping.close()
+                raise HIBPDatabaseError("Offline breach database is truncated.")
+            magic, count = _HEADER.unpack_from(mapping, 0)
+            if magic != DB_MAGIC or len(mapping) != (
+                RECORDS_OFFSET + count * _RECORD.size
+            ):
+                mapping.close()
+                raise HIBPDatabaseError("Offline breach database is malformed.")
+            self._mapping = mapping
+        return self._mapping
+
+    def lookup(self, prefix: str, suffix: str) -> int:
+        mapping = self._open()
+        digest = bytes.fromhex(prefix + suffix)
+        bucket = int(prefix, 16)
+        (first,) = _OFFSET.unpack_from(mapping, TABLE_OFFSET + bucket * _OFFSET.size)
+        (end,) = _OFFSET.unpack_from(
+            mapping, TABLE_OFFSET + (bucket + 1) * _OFFSET.size
+        )
+
+        key = digest[2:]
+        keys = _BucketKeys(mapping, first, end - first)
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            pos = RECORDS_OFFSET + (first + i) * _RECORD.size
+            _, count = _RECORD.unpack_from(mapping, pos)
+            return int(count)
+        return 0
+
+    def close(self) -> None:
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+
+def _parse_dump(lines: Iterable[str]) -> Iterator[tuple[bytes, int]]:
+    """Yields (digest, count) from 'SHA1:COUNT' lines, enforcing sorted order."""
+    previous = b""
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        hash_hex, _, count = line.partition(":")
+        try:
+            digest = bytes.fromhex(hash_hex)
+            value = int(count)
+        except ValueError as e:
+            raise HIBPDatabaseError(f"Line {line_no}: malformed record.") from e
+        if len(digest) != 20:
+            raise HIBPDatabaseError(f"Line {line_no}: not a SHA-1 hash.")
+        if digest <= previous:
+            raise HIBPDatabaseError(
+                f"Line {line_no}: dump must be sorted by hash without duplicates."
+            )
+        previous = digest
+        yield digest, value
+
+
+def build_offline_database(dump_path: str, db_path: str) -> int:
+    """
+    Converts a Pwned Passwords SHA-1 dump ('HASH:COUNT' lines ordered by hash)
+    into the binary range database. Streams the dump; returns the record count.
+    """
+    tmp_path = db_path + ".tmp"
+    starts = [0] * (BUCKETS + 1)
+    total = 0
+    try:
+        with open(dump_path, encoding="ascii") as src, open(tmp_path, "wb") as dst:
+            dst.write(b"\0" * RECORDS_OFFSET)
+            for digest, count in _parse_dump(src):
+                bucket = int.from_bytes(digest[:3], "big") >> 4
+                starts[bucket + 1] += 1
+                dst.write(_RECORD.pack(digest[2:], min(count, 0xFFFFFFFF)))
+                total += 1
+
+            for bucket in range(BUCKETS):
+                starts[bucket + 1] += starts[bucket]
+            dst.seek(0)
+            dst.write(_HEADER.pack(DB_MAGIC, total))
+            dst.write(b"".join(_OFFSET.pack(start) for start in starts))
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, db_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the offline HIBP range database from a SHA-1 dump."
+    )
+    parser.add_argument("dump", help="pwnedpasswords SHA-1 file (HASH:COUNT, sorted)")
+    parser.add_argument("output", help="destination database (.hpdb)")
+    args = parser.parse_args()
+    records = build_offline_database(args.dump, args.output)
+    print(f"[✓] Imported {records} hashes into {args.output}")
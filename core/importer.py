@@ -1,110 +1,506 @@
 import csv
+import hashlib
+import json
+import os
+import re
+import sys
+from itertools import islice
 from pathlib import Path
-from typing import Tuple
+from typing import IO, Any, Callable, Iterable, Iterator, Optional, Tuple
 from colorama import Fore, Style  # type: ignore
+from defusedxml import DefusedXmlException  # type: ignore
+from defusedxml.ElementTree import ParseError, iterparse  # type: ignore
 from core.vault import VaultManager
 
+# Rows handed to the vault per add_entries_bulk call.
+CHUNK_SIZE = 1000
+# Skipped rows named in the summary message; the report file lists them all.
+SKIPPED_SAMPLE = 10
+# Streaming parsers read this much at a time and give up on a single record
+# (one Bitwarden item) larger than MAX_RECORD characters.
+READ_SIZE = 64 * 1024
+MAX_RECORD = 16 * 1024 * 1024
 
-def import_from_csv(file_path: str, vault_manager: VaultManager) -> Tuple[int, str]:
+Row = dict[str, str]
+
+
+class ImportFormatError(ValueError):
+    """The input is not an export this importer understands."""
+
+
+def signature(title: str, username: str) -> bytes:
     """
-    Imports passwords securely using a rollback-safe transaction.
-    Explicitly lists which entries were skipped due to duplication.
+    Duplicate key of an entry: a 16-byte digest of the normalised title and
+    username, so the index of a large vault stays small.
     """
-    imported_count = 0
-    skipped_details = []
-    buffer_entries = []
+    key = f"{title.strip().lower()}|{username.strip().lower()}".encode("utf-8")
+    return hashlib.blake2b(key, digest_size=16).digest()
 
-    try:
-        resolved = Path(file_path).resolve(strict=True)
-    except (FileNotFoundError, OSError):
-        return 0, f"{Fore.RED}Error: file not found or inaccessible.{Style.RESET_ALL}"
 
-    if not resolved.is_file():
-        return (
-            0,
-            f"{Fore.RED}Error: the path does not point to a file.{Style.RESET_ALL}",
-        )
+class SkipReport:
+    """
+    Counts rows that were not imported and, given a path, writes each one
+    to a CSV report as it happens instead of keeping them in memory.
+    """
 
-    if resolved.suffix.lower() != ".csv":
-        return (
-            0,
-            f"{Fore.RED}Error: the file must have a .csv extension.{Style.RESET_ALL}",
-        )
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.duplicates = 0
+        # Other reasons (no password, not a login, ...) -> count.
+        self.other: dict[str, int] = {}
+        self.sample: list[str] = []
+        self._file: Optional[IO[str]] = None
+        self._writer: Optional[Any] = None
+        if path:
+            # Titles and usernames of the vault: readable by the owner only.
+            self._file = open(
+                path,
+                "w",
+                newline="",
+                encoding="utf-8",
+                opener=lambda p, flags: os.open(p, flags, 0o600),
+            )
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["line", "title", "username", "reason"])
 
-    try:
-        entries = vault_manager.get_entries()
-        existing_signatures = {
-            f"{e['title'].strip().lower()}|{e['username'].strip().lower()}"
-            for e in entries
+    def add(self, line: int, title: str, username: str, reason: str) -> None:
+        if reason == "duplicate":
+            self.duplicates += 1
+            if len(self.sample) < SKIPPED_SAMPLE:
+                self.sample.append(f"{title} ({username})")
+        else:
+            self.other[reason] = self.other.get(reason, 0) + 1
+        if self._writer is not None:
+            self._writer.writerow([line, title, username, reason])
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "SkipReport":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def csv_rows(
+    csvfile: IO[str], report: Optional[SkipReport] = None
+) -> Iterator[Tuple[int, Row]]:
+    """Yields (line number, entry fields) per CSV row, mapping the header aliases."""
+    reader = csv.DictReader(csvfile)
+    field_map = {k.lower(): k for k in (reader.fieldnames or []) if k}
+
+    col_name = (
+        field_map.get("name") or field_map.get("login_name") or field_map.get("title")
+    )
+    col_url = field_map.get("url") or field_map.get("login_uri")
+    col_user = field_map.get("username") or field_map.get("login_username")
+    col_pass = field_map.get("password") or field_map.get("login_password")
+    col_note = field_map.get("notes") or field_map.get("note")
+
+    if not (col_name and col_user and col_pass):
+        raise ImportFormatError("Unrecognized CSV format. Missing standard headers.")
+
+    for row in reader:
+        yield reader.line_num, {
+            "title": (row.get(col_name) or "").strip(),
+            "username": (row.get(col_user) or "").strip(),
+            "password": row.get(col_pass) or "",
+            "url": (row.get(col_url) or "") if col_url else "",
+            "notes": (row.get(col_note) or "") if col_note else "",
         }
 
-        with open(resolved, newline="", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
 
-            field_map = {k.lower(): k for k in (reader.fieldnames or []) if k}
+class _JsonStream:
+    """
+    Decodes a JSON document one value at a time (an object key, one array
+    element), reading the text in READ_SIZE pieces: only the value being
+    decoded and the unread rest of the last piece are held in memory.
+    Objects, arrays and strings are decoded once they are complete; a scan
+    of their brackets and quotes resumes across reads, so a value spanning
+    many pieces costs linear time.
+    """
 
-            col_name = (
-                field_map.get("name")
-                or field_map.get("login_name")
-                or field_map.get("title")
-            )
-            col_url = field_map.get("url") or field_map.get("login_uri")
-            col_user = field_map.get("username") or field_map.get("login_username")
-            col_pass = field_map.get("password") or field_map.get("login_password")
-            col_note = field_map.get("notes") or field_map.get("note")
-
-            if not (col_name and col_user and col_pass):
-                return (
-                    0,
-                    f"{Fore.RED}Unrecognized CSV format. Missing standard headers.{Style.RESET_ALL}",
-                )
+    _WHITESPACE = " \t\r\n"
+    _STRUCTURAL = re.compile(r'["{}\[\]]')
+    _IN_STRING = re.compile(r'["\\]')
+    # What may follow a number that is still being read ("": end of the buffer).
+    _NUMBER_TAIL = ("", *"0123456789.eE+-")
+
+    def __init__(self, source: IO[str]) -> None:
+        self.source = source
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        # Scan state of the object, array or string being read.
+        self._scan = 0
+        self._depth = 0
+        self._in_string = False
 
-            for row in reader:
-                title = row.get(col_name, "").strip()
-                user = row.get(col_user, "").strip()
-                password = row.get(col_pass, "")
+    def _fill(self) -> None:
+        chunk = self.source.read(READ_SIZE)
+        if not chunk:
+            self.eof = True
+        elif len(self.buf) - self.pos > MAX_RECORD:
+            raise ImportFormatError("JSON record too large to import.")
+        self.buf = self.buf[self.pos :] + chunk
+        self._scan -= self.pos
+        self.pos = 0
 
-                if not title or not password:
+    def _value_end(self) -> Optional[int]:
+        """
+        Offset just past the object, array or string starting at pos, or
+        None if the buffer does not hold all of it yet (the scan resumes
+        there on the next call).
+        """
+        buf, i = self.buf, self._scan
+        while True:
+            if self._in_string:
+                match = self._IN_STRING.search(buf, i)
+                if match is None:
+                    self._scan = len(buf)
+                    return None
+                i = match.end()
+                if match.group() == "\\":
+                    if i == len(buf):
+                        # The escaped character is in the next piece.
+                        self._scan = match.start()
+                        return None
+                    i += 1
                     continue
+                self._in_string = False
+                if self._depth == 0:
+                    return i
+                continue
+            match = self._STRUCTURAL.search(buf, i)
+            if match is None:
+                self._scan = len(buf)
+                return None
+            i = match.end()
+            char = match.group()
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth <= 0:
+                    return i
+
+    def peek(self) -> str:
+        """The next non-whitespace character, or "" at the end."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in self._WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def skip(self, char: str) -> bool:
+        if self.peek() != char:
+            return False
+        self.pos += 1
+        return True
+
+    def expect(self, char: str) -> None:
+        if not self.skip(char):
+            raise ImportFormatError(f"Malformed JSON: expected '{char}'.")
+
+    def value(self) -> Any:
+        if self.peek() in ("{", "[", '"'):
+            self._scan, self._depth, self._in_string = self.pos, 0, False
+            while self._value_end() is None:
+                if self.eof:
+                    raise ImportFormatError("Malformed JSON: unexpected end of input.")
+                self._fill()
+            try:
+                value, self.pos = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                raise ImportFormatError(f"Malformed JSON: {e}") from e
+            return value
+        # Numbers and literals are short; one at the end of the buffer may
+        # continue (the "-25" of "-25.5" decodes on its own).
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                if self.eof or self.buf[end : end + 1] not in self._NUMBER_TAIL:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ImportFormatError(f"Malformed JSON: {e}") from e
+            self._fill()
+
+
+def _bitwarden_row(item: Any) -> Optional[Row]:
+    """Entry fields of a Bitwarden login item; None for other item types."""
+    if not isinstance(item, dict):
+        raise ImportFormatError("Unrecognized Bitwarden export: items must be objects.")
+    login = item.get("login")
+    if item.get("type") != 1 or not isinstance(login, dict):
+        return None
+    uris = login.get("uris") or [{}]
+    return {
+        "title": (item.get("name") or "").strip(),
+        "username": (login.get("username") or "").strip(),
+        "password": login.get("password") or "",
+        "url": uris[0].get("uri") or "",
+        "notes": item.get("notes") or "",
+    }
+
+
+def bitwarden_rows(
+    source: IO[str], report: Optional[SkipReport] = None
+) -> Iterator[Tuple[int, Row]]:
+    """
+    Yields (item number, entry fields) per login of an unencrypted Bitwarden
+    JSON export, decoding one item at a time. Other item types (cards,
+    identities, secure notes) are reported as skipped.
+    """
+    stream = _JsonStream(source)
+    stream.expect("{")
+    found = False
+    while stream.peek() not in ("}", ""):
+        key = stream.value()
+        stream.expect(":")
+        if key != "items":
+            if stream.value() is True and key == "encrypted":
+                raise ImportFormatError(
+                    "Encrypted Bitwarden exports are not supported; export as JSON."
+                )
+        else:
+            found = True
+            position = 0
+            stream.expect("[")
+            while stream.peek() != "]":
+                item = stream.value()
+                position += 1
+                row = _bitwarden_row(item)
+                if row is not None:
+                    yield position, row
+                elif report is not None:
+                    report.add(position, str(item.get("name") or ""), "", "not a login")
+                if not stream.skip(","):
+                    break
+            stream.expect("]")
+        if not stream.skip(","):
+            break
+    stream.expect("}")
+    if not found:
+        raise ImportFormatError("Unrecognized Bitwarden export: no items.")
+
 
-                incoming_sig = f"{title.lower()}|{user.lower()}"
-
-                if incoming_sig in existing_signatures:
-                    skipped_details.append(f"{title} ({user})")
-                else:
-                    buffer_entries.append(
-                        {
-                            "title": title,
-                            "username": user,
-                            "password": password,
-                            "url": row.get(col_url, ""),
-                            "notes": row.get(col_note, ""),
-                        }
+def keepass_rows(
+    source: IO[bytes], report: Optional[SkipReport] = None
+) -> Iterator[Tuple[int, Row]]:
+    """
+    Yields (entry number, entry fields) per entry of a KeePass 2 XML export.
+    Elements are parsed incrementally and each entry, group and the Meta
+    block are dropped from the tree once read, so only the open path is in
+    memory. Entry history and the recycle bin are not imported. The export is
+    untrusted input: defusedxml rejects entity declarations and external
+    references instead of expanding them.
+    """
+    stack: list[Any] = []
+    recycle_bin = ""
+    # Stack index of the open recycle-bin group, None outside it.
+    bin_depth: Optional[int] = None
+    position = 0
+    try:
+        for event, elem in iterparse(source, events=("start", "end")):
+            if event == "start":
+                if not stack and elem.tag != "KeePassFile":
+                    raise ImportFormatError("Unrecognized KeePass export.")
+                stack.append(elem)
+                continue
+            stack.pop()
+            parent = stack[-1] if stack else None
+            if elem.tag == "RecycleBinUUID":
+                recycle_bin = elem.text or ""
+            elif elem.tag == "UUID" and parent is not None and parent.tag == "Group":
+                if recycle_bin and elem.text == recycle_bin:
+                    bin_depth = len(stack) - 1
+            elif elem.tag == "Group" and bin_depth == len(stack):
+                bin_depth = None
+            elif elem.tag == "Entry" and all(e.tag != "History" for e in stack):
+                position += 1
+                fields = {
+                    s.findtext("Key") or "": s.findtext("Value") or ""
+                    for s in elem.findall("String")
+                }
+                row = {
+                    "title": fields.get("Title", "").strip(),
+                    "username": fields.get("UserName", "").strip(),
+                    "password": fields.get("Password", ""),
+                    "url": fields.get("URL", ""),
+                    "notes": fields.get("Notes", ""),
+                }
+                if bin_depth is None:
+                    yield position, row
+                elif report is not None:
+                    report.add(
+                        position, row["title"], row["username"], "in recycle bin"
                     )
-                    existing_signatures.add(incoming_sig)
+            if parent is not None and elem.tag in ("Entry", "Group", "Meta"):
+                parent.remove(elem)
+    except ParseError as e:
+        raise ImportFormatError(f"Malformed KeePass XML: {e}") from e
+    except DefusedXmlException as e:
+        raise ImportFormatError(f"Refused KeePass XML: {e}") from e
 
-        if buffer_entries:
-            vault_manager.add_entries_bulk(buffer_entries)
-            imported_count = len(buffer_entries)
 
-        msg = f"{Fore.GREEN}[✓] Import finished.{Style.RESET_ALL}\n"
-        msg += f"    - New entries added: {imported_count}\n"
+Parser = Callable[[Any, Optional[SkipReport]], Iterator[Tuple[int, Row]]]
+# Format name -> (file extension, parser, read as bytes, label in messages).
+FORMATS: dict[str, Tuple[str, Parser, bool, str]] = {
+    "csv": (".csv", csv_rows, False, "CSV"),
+    "bitwarden": (".json", bitwarden_rows, False, "Bitwarden"),
+    "keepass": (".xml", keepass_rows, True, "KeePass"),
+}
+
+
+def new_rows(
+    rows: Iterable[Tuple[int, Row]], seen: set[bytes], report: SkipReport
+) -> Iterator[Row]:
+    """Drops rows without a title or password and duplicates of `seen`, which grows."""
+    for line, row in rows:
+        if not row["title"] or not row["password"]:
+            report.add(line, row["title"], row["username"], "missing title or password")
+            continue
+        sig = signature(row["title"], row["username"])
+        if sig in seen:
+            report.add(line, row["title"], row["username"], "duplicate")
+            continue
+        seen.add(sig)
+        yield row
+
+
+def chunked(rows: Iterable[Row], size: int) -> Iterator[list[Row]]:
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_rows(
+    rows: Iterable[Tuple[int, Row]],
+    vault_manager: VaultManager,
+    report: SkipReport,
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """
+    Streams parsed rows through dedupe into the vault, `chunk_size` at a
+    time, inside one transaction: a failure anywhere imports nothing, and
+    the vault is saved once. Any export parser can feed this pipeline.
+    """
+    # Titles and usernames are index fields: no entry body is decrypted.
+    seen = {signature(e["title"], e["username"]) for e in vault_manager.list_entries()}
+    imported = 0
+    with vault_manager.transaction():
+        for chunk in chunked(new_rows(rows, seen, report), chunk_size):
+            vault_manager.add_entries_bulk(chunk, audit=False)
+            imported += len(chunk)
+        if imported:
+            vault_manager.add_audit_event("IMPORT", f"Bulk imported {imported} entries")
+    return imported
+
+
+def summary(imported: int, report: SkipReport, source: str = "CSV") -> str:
+    msg = f"{Fore.GREEN}[✓] Import finished.{Style.RESET_ALL}\n"
+    msg += f"    - New entries added: {imported}\n"
+    for reason, count in report.other.items():
+        msg += f"    - Skipped ({reason}): {count}\n"
+
+    if report.duplicates:
+        msg += (
+            f"\n{Fore.YELLOW}[!] Skipped {report.duplicates} duplicates "
+            f"(already in your vault):{Style.RESET_ALL}\n"
+        )
+        msg += Fore.RED + "-" * 50 + "\n"
+        for item in report.sample:
+            msg += f"    [X] {item}\n"
+        if report.duplicates > len(report.sample):
+            msg += f"    ... and {report.duplicates - len(report.sample)} more\n"
+        msg += "-" * 50 + Style.RESET_ALL
+        msg += (
+            f"\n{Fore.CYAN}NOTE: If you wanted the {source} version of these duplicates,\n"
+            f"delete the old entry in Harpocrates and re-import.{Style.RESET_ALL}"
+        )
+    if report.path and (report.duplicates or report.other):
+        msg += f"\n    Skipped rows are listed in {report.path}"
+    return msg
+
+
+def _open_source(file_path: str, suffix: str, binary: bool = False) -> IO[Any]:
+    """Opens an export for reading; "-" is stdin (left open when closed)."""
+    if file_path == "-":
+        if binary:
+            return open(sys.stdin.fileno(), "rb", closefd=False)
+        return open(sys.stdin.fileno(), newline="", encoding="utf-8", closefd=False)
+    try:
+        resolved = Path(file_path).resolve(strict=True)
+    except (FileNotFoundError, OSError):
+        raise ImportFormatError("file not found or inaccessible.")
+    if not resolved.is_file():
+        raise ImportFormatError("the path does not point to a file.")
+    if resolved.suffix.lower() != suffix:
+        raise ImportFormatError(f"the file must have a {suffix} extension.")
+    if binary:
+        return open(resolved, "rb")
+    return open(resolved, newline="", encoding="utf-8")
 
-        if skipped_details:
-            msg += (
-                f"\n{Fore.YELLOW}[!] Skipped {len(skipped_details)} duplicates "
-                f"(already in your vault):{Style.RESET_ALL}\n"
-            )
-            msg += Fore.RED + "-" * 50 + "\n"
-            for item in skipped_details:
-                msg += f"    [X] {item}\n"
-            msg += "-" * 50 + Style.RESET_ALL
-            msg += (
-                f"\n{Fore.CYAN}NOTE: If you wanted the CSV version of these duplicates,\n"
-                f"delete the old entry in Harpocrates and re-import.{Style.RESET_ALL}"
-            )
 
-        return imported_count, msg
+def detect_format(file_path: str) -> str:
+    """The import format for a file extension (CSV for stdin and unknown ones)."""
+    suffix = Path(file_path).suffix.lower()
+    for name, (extension, *_) in FORMATS.items():
+        if suffix == extension:
+            return name
+    return "csv"
 
+
+def import_file(
+    file_path: str,
+    vault_manager: VaultManager,
+    fmt: Optional[str] = None,
+    report_path: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Tuple[int, str]:
+    """
+    Imports a CSV, Bitwarden JSON or KeePass XML export ("-" reads stdin;
+    the format defaults to the file extension) in constant memory: records
+    are parsed, deduplicated and added in chunks, never collected. Skipped
+    records are counted, and written to `report_path` when given.
+    """
+    fmt = fmt or detect_format(file_path)
+    if fmt not in FORMATS:
+        return 0, f"{Fore.RED}Error: unknown import format {fmt!r}.{Style.RESET_ALL}"
+    suffix, parser, binary, label = FORMATS[fmt]
+    try:
+        source = _open_source(file_path, suffix, binary)
+    except ImportFormatError as e:
+        return 0, f"{Fore.RED}Error: {e}{Style.RESET_ALL}"
+
+    try:
+        with source, SkipReport(report_path) as report:
+            rows = parser(source, report)
+            imported = import_rows(rows, vault_manager, report, chunk_size)
+        return imported, summary(imported, report, label)
+
+    except ImportFormatError as e:
+        return 0, f"{Fore.RED}{e}{Style.RESET_ALL}"
     except Exception as e:
         return 0, f"{Fore.RED}Critical error importing: {str(e)}{Style.RESET_ALL}"
+
+
+def import_from_csv(
+    file_path: str,
+    vault_manager: VaultManager,
+    report_path: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Tuple[int, str]:
+    """Imports a CSV export ("-" reads stdin); see import_file."""
+    return import_file(file_path, vault_manager, "csv", report_path, chunk_size)
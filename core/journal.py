@@ -0,0 +1,103 @@
+import json
+import os
+import struct
+from typing import Any, Optional
+from core.crypto import HarpocratesCrypto
+from core.exceptions import VaultCorruptError
+
+JOURNAL_MAGIC = b"HPJ1"
+_LEN = struct.Struct(">I")
+_SEQ = struct.Struct(">Q")
+
+
+class VaultJournal:
+    """
+    Append-only sidecar log of vault mutations.
+
+    Each record is sealed on its own with AES-GCM. The associated data binds it
+    to the base vault it extends (the nonce of the last full save) and to its
+    position in the journal, so records cannot be reordered or replayed on top
+    of a different base.
+    """
+
+    def __init__(self, vault_path: str, crypto: HarpocratesCrypto) -> None:
+        self.path: str = vault_path + ".journal"
+        self.crypto: HarpocratesCrypto = crypto
+        self.record_count: int = 0
+        self._base_tag: Optional[bytes] = None
+
+    def bind(self, base_tag: bytes) -> None:
+        """Attaches the journal to the base vault identified by base_tag."""
+        self._base_tag = base_tag
+        self.record_count = 0
+
+    def _header(self) -> bytes:
+        if self._base_tag is None:
+            raise VaultCorruptError("Journal is not bound to a base vault.")
+        return JOURNAL_MAGIC + bytes([len(self._base_tag)]) + self._base_tag
+
+    def _aad(self, seq: int) -> bytes:
+        return self._header() + _SEQ.pack(seq)
+
+    def append(self, session_key: bytes, record: dict[str, Any]) -> None:
+        """Seals a record and durably appends it to the journal."""
+        if self._base_tag is None:
+            raise VaultCorruptError("Journal is not bound to a base vault.")
+
+        sealed = self.crypto.seal_record(
+            json.dumps(record), session_key, self._aad(self.record_count)
+        )
+        is_new = self.record_count == 0
+        flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if is_new else os.O_APPEND)
+        fd = os.open(self.path, flags, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            if is_new:
+                f.write(self._header())
+            f.write(_LEN.pack(len(sealed)) + sealed)
+            f.flush()
+            os.fsync(f.fileno())
+        self.record_count += 1
+
+    def replay(self, session_key: bytes) -> list[dict[str, Any]]:
+        """
+        Returns the records appended on top of the bound base vault.
+        A journal left over from an older base is discarded, and a torn
+        trailing record (interrupted write) is truncated away.
+        """
+        if self._base_tag is None or not os.path.exists(self.path):
+            return []
+
+        with open(self.path, "rb") as f:
+            raw = f.read()
+
+        header = self._header()
+        if not raw.startswith(header):
+            self.discard()
+            return []
+
+        records: list[dict[str, Any]] = []
+        pos = len(header)
+        while pos + _LEN.size <= len(raw):
+            (size,) = _LEN.unpack_from(raw, pos)
+            end = pos + _LEN.size + size
+            if end > len(raw):
+                break
+            sealed = raw[pos + _LEN.size : end]
+            plaintext = self.crypto.open_record(
+                sealed, session_key, self._aad(len(records))
+            )
+            records.append(json.loads(plaintext))
+            pos = end
+
+        if pos < len(raw):
+            with open(self.path, "r+b") as f:
+                f.truncate(pos)
+
+        self.record_count = len(records)
+        return records
+
+    def discard(self) -> None:
+        """Removes the journal file; its records must already be in the base vault."""
+        self.record_count = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,139 @@
+import os
+import time
+from typing import Any, Callable, NamedTuple, Optional
+
+from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+
+from core.config import config
+from core.exceptions import VaultCorruptError
+
+KDF_NAME = "argon2id"
+
+# Bounds for parameters read from a vault header before it is authenticated:
+# an edited header must not make unlocking allocate unbounded memory or time.
+MIN_MEMORY_COST = 8 * 1024  # KiB
+MAX_MEMORY_COST = 4 * 1024 * 1024  # KiB (4 GiB)
+MAX_ITERATIONS = 64
+MAX_LANES = 64
+
+
+class KdfParams(NamedTuple):
+    """Argon2id cost parameters (memory in KiB) used to derive a vault key."""
+
+    memory_cost: int
+    iterations: int
+    lanes: int
+
+    @classmethod
+    def from_config(cls) -> "KdfParams":
+        return cls(
+            config.argon2_memory_cost, config.argon2_iterations, config.argon2_lanes
+        )
+
+    @classmethod
+    def from_header(cls, header: dict[str, Any]) -> Optional["KdfParams"]:
+        """Parameters recorded in a vault header, or None for older vaults."""
+        kdf = header.get("kdf")
+        if kdf is None:
+            return None
+        try:
+            if kdf["name"] != KDF_NAME:
+                raise ValueError(f"unsupported KDF {kdf['name']!r}")
+            params = cls(
+                int(kdf["memory_cost"]), int(kdf["iterations"]), int(kdf["lanes"])
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise VaultCorruptError(f"Malformed KDF parameters: {e}") from e
+        if not params.within_bounds():
+            raise VaultCorruptError("KDF parameters are out of bounds.")
+        return params
+
+    def within_bounds(self) -> bool:
+        return (
+            1 <= self.lanes <= MAX_LANES
+            and 1 <= self.iterations <= MAX_ITERATIONS
+            and max(MIN_MEMORY_COST, 8 * self.lanes)
+            <= self.memory_cost
+            <= MAX_MEMORY_COST
+        )
+
+    def to_header(self, salt: Optional[bytes] = None) -> dict[str, Any]:
+        header = {"name": KDF_NAME, **self._asdict()}
+        if salt is not None:
+            header["salt"] = salt.hex()
+        return header
+
+    @staticmethod
+    def salt_from_header(header: dict[str, Any]) -> Optional[bytes]:
+        """The Argon2 salt, stored with the costs since format 6 (None before)."""
+        kdf = header.get("kdf") or {}
+        if "salt" not in kdf:
+            return None
+        try:
+            salt = bytes.fromhex(kdf["salt"])
+        except (TypeError, ValueError) as e:
+            raise VaultCorruptError(f"Malformed KDF salt: {e}") from e
+        if not 8 <= len(salt) <= 64:
+            raise VaultCorruptError("KDF salt has an invalid length.")
+        return salt
+
+    def describe(self) -> str:
+        return (
+            f"{self.memory_cost // 1024} MiB, {self.iterations} iterations, "
+            f"{self.lanes} lanes"
+        )
+
+
+def derive_key(password: bytes, salt: bytes, params: KdfParams, length: int) -> bytes:
+    kdf = Argon2id(
+        salt=salt,
+        length=length,
+        iterations=params.iterations,
+        lanes=params.lanes,
+        memory_cost=params.memory_cost,
+        ad=None,
+        secret=None,
+    )
+    return kdf.derive(password)
+
+
+def measure(params: KdfParams) -> float:
+    """Seconds one derivation takes on this host (best of two runs)."""
+    salt = os.urandom(16)
+    best = float("inf")
+    for _ in range(2):
+        start = time.perf_counter()
+        derive_key(b"calibration", salt, params, 32)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def calibrate(
+    target: float = 0.5,
+    max_memory_cost: int = 256 * 1024,
+    lanes: Optional[int] = None,
+    timer: Callable[[KdfParams], float] = measure,
+) -> tuple[KdfParams, float]:
+    """
+    Picks Argon2id parameters whose derivation takes about `target` seconds
+    on this host: the most memory up to `max_memory_cost` (halved while a
+    single pass is already too slow), then as many passes as fit. Lanes
+    default to the core count. Returns the parameters and their measured time.
+    """
+    if lanes is None:
+        lanes = os.cpu_count() or 1
+    lanes = max(1, min(lanes, MAX_LANES))
+    memory = max(min(max_memory_cost, MAX_MEMORY_COST), MIN_MEMORY_COST, 8 * lanes)
+
+    one_pass = timer(KdfParams(memory, 1, lanes))
+    while one_pass > target and memory // 2 >= max(MIN_MEMORY_COST, 8 * lanes):
+        memory //= 2
+        one_pass = timer(KdfParams(memory, 1, lanes))
+
+    # Time grows linearly with passes after a fixed setup cost (allocation).
+    two_passes = timer(KdfParams(memory, 2, lanes))
+    per_pass = max(two_passes - one_pass, 1e-6)
+    setup = max(one_pass - per_pass, 0.0)
+    iterations = int((target - setup) / per_pass)
+    params = KdfParams(memory, max(1, min(iterations, MAX_ITERATIONS)), lanes)
+    return params, timer(params)
@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import struct
+from typing import Any
+from core.crypto import HarpocratesCrypto
+from core.exceptions import VaultCorruptError
+
+ARCHIVE_MAGIC = b"HPLA1"
+_SEQ = struct.Struct(">I")
+
+
+class LogArchive:
+    """
+    Encrypted storage for rotated audit log segments.
+
+    Each segment is a separate file in a directory next to the vault, sealed
+    with AES-GCM. The associated data binds it to the vault salt and to its
+    sequence number, so segments cannot be swapped between vaults or
+    reordered. The vault keeps the manifest (counts and boundary hashes).
+    """
+
+    def __init__(self, vault_path: str, crypto: HarpocratesCrypto) -> None:
+        self.directory: str = vault_path + ".logs"
+        self.crypto: HarpocratesCrypto = crypto
+
+    def path_for(self, seq: int) -> str:
+        return os.path.join(self.directory, f"segment-{seq:06d}.hpla")
+
+    @staticmethod
+    def _aad(salt: bytes, seq: int) -> bytes:
+        return ARCHIVE_MAGIC + salt + _SEQ.pack(seq)
+
+    def write(
+        self, seq: int, records: list[dict[str, Any]], key: bytes, salt: bytes
+    ) -> None:
+        """Durably writes one segment (atomically replacing a leftover one)."""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        sealed = self.crypto.seal_record(
+            json.dumps({"seq": seq, "records": records}), key, self._aad(salt, seq)
+        )
+        path = self.path_for(seq)
+        tmp_path = path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(ARCHIVE_MAGIC + sealed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def discard(self, seq: int) -> None:
+        """Removes a segment no saved vault refers to."""
+        try:
+            os.remove(self.path_for(seq))
+        except FileNotFoundError:
+            pass
+
+    def read(self, seq: int, key: bytes, salt: bytes) -> list[dict[str, Any]]:
+        """Decrypts one segment and returns its records, oldest first."""
+        try:
+            with open(self.path_for(seq), "rb") as f:
+                raw = f.read()
+        except OSError as e:
+            raise VaultCorruptError(f"Log archive segment {seq} is missing.") from e
+        if not raw.startswith(ARCHIVE_MAGIC):
+            raise VaultCorruptError(f"Log archive segment {seq} is malformed.")
+        plaintext = self.crypto.open_record(
+            raw[len(ARCHIVE_MAGIC) :], key, self._aad(salt, seq)
+        )
+        records: list[dict[str, Any]] = json.loads(plaintext)["records"]
+        return records
+
+    def replace_with(self, staging: "LogArchive") -> None:
+        """Moves the segments written in `staging` over this archive's directory."""
+        if not os.path.isdir(staging.directory):
+            return
+        retired = self.directory + ".old"
+        shutil.rmtree(retired, ignore_errors=True)
+        if os.path.isdir(self.directory):
+            os.replace(self.directory, retired)
+        os.replace(staging.directory, self.directory)
+        shutil.rmtree(retired, ignore_errors=True)
@@ -0,0 +1,352 @@
+import gc
+import json
+import struct
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from collections.abc import Iterator, Mapping, Sequence
+from contextlib import contextmanager
+from itertools import chain, repeat
+from operator import itemgetter
+from typing import Any, Optional
+
+from core.exceptions import HarpocratesError, VaultCorruptError
+from core.secure_memory import wipe_buffer
+from core.vault_format import BODY_FIELDS
+
+DEFAULT_CODEC = "json"
+
+INDEX_MAGIC = b"HPB1"
+# Sections of the index stored as tables; the rest is small and stays JSON.
+_TABLES = ("entries", "logs")
+
+# Column kinds: text, 64-bit integers, fixed-size lists of them (body ranges)
+# and anything else as one JSON document per cell.
+_STR, _INT, _INTS, _JSON = 0, 1, 2, 3
+_ABSENT = object()
+_INT64 = (-(2**63), 2**63 - 1)
+
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+# Cells of a text column are joined with NUL. Values containing NUL are stored
+# as JSON instead, whose escaping never produces a raw NUL.
+_SEPARATOR = "\x00"
+
+_U32_ARRAY = "I" if array("I").itemsize == 4 else "L"
+
+
+def _pack(typecode: str, values: Sequence[int]) -> bytes:
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode: str, raw: memoryview) -> list[int]:
+    values = array(typecode)
+    values.frombytes(raw)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tolist()
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """
+    Parsing allocates one container per record and nothing it builds can form
+    a cycle, so the collector's passes over a large index are pure overhead.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _dump_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True)
+
+
+def _fits_int64(values: list[int]) -> bool:
+    return not values or (_INT64[0] <= min(values) and max(values) <= _INT64[1])
+
+
+def _column_kind(column: list[Any]) -> tuple[int, int]:
+    """Returns the narrowest kind holding every value, and the list width for _INTS."""
+    types = set(map(type, column))
+    if types == {str}:
+        return _STR, 0
+    if types == {int} and _fits_int64(column):
+        return _INT, 0
+    if types == {list}:
+        widths = set(map(len, column))
+        flat = list(chain.from_iterable(column))
+        if len(widths) == 1 and set(map(type, flat)) == {int} and _fits_int64(flat):
+            return _INTS, widths.pop()
+    return _JSON, 0
+
+
+def _placeholder(kind: int, width: int) -> Any:
+    return {_STR: "", _INT: 0, _INTS: [0] * width, _JSON: None}[kind]
+
+
+def _encode_text(column: list[str]) -> Optional[bytes]:
+    """Joins a text column, or returns None if a value contains the separator."""
+    text = _SEPARATOR.join(column)
+    if text.count(_SEPARATOR) != max(len(column) - 1, 0):
+        return None
+    raw = text.encode("utf-8")
+    return _U32.pack(len(raw)) + raw
+
+
+def _encode_json(column: list[Any]) -> bytes:
+    encoded = _encode_text(list(map(_dump_json, column)))
+    if encoded is None:
+        # Unreachable: JSON escapes NUL, the column separator.
+        raise RuntimeError("JSON text contains the column separator.")
+    return encoded
+
+
+def encode_table(rows: Sequence[Mapping[str, Any]]) -> bytes:
+    """
+    Encodes flat records column by column:
+
+        rows u32 | columns u16 | per column:
+            kind u8 | name_len u16 | name | absent u32 | absent row numbers u32...
+            | str/json: text_len u32 | UTF-8 cells separated by NUL
+            | int: int64...   | int list: width u8 | int64...
+
+    Decoding a text column is one UTF-8 decode and one split, and numbers are
+    read straight from packed arrays: no per-value parsing.
+    """
+    names = list(dict.fromkeys(chain.from_iterable(rows)))
+    parts = [_U32.pack(len(rows)), _U16.pack(len(names))]
+    for name in names:
+        absent: list[int] = []
+        try:
+            column = list(map(itemgetter(name), rows))
+            kind, width = _column_kind(column)
+        except KeyError:
+            column = [row.get(name, _ABSENT) for row in rows]
+            absent = [i for i, v in enumerate(column) if v is _ABSENT]
+            kind, width = _column_kind([v for v in column if v is not _ABSENT])
+            filler = _placeholder(kind, width)
+            column = [filler if v is _ABSENT else v for v in column]
+
+        encoded = _encode_text(column) if kind == _STR else None
+        if encoded is not None:
+            data = encoded
+        elif kind == _STR:
+            kind, data = _JSON, _encode_json(column)
+        elif kind == _INT:
+            data = _pack("q", column)
+        elif kind == _INTS:
+            data = _U8.pack(width) + _pack("q", list(chain.from_iterable(column)))
+        else:
+            data = _encode_json(column)
+
+        raw_name = name.encode("utf-8")
+        parts += [_U8.pack(kind), _U16.pack(len(raw_name)), raw_name]
+        parts += [_U32.pack(len(absent)), _pack(_U32_ARRAY, absent), data]
+    return b"".join(parts)
+
+
+def _decode_text(reader: "_Reader", count: int) -> list[str]:
+    cells = reader.text(reader.unpack(_U32)).split(_SEPARATOR) if count else []
+    if len(cells) != count:
+        raise VaultCorruptError("Unexpected data corruption: cell count mismatch.")
+    return cells
+
+
+def decode_table(reader: "_Reader") -> list[dict[str, Any]]:
+    count = reader.unpack(_U32)
+    names: list[str] = []
+    columns: list[list[Any]] = []
+    missing: list[tuple[str, list[int]]] = []
+    for _ in range(reader.unpack(_U16)):
+        kind = reader.unpack(_U8)
+        name = reader.text(reader.unpack(_U16))
+        absent = _unpack(_U32_ARRAY, reader.take(4 * reader.unpack(_U32)))
+        if kind == _STR:
+            column: list[Any] = _decode_text(reader, count)
+        elif kind == _INT:
+            column = _unpack("q", reader.take(8 * count))
+        elif kind == _INTS:
+            width = reader.unpack(_U8)
+            flat = iter(_unpack("q", reader.take(8 * count * width)))
+            column = list(map(list, zip(*[flat] * width))) if width else [[]] * count
+        elif kind == _JSON:
+            column = list(map(json.loads, _decode_text(reader, count)))
+        else:
+            raise VaultCorruptError(f"Unexpected data corruption: column kind {kind}.")
+        names.append(name)
+        columns.append(column)
+        if absent:
+            missing.append((name, absent))
+
+    if names:
+        rows = list(map(dict, map(zip, repeat(names), zip(*columns))))
+    else:
+        rows = [{} for _ in range(count)]
+    try:
+        for name, absent in missing:
+            for i in absent:
+                del rows[i][name]
+    except IndexError as e:
+        raise VaultCorruptError("Unexpected data corruption: bad row number.") from e
+    return rows
+
+
+class _Reader:
+    """Bounds-checked cursor over a decrypted buffer."""
+
+    def __init__(self, view: memoryview) -> None:
+        self.view = view
+        self.pos = 0
+
+    def take(self, size: int) -> memoryview:
+        end = self.pos + size
+        if end > len(self.view):
+            raise VaultCorruptError("Unexpected data corruption: truncated payload.")
+        chunk = self.view[self.pos : end]
+        self.pos = end
+        return chunk
+
+    def unpack(self, fmt: struct.Struct) -> int:
+        value: int = fmt.unpack(self.take(fmt.size))[0]
+        return value
+
+    def text(self, size: int) -> str:
+        return str(self.take(size), "utf-8")
+
+    def check_end(self) -> None:
+        if self.pos != len(self.view):
+            raise VaultCorruptError("Unexpected data corruption: trailing data.")
+
+
+class PayloadCodec(ABC):
+    """Serializes the encrypted parts of a vault: the index and entry bodies."""
+
+    name = ""
+
+    @abstractmethod
+    def dump_index(self, index: Mapping[str, Any]) -> bytes:
+        """Serializes the index (entry metadata, logs and settings)."""
+
+    @abstractmethod
+    def load_index(self, plaintext: bytearray) -> dict[str, Any]:
+        """Parses a decrypted index and wipes the buffer."""
+
+    @abstractmethod
+    def dump_body(self, body: Mapping[str, str]) -> bytes:
+        """Serializes the secret fields of one entry."""
+
+    @abstractmethod
+    def load_body(self, plaintext: bytearray) -> dict[str, Any]:
+        """Parses a decrypted entry body and wipes the buffer."""
+
+
+class JsonCodec(PayloadCodec):
+    name = "json"
+
+    def dump_index(self, index: Mapping[str, Any]) -> bytes:
+        return json.dumps(index).encode("utf-8")
+
+    def load_index(self, plaintext: bytearray) -> dict[str, Any]:
+        with _gc_paused():
+            return self.load_body(plaintext)
+
+    def dump_body(self, body: Mapping[str, str]) -> bytes:
+        return self.dump_index(body)
+
+    def load_body(self, plaintext: bytearray) -> dict[str, Any]:
+        """
+        The buffer is decoded, zeroed and released before parsing so it does
+        not coexist with the parsed objects at peak memory.
+        """
+        try:
+            text = plaintext.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise VaultCorruptError(f"Unexpected data corruption: {e}") from e
+        finally:
+            wipe_buffer(plaintext)
+            del plaintext[:]
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise VaultCorruptError(f"Unexpected data corruption: {e}") from e
+        if not isinstance(data, dict):
+            raise VaultCorruptError("Unexpected data corruption: not an object.")
+        return data
+
+
+class BinaryCodec(PayloadCodec):
+    """
+    Length-prefixed binary payloads. Entries and logs are stored as column
+    tables (see encode_table); bodies are the BODY_FIELDS values, each
+    prefixed with its UTF-8 length. Little-endian throughout.
+    """
+
+    name = "binary"
+
+    def dump_index(self, index: Mapping[str, Any]) -> bytes:
+        meta = _dump_json({k: v for k, v in index.items() if k not in _TABLES})
+        raw_meta = meta.encode("utf-8")
+        parts = [INDEX_MAGIC, _U32.pack(len(raw_meta)), raw_meta]
+        parts += [encode_table(index.get(table, [])) for table in _TABLES]
+        return b"".join(parts)
+
+    def load_index(self, plaintext: bytearray) -> dict[str, Any]:
+        try:
+            with memoryview(plaintext) as view, _gc_paused():
+                reader = _Reader(view)
+                if bytes(reader.take(len(INDEX_MAGIC))) != INDEX_MAGIC:
+                    raise VaultCorruptError("Unexpected data corruption: bad magic.")
+                data: dict[str, Any] = json.loads(reader.text(reader.unpack(_U32)))
+                for table in _TABLES:
+                    data[table] = decode_table(reader)
+                reader.check_end()
+                del reader
+        except (UnicodeDecodeError, ValueError) as e:
+            raise VaultCorruptError(f"Unexpected data corruption: {e}") from e
+        finally:
+            wipe_buffer(plaintext)
+            del plaintext[:]
+        return data
+
+    def dump_body(self, body: Mapping[str, str]) -> bytes:
+        parts = []
+        for field in BODY_FIELDS:
+            raw = body.get(field, "").encode("utf-8")
+            parts += [_U32.pack(len(raw)), raw]
+        return b"".join(parts)
+
+    def load_body(self, plaintext: bytearray) -> dict[str, Any]:
+        try:
+            with memoryview(plaintext) as view:
+                reader = _Reader(view)
+                body = {f: reader.text(reader.unpack(_U32)) for f in BODY_FIELDS}
+                reader.check_end()
+                del reader
+        except UnicodeDecodeError as e:
+            raise VaultCorruptError(f"Unexpected data corruption: {e}") from e
+        finally:
+            wipe_buffer(plaintext)
+            del plaintext[:]
+        return body
+
+
+CODECS: dict[str, PayloadCodec] = {c.name: c for c in (JsonCodec(), BinaryCodec())}
+
+
+def get_codec(name: str) -> PayloadCodec:
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise HarpocratesError(
+            f"Unknown payload codec '{name}' (expected one of: {', '.join(CODECS)})."
+        ) from None
@@ -0,0 +1,158 @@
+import functools
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Iterator,
+    Optional,
+    ParamSpec,
+    TextIO,
+    TypeVar,
+)
+
+from core.config import config
+
+# Spans are no-ops until enable() is called: the hot paths pay one call.
+_DISABLED: ContextManager[None] = nullcontext()
+_enabled = False
+_command = "startup"
+_lock = threading.Lock()
+# (command, span path) -> [count, total seconds, max seconds]
+_totals: dict[tuple[str, str], list[float]] = {}
+# Commands in the order they first ran, for the report.
+_order: dict[str, int] = {}
+_stack = threading.local()
+_TEXT_TARGETS = ("1", "true", "t", "text")
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = on
+
+
+def reset() -> None:
+    global _command
+    with _lock:
+        _totals.clear()
+        _order.clear()
+    _command = "startup"
+
+
+def span(name: str) -> ContextManager[None]:
+    """
+    Times a phase. Nested spans are recorded under their parent's path
+    ("load_vault/decrypt"); spans opened in worker threads start a new path.
+    """
+    if not _enabled:
+        return _DISABLED
+    return _timed(name)
+
+
+@contextmanager
+def _timed(name: str) -> Iterator[None]:
+    stack: list[str] = getattr(_stack, "names", None) or []
+    _stack.names = stack
+    stack.append(name)
+    path = "/".join(stack)
+    command = _command
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stack.pop()
+        _record(command, path, time.perf_counter() - start)
+
+
+def _record(command: str, path: str, elapsed: float) -> None:
+    with _lock:
+        _order.setdefault(command, len(_order))
+        totals = _totals.setdefault((command, path), [0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += elapsed
+        totals[2] = max(totals[2], elapsed)
+
+
+def timed(name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Decorator form of span() for functions timed as a whole."""
+
+    def decorate(func: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _timed(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def command(name: str) -> Iterator[None]:
+    """Attributes the spans recorded meanwhile (in any thread) to a CLI command."""
+    global _command
+    previous, _command = _command, name
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _command = previous
+        if _enabled:
+            _record(name, "(wall time)", time.perf_counter() - start)
+
+
+def results() -> list[dict[str, Any]]:
+    with _lock:
+        items = sorted(_totals.items(), key=lambda item: (_order[item[0][0]], item[0]))
+    return [
+        {
+            "command": cmd,
+            "span": path,
+            "count": int(count),
+            "total_ms": round(total * 1000, 3),
+            "max_ms": round(peak * 1000, 3),
+        }
+        for (cmd, path), (count, total, peak) in items
+    ]
+
+
+def format_report() -> str:
+    lines = ["", "--- PROFILE (ms) ---"]
+    current = None
+    for row in results():
+        if row["command"] != current:
+            current = row["command"]
+            lines.append(f"[{current}]")
+        depth = row["span"].count("/")
+        label = "  " * depth + row["span"].rsplit("/", 1)[-1]
+        lines.append(
+            f"    {label:<34}{row['total_ms']:>11.1f}  x{row['count']:<6}"
+            f"max {row['max_ms']:.1f}"
+        )
+    return "\n".join(lines)
+
+
+def write_report(target: Optional[str] = None, stream: TextIO = sys.stderr) -> None:
+    """
+    Writes the breakdown at exit: a text table for "1"/"true"/"text" (the
+    default is the HARPOCRATES_PROFILE setting), else JSON to that path.
+    """
+    target = config.profile if target is None else target
+    if target.lower() in _TEXT_TARGETS:
+        print(format_report(), file=stream)
+        return
+    with open(target, "w", encoding="utf-8") as f:
+        json.dump({"spans": results()}, f, indent=2)
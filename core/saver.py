@@ -0,0 +1,123 @@
+import threading
+import time
+import weakref
+from typing import Callable, Optional
+
+from core.exceptions import HarpocratesError
+
+# Every live saver, so exit paths can flush without holding a vault reference.
+_savers: "weakref.WeakSet[WriteBehindSaver]" = weakref.WeakSet()
+
+
+class WriteBehindSaver:
+    """
+    Runs `save` on a background thread once changes stop arriving for
+    `delay` seconds (or at most `max_delay` after the first one), so a burst
+    of commits costs a single durable write. `flush` writes any pending
+    change before returning; `close` also stops the thread. A failed
+    background save keeps the changes pending and is raised by the next
+    `mark_dirty` or `flush`.
+    """
+
+    def __init__(
+        self,
+        save: Callable[[], None],
+        delay: float,
+        max_delay: Optional[float] = None,
+    ) -> None:
+        self._save = save
+        self.delay = delay
+        self.max_delay = 10 * delay if max_delay is None else max_delay
+        self._cond = threading.Condition()
+        self._dirty = False
+        self._saving = False
+        self._closed = False
+        self._first_change = 0.0
+        self._deadline = 0.0
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._run, name="write-behind", daemon=True
+        )
+        self._thread.start()
+        _savers.add(self)
+
+    @property
+    def pending(self) -> bool:
+        with self._cond:
+            return self._dirty or self._saving or self._error is not None
+
+    def _raise_error(self) -> None:
+        error, self._error = self._error, None
+        if error is not None:
+            raise HarpocratesError(f"Background save failed: {error}") from error
+
+    def mark_dirty(self) -> None:
+        """Schedules a save, pushing it back while changes keep coming."""
+        with self._cond:
+            if self._closed:
+                raise HarpocratesError("The background saver is closed.")
+            now = time.monotonic()
+            if not self._dirty:
+                self._first_change = now
+            self._dirty = True
+            self._deadline = min(now + self.delay, self._first_change + self.max_delay)
+            self._cond.notify_all()
+            self._raise_error()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed:
+                    self._cond.wait()
+                if not self._dirty:
+                    return
+                wait = self._deadline - time.monotonic()
+                if wait > 0 and not self._closed:
+                    # Woken early by a new change (new deadline) or by close().
+                    self._cond.wait(wait)
+                    continue
+                self._dirty = False
+                self._saving = True
+            try:
+                self._save()
+            except BaseException as e:
+                # Not retried here (that would spin): the next change or flush retries.
+                with self._cond:
+                    self._error = e
+            finally:
+                with self._cond:
+                    self._saving = False
+                    self._cond.notify_all()
+
+    def flush(self) -> None:
+        """Writes pending changes now, in the calling thread, and waits for them."""
+        with self._cond:
+            while self._saving:
+                self._cond.wait()
+            dirty = self._dirty or self._error is not None
+            self._dirty = False
+            # Retrying below supersedes a failed background save.
+            self._error = None
+        if dirty:
+            try:
+                self._save()
+            except BaseException:
+                with self._cond:
+                    self._dirty = True
+                raise
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            self._thread.join()
+            _savers.discard(self)
+
+
+def flush_all() -> None:
+    """Flushes every open saver (exit, auto-lock and interrupt paths)."""
+    for saver in list(_savers):
+        saver.flush()
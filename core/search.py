@@ -0,0 +1,140 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Any, Iterable, Mapping
+
+SEARCH_FIELDS = ("title", "username", "url")
+_WORD = re.compile(r"\w+")
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _index_keys(fields: Iterable[str]) -> set[str]:
+    """Trigrams of every field plus 1- and 2-char word prefixes for short queries."""
+    keys: set[str] = set()
+    for text in fields:
+        keys |= _trigrams(text)
+        for word in _WORD.findall(text):
+            keys.add("^" + word[:1])
+            keys.add("^" + word[:2])
+    return keys
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over the non-secret entry fields (title,
+    username, URL), keyed by entry id. Queries of three or more characters
+    are matched by trigram overlap, which tolerates typos; shorter ones
+    match the start of any word. Substring matches rank first (title
+    prefix, title, username/URL), then partial matches by the share of
+    query trigrams they contain.
+    """
+
+    def __init__(self) -> None:
+        # Postings hold small integer doc numbers: much cheaper to hash and
+        # intersect than the entry ids they stand for.
+        self._doc_of: dict[str, int] = {}
+        self._entry_ids: list[str] = []
+        self._docs: list[tuple[str, ...]] = []
+        self._free: list[int] = []
+        self._postings: dict[str, set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_of)
+
+    def add(self, entry_id: str, entry: Mapping[str, Any]) -> None:
+        """Indexes an entry, replacing what was indexed for the same id."""
+        self.remove(entry_id)
+        fields = tuple(str(entry.get(f) or "").lower() for f in SEARCH_FIELDS)
+        if self._free:
+            doc = self._free.pop()
+            self._entry_ids[doc] = entry_id
+            self._docs[doc] = fields
+        else:
+            doc = len(self._docs)
+            self._entry_ids.append(entry_id)
+            self._docs.append(fields)
+        self._doc_of[entry_id] = doc
+        for key in _index_keys(fields):
+            self._postings.setdefault(key, set()).add(doc)
+
+    def remove(self, entry_id: str) -> None:
+        doc = self._doc_of.pop(entry_id, None)
+        if doc is None:
+            return
+        for key in _index_keys(self._docs[doc]):
+            docs = self._postings.get(key)
+            if docs is not None:
+                docs.discard(doc)
+                if not docs:
+                    del self._postings[key]
+        self._docs[doc] = ()
+        self._free.append(doc)
+
+    def _rank_exact(self, q: str, candidates: set[int], limit: int) -> list[int]:
+        """
+        Orders entries containing every query trigram: title prefix matches,
+        then title, username/URL substring matches, then the rest. Each tier
+        is sorted by title only as far as needed to fill `limit`.
+        """
+        docs = self._docs
+        in_title = [d for d in candidates if q in docs[d][0]]
+        rest = candidates.difference(in_title)
+        in_other = [d for d in rest if q in docs[d][1] or q in docs[d][2]]
+        tiers = (
+            [d for d in in_title if docs[d][0].startswith(q)],
+            [d for d in in_title if not docs[d][0].startswith(q)],
+            in_other,
+            rest.difference(in_other),
+        )
+        results: list[int] = []
+        for tier in tiers:
+            missing = limit - len(results)
+            if missing <= 0:
+                break
+            results.extend(heapq.nsmallest(missing, tier, key=self._title))
+        return results
+
+    def _title(self, doc: int) -> str:
+        return self._docs[doc][0]
+
+    def search(
+        self, query: str, limit: int = 50, min_similarity: float = 0.5
+    ) -> list[str]:
+        """Returns the ids of the best matches, best first."""
+        return [self._entry_ids[d] for d in self._search(query, limit, min_similarity)]
+
+    def _search(self, query: str, limit: int, min_similarity: float) -> list[int]:
+        q = query.strip().lower()
+        if not q:
+            return []
+        if len(q) < 3:
+            return self._rank_exact(q, self._postings.get("^" + q, set()), limit)
+
+        # Rarest trigrams first: the intersection shrinks as fast as possible.
+        postings = sorted(
+            (self._postings.get(gram, set()) for gram in _trigrams(q)), key=len
+        )
+        exact = postings[0].intersection(*postings[1:])
+        results = self._rank_exact(q, exact, limit)
+        if len(results) >= limit:
+            return results
+
+        # Fuzzy fill: below a full match the score is the share of trigrams hit.
+        hits: Counter[int] = Counter()
+        for docs in postings:
+            hits.update(docs)
+        needed = max(1, math.ceil(len(postings) * min_similarity))
+        buckets: dict[int, list[int]] = {}
+        for doc, n in hits.items():
+            if needed <= n < len(postings):
+                buckets.setdefault(n, []).append(doc)
+        for n in sorted(buckets, reverse=True):
+            missing = limit - len(results)
+            if missing <= 0:
+                break
+            results.extend(heapq.nsmallest(missing, buckets[n], key=self._title))
+        return results
@@ -1,5 +1,15 @@
 from typing import Any, Type, Optional
 
+_WIPE_CHUNK = 1 << 20
+
+
+def wipe_buffer(buffer: bytearray) -> None:
+    """Overwrites a bytearray with zeros in place (chunked, no full-size temporary)."""
+    zeros = bytes(min(len(buffer), _WIPE_CHUNK))
+    for start in range(0, len(buffer), _WIPE_CHUNK):
+        end = min(start + _WIPE_CHUNK, len(buffer))
+        buffer[start:end] = zeros[: end - start]
+
 
 class SecureString:
     """
@@ -32,6 +42,5 @@ class SecureString:
         """Overwrites the internal bytearray with zeros."""
         if hasattr(self, "_buffer") and self._buffer is not None:
             # Explicitly overwrite the mutable bytearray with zeros
-            for i in range(len(self._buffer)):
-                self._buffer[i] = 0
+            wipe_buffer(self._buffer)
             del self._buffer
@@ -1,21 +1,60 @@
-import json
+import mmap
 import os
-import copy
 import hashlib
 import hmac
-from datetime import datetime
-from typing import Any, Optional
+import logging
+import secrets
+import shutil
+import threading
+import warnings
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import Any, Callable, Iterator, Optional
+from core.agent import AgentClient
+from core.agent import key_id as agent_key_id
+from core.audit_log import (
+    GENESIS_PREV_HASH,
+    TIMESTAMP_FORMAT,
+    canonical_record,
+    record_digest,
+    stamp_hash,
+)
 from core.crypto import HarpocratesCrypto
+from core.entry import Entry
+from core.journal import VaultJournal
+from core.kdf import KdfParams
+from core.saver import WriteBehindSaver
+from core.search import SearchIndex
+from core.views import EntryView, LogView, Record
+from core.log_archive import LogArchive
+from core.compression import (
+    ALGORITHMS,
+    NO_COMPRESSION,
+    check_algorithm,
+    compress,
+    decompress,
+)
+from core.payload_codec import CODECS, DEFAULT_CODEC, PayloadCodec, get_codec
+from core import vault_format
+from core.vault_format import BODY_FIELDS, VaultFileV3
 from core.exceptions import (
+    AuthenticationError,
     HarpocratesError,
     VaultNotFoundError,
     VaultCorruptError,
     VaultMigrationRequired,
 )
+from core import profiler
 from core.config import config
 
 VERSION = "2.0.0"
-VAULT_FORMAT = 2
+VAULT_FORMAT = 6
+
+# Marks a field that did not exist before an update (undo log).
+_MISSING = object()
+
+logger = logging.getLogger(__name__)
 
 
 class VaultManager:
@@ -24,150 +63,1043 @@ class VaultManager:
         self.crypto: HarpocratesCrypto = HarpocratesCrypto()
         self._data: Optional[dict[str, Any]] = None
         self._session_key: Optional[bytes] = None
+        # Identifies the vault in every associated data (bodies, index, archives).
         self._salt: Optional[bytes] = None
+        # Envelope (format 6): the contents are encrypted with a random data key
+        # (_session_key) sealed by the Argon2 key of the credentials and this salt.
+        self._kdf_salt: Optional[bytes] = None
+        self._wrapped_key: Optional[bytes] = None
+        # Read-only mapping of the vault file; sealed entry bodies are read in place.
+        self._mapping: Optional[mmap.mmap] = None
+        # Absolute (offset, length) in the mapping of bodies not decrypted (or changed) yet.
+        self._sealed_bodies: dict[str, tuple[int, int]] = {}
+        # Serialization of the sealed index and bodies, recorded in the file header.
+        self.payload_codec: str = DEFAULT_CODEC
+        # Compression of the sealed index, applied on every save (loads read the header).
+        self.compression: str = check_algorithm(
+            config.vault_compression or NO_COMPRESSION
+        )
+        # Optional key cache shared between processes (see core.agent).
+        self.agent: AgentClient = AgentClient()
+        # Argon2 costs of the current key, recorded in the header of every save.
+        self.kdf_params: KdfParams = KdfParams.from_config()
+        self.journal: VaultJournal = VaultJournal(self.vault_path, self.crypto)
+        self.journal_enabled: bool = config.journal_enabled
+        self.log_archive: LogArchive = LogArchive(self.vault_path, self.crypto)
+        # Built on the first search, then kept in sync by every entry mutation.
+        self._search_index: Optional[SearchIndex] = None
+        self._positions: Optional[dict[str, int]] = None
+        # Write-behind: commits mark the vault dirty and one background thread
+        # saves once they stop arriving. The lock guards state a save reads.
+        self.write_behind_delay: float = config.write_behind_delay
+        self._saver: Optional[WriteBehindSaver] = None
+        self._lock = threading.RLock()
+        # Open transaction: deferred ops and the undo log of in-memory changes.
+        self._txn_ops: Optional[list[dict[str, Any]]] = None
+        self._undo: list[Callable[[], object]] = []
 
     def create_new_vault(self, master_password: str, secret_key: str) -> None:
         """Initializes a new vault with the latest schema and a signed genesis log."""
+        self.kdf_params = KdfParams.from_config()
+        if not self.kdf_params.within_bounds():
+            raise HarpocratesError(f"Unsupported Argon2 parameters: {self.kdf_params}")
         self._salt = os.urandom(self.crypto.salt_size)
-        self._session_key = self.crypto.derive_session_key(
-            master_password, secret_key, self._salt
+        self._kdf_salt = os.urandom(self.crypto.salt_size)
+        kek = self.crypto.derive_session_key(
+            master_password, secret_key, self._kdf_salt, self.kdf_params
+        )
+        self._session_key = self.crypto.generate_data_key()
+        self._wrapped_key = self.crypto.wrap_key(
+            kek, self._session_key, vault_format.key_aad(self._salt)
         )
+        self.agent.put_key(
+            agent_key_id(self._kdf_salt, self.kdf_params), self._session_key
+        )
+        self.payload_codec = get_codec(config.vault_codec or DEFAULT_CODEC).name
         self._data = {
             "vault_format": VAULT_FORMAT,
             "app_version": VERSION,
             "entries": [],
             "logs": [],
         }
+        self._sealed_bodies = {}
         self._append_log("SYSTEM", "Vault Created")
         self._update_genesis_hmac()
         self.save_vault()
 
-    def _update_genesis_hmac(self) -> None:
-        """Calculates and stores the HMAC for the genesis block (the oldest log)."""
-        if not self._data or not self._data.get("logs") or not self._session_key:
+    def _update_genesis_hmac(self, genesis: Optional[dict[str, Any]] = None) -> None:
+        """
+        Calculates and stores the HMAC for the genesis block: the oldest live
+        log unless given (once rotated, it is the first archived record).
+        """
+        if not self._data or not self._session_key:
             return
-        genesis_log = self._data["logs"][-1]
-        message = json.dumps(genesis_log, sort_keys=True).encode("utf-8")
+        if genesis is None:
+            if not self._data.get("logs"):
+                return
+            genesis = self._data["logs"][0]
+        message = canonical_record(genesis)
         mac = hmac.HMAC(self._session_key, message, hashlib.sha256)
         self._data["log_genesis_hmac"] = mac.hexdigest()
 
-    def load_vault(self, master_password: str, secret_key: str) -> bool:
-        if not os.path.exists(self.vault_path):
-            raise VaultNotFoundError(f"Vault file not found: {self.vault_path}")
+    def derive_subkey(self, purpose: str) -> bytes:
+        """Derives an independent key for auxiliary files (caches, etc.) from the session key."""
+        if self._session_key is None:
+            raise HarpocratesError("Vault is locked.")
+        label = f"harpocrates:{purpose}".encode("utf-8")
+        return hmac.HMAC(self._session_key, label, hashlib.sha256).digest()
 
+    def _map_vault_file(self) -> mmap.mmap:
         with open(self.vault_path, "rb") as f:
-            encrypted_data = f.read()
+            try:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise VaultCorruptError("Vault file is empty.") from e
 
-        salt = encrypted_data[: self.crypto.salt_size]
-        session_key = self.crypto.derive_session_key(master_password, secret_key, salt)
+    @staticmethod
+    def _close_mapping(mapping: Optional[mmap.mmap]) -> None:
+        if mapping is None:
+            return
+        try:
+            mapping.close()
+        except BufferError:
+            # A view is still alive somewhere; the mapping is released with it.
+            pass
 
-        decrypted_json = self.crypto.decrypt_with_session_key(
-            encrypted_data, session_key, salt
-        )
-        data = json.loads(decrypted_json)
+    @property
+    def _codec(self) -> PayloadCodec:
+        return CODECS[self.payload_codec]
+
+    def _session_key_for(
+        self,
+        master_password: Optional[str],
+        secret_key: Optional[str],
+        salt: bytes,
+        params: KdfParams,
+    ) -> bytes:
+        """
+        Derives the key of the credentials or, without credentials, takes the
+        unwrapped vault key from the key agent. A typed password is always
+        checked by derivation: the agent is never a shortcut around wrong
+        credentials.
+        """
+        if master_password is None or secret_key is None:
+            key = self.agent.get_key(agent_key_id(salt, params))
+            if key is None:
+                raise AuthenticationError("No unlocked key in the agent.")
+            return key
+        return self.crypto.derive_session_key(master_password, secret_key, salt, params)
+
+    @profiler.timed("load_vault")
+    def load_vault(
+        self, master_password: Optional[str] = None, secret_key: Optional[str] = None
+    ) -> bool:
+        """
+        Unlocks the vault. The file is memory-mapped and decrypted in place:
+        for v3 files only the index (titles, usernames and logs) is decrypted,
+        and entry secrets stay sealed in the mapping until they are accessed.
+        Without credentials the key comes from a running key agent; with
+        them, the derived key is handed to the agent (if any) once it opens
+        the vault.
+        """
+        if not os.path.exists(self.vault_path):
+            raise VaultNotFoundError(f"Vault file not found: {self.vault_path}")
+
+        with profiler.span("map_file"):
+            mapping = self._map_vault_file()
+        sealed_bodies: dict[str, tuple[int, int]] = {}
+        try:
+            if VaultFileV3.is_v3(mapping):
+                vault_file = VaultFileV3.parse(mapping, self.crypto.salt_size)
+                salt = vault_file.salt
+                codec_name = vault_file.header.get("codec", DEFAULT_CODEC)
+                compression = vault_file.header.get("compression", NO_COMPRESSION)
+                if codec_name not in CODECS or compression not in ALGORITHMS:
+                    raise VaultCorruptError(
+                        "Vault payload encoding is not supported by this version."
+                    )
+                # Vaults saved before the header recorded them used the configured costs.
+                kdf_params = KdfParams.from_header(vault_file.header)
+                kdf_params = kdf_params or KdfParams.from_config()
+                # Before format 6 the key was derived with the file salt, unwrapped.
+                kdf_salt = KdfParams.salt_from_header(vault_file.header) or salt
+                wrapped_key = self._wrapped_key_from(vault_file.header)
+                session_key = self._session_key_for(
+                    master_password, secret_key, kdf_salt, kdf_params
+                )
+                if wrapped_key is not None and master_password is not None:
+                    session_key = self.crypto.unwrap_key(
+                        session_key, wrapped_key, vault_format.key_aad(salt)
+                    )
+                start = vault_file.index_offset
+                end = start + vault_file.index_length
+                with memoryview(mapping) as view, view[start:end] as sealed_index:
+                    plaintext = self.crypto.open_record_into(
+                        sealed_index, session_key, vault_file.prefix
+                    )
+                with profiler.span("decompress"):
+                    plaintext = decompress(compression, plaintext)
+                with profiler.span("parse"):
+                    data = CODECS[codec_name].load_index(plaintext)
+                for entry in data.get("entries", []):
+                    offset, length = entry.pop("body")
+                    sealed_bodies[entry["id"]] = vault_file.body_range(offset, length)
+                base_tag = mapping[start : start + self.crypto.nonce_size]
+            else:
+                salt = mapping[: self.crypto.salt_size]
+                codec_name, compression = DEFAULT_CODEC, NO_COMPRESSION
+                kdf_params = KdfParams.from_config()
+                kdf_salt, wrapped_key = salt, None
+                session_key = self._session_key_for(
+                    master_password, secret_key, salt, kdf_params
+                )
+                with memoryview(mapping) as view:
+                    plaintext = self.crypto.decrypt_into_buffer(view, session_key)
+                # Legacy blobs have no lazily read sections: unmap before parsing.
+                base_tag = self._base_tag(mapping)
+                self._close_mapping(mapping)
+                data = CODECS[codec_name].load_index(plaintext)
+        except BaseException:
+            self._close_mapping(mapping)
+            raise
+        if master_password is not None:
+            # The key opened the vault: later processes can skip Argon2.
+            self.agent.put_key(agent_key_id(kdf_salt, kdf_params), session_key)
 
         fmt = data.get("vault_format", 1)
 
         if fmt > VAULT_FORMAT:
+            self._close_mapping(mapping)
             raise VaultCorruptError(
                 "Vault format is newer than this application version."
             )
+        if fmt < 4:
+            # Journal records append to the chronological end: reorder before replay.
+            self._upgrade_logs(data)
+        # Compact slotted entries replace the parsed dicts one at a time.
+        entries = data.setdefault("entries", [])
+        for i, fields in enumerate(entries):
+            entries[i] = Entry(fields)
 
-        if fmt == 1:
-            self._pending_migration_data = data
-            self._pending_migration_key = session_key
-            self._pending_migration_salt = salt
-            raise VaultMigrationRequired("Vault is v1 format. Migration required.")
-
+        self._close_mapping(self._mapping)
+        self._mapping = mapping if sealed_bodies else None
+        if not sealed_bodies:
+            self._close_mapping(mapping)
         self._salt = salt
+        self._kdf_salt = kdf_salt
+        self._wrapped_key = wrapped_key
         self._session_key = session_key
         self._data = data
+        self._sealed_bodies = sealed_bodies
+        # Kept as recorded: only an explicit request changes how it is stored.
+        self.payload_codec = codec_name
+        self.compression = compression
+        self.kdf_params = kdf_params
+        self._drop_search_index()
+
+        self.journal.bind(base_tag)
+        try:
+            with profiler.span("journal_replay"):
+                records = list(self.journal.replay(session_key))
+            for record in records:
+                for op in record.get("ops", []):
+                    self._apply_op(op)
+        except Exception as e:
+            self._reset_state()
+            if isinstance(e, HarpocratesError):
+                raise
+            raise VaultCorruptError(f"Journal replay failed: {e}") from e
+
+        if fmt < VAULT_FORMAT:
+            self._pending_migration_data = self._data
+            self._pending_migration_key = session_key
+            self._pending_migration_salt = salt
+            self._pending_migration_envelope = (kdf_salt, wrapped_key)
+            # v3+ bodies are still sealed in the mapping: keep it for the migration.
+            self._pending_migration_bodies = (self._mapping, self._sealed_bodies)
+            self._mapping = None
+            self._reset_state()
+            raise VaultMigrationRequired(f"Vault is v{fmt} format. Migration required.")
+        self._finish_interrupted_rekey()
         return True
 
-    def migrate_to_v2(self) -> None:
-        """Upgrades an already decrypted v1 vault to the v2 schema with a signed genesis block."""
+    @staticmethod
+    def _wrapped_key_from(header: dict[str, Any]) -> Optional[bytes]:
+        """The sealed data key; vaults before format 6 have none."""
+        if "wrapped_key" not in header and header.get("vault_format", 3) < 6:
+            return None
+        try:
+            return bytes.fromhex(header["wrapped_key"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise VaultCorruptError(
+                "Vault key envelope is missing or malformed."
+            ) from e
+
+    def _reset_state(self) -> None:
+        self._data = None
+        self._session_key = None
+        self._salt = None
+        self._kdf_salt = None
+        self._wrapped_key = None
+        self._sealed_bodies = {}
+        self._close_mapping(self._mapping)
+        self._mapping = None
+        self._drop_search_index()
+
+    def _base_tag(self, encrypted_data: mmap.mmap) -> bytes:
+        """Identifies a saved legacy blob by its (unique per save) nonce."""
+        start = self.crypto.salt_size
+        return encrypted_data[start : start + self.crypto.nonce_size]
+
+    @staticmethod
+    def _upgrade_logs(data: dict[str, Any]) -> None:
+        """Pre-v4 logs are stored newest-first without their own hash."""
+        logs = data.get("logs", [])
+        logs.reverse()
+        for record in logs:
+            stamp_hash(record)
+
+    def migrate(self) -> None:
+        """
+        Upgrades an already decrypted older vault to the current format:
+        entries get a stable id and their secrets are sealed individually
+        (v3), the audit log is kept in append order with cached hashes (v4),
+        and URLs move from the sealed bodies to the index (v5). For v6 the
+        contents are re-encrypted under a random data key, wrapped by the
+        key the credentials derive today, so later password changes only
+        re-wrap it.
+        """
         if not hasattr(self, "_pending_migration_data"):
             raise HarpocratesError(
-                "There is no pending migration data. Load a v1 vault first."
+                "There is no pending migration data. Load an older vault first."
             )
 
         data = self._pending_migration_data
+        fmt = data.get("vault_format", 1)
+        # v1 -> v2: format decoupled from the application version.
+        data.pop("version", None)
+        # v2 -> v3: every entry needs an id to address its sealed body.
+        for entry in data.get("entries", []):
+            entry.setdefault("id", secrets.token_hex(8))
+        # v3 -> v4: logs were reordered on load; journaled ones still need a hash.
+        for record in data.get("logs", []):
+            if "hash" not in record:
+                stamp_hash(record)
         data["vault_format"] = VAULT_FORMAT
         data["app_version"] = VERSION
-        data.pop("version", None)
 
         # Promover al estado oficial
         self._salt = self._pending_migration_salt
+        self._kdf_salt, self._wrapped_key = self._pending_migration_envelope
         self._session_key = self._pending_migration_key
         self._data = data
+        self._close_mapping(self._mapping)
+        self._mapping, self._sealed_bodies = self._pending_migration_bodies
+        if 3 <= fmt < 5:
+            # v4 -> v5: open every body once so the URL is written to the index.
+            for i in range(len(data.get("entries", []))):
+                self._open_entry(i)
+            self._sealed_bodies = {}
 
         self._update_genesis_hmac()
-        self.save_vault()
+        if self._wrapped_key is None:
+            # The loaded key was derived from the credentials: it becomes the
+            # key-encryption key. The chain was just re-signed under it.
+            kek = self._session_key
+            self._rekey(self.crypto.generate_data_key(), kek, verify=False)
+        else:
+            self.save_vault()
 
         # Limpiar estado temporal
         del self._pending_migration_data
         del self._pending_migration_key
         del self._pending_migration_salt
+        del self._pending_migration_envelope
+        del self._pending_migration_bodies
+
+    def migrate_to_v2(self) -> None:
+        """Deprecated alias of migrate(), which upgrades to the current format."""
+        warnings.warn(
+            "migrate_to_v2() is deprecated; use migrate().",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        self.migrate()
 
     def save_vault(self) -> None:
-        if self._data is None or self._session_key is None or self._salt is None:
+        """Writes the vault now (see _write_vault); safe to call from the saver thread."""
+        with self._lock:
+            self._write_vault()
+
+    @profiler.timed("save_vault")
+    def _write_vault(self) -> None:
+        """
+        Writes the vault in v3 layout. Bodies of entries that were neither
+        opened for change nor added are streamed from the current mapping
+        as-is, without re-encryption or an in-memory copy of the whole file.
+        """
+        data, session_key, salt = self._data, self._session_key, self._salt
+        if data is None or session_key is None or salt is None:
             return
 
-        json_str = json.dumps(self._data)
-        encrypted_data = self.crypto.encrypt_with_session_key(
-            json_str, self._session_key, self._salt
-        )
+        restore_logs = self._rotate_logs()
+        try:
+            self._write_file(data, session_key, salt)
+        except BaseException:
+            # The archived records were never committed by a saved vault: put
+            # them back so a transaction rollback undoes the right list.
+            if restore_logs is not None:
+                restore_logs()
+            raise
+
+    def _write_file(
+        self, data: dict[str, Any], session_key: bytes, salt: bytes
+    ) -> None:
+        header: dict[str, Any] = {
+            "vault_format": data.get("vault_format", VAULT_FORMAT),
+            "kdf": self.kdf_params.to_header(self._kdf_salt),
+        }
+        if self._wrapped_key is not None:
+            header["wrapped_key"] = self._wrapped_key.hex()
+        if self.payload_codec != DEFAULT_CODEC:
+            # Absent for JSON payloads, so those stay readable by older releases.
+            header["codec"] = self.payload_codec
+        if self.compression != NO_COMPRESSION:
+            header["compression"] = self.compression
+        prefix = vault_format.build_prefix(salt, header)
+        codec = self._codec
+        # Each body is either a range in the current mapping or freshly sealed bytes.
+        bodies: list[tuple[int, int] | bytes] = []
+        index_entries: list[dict[str, Any]] = []
+        offset = 0
+        for entry in data["entries"]:
+            body_ref: tuple[int, int] | bytes
+            if entry["id"] in self._sealed_bodies:
+                body_ref = self._sealed_bodies[entry["id"]]
+                length = body_ref[1]
+            else:
+                body = {field: entry.get(field, "") for field in BODY_FIELDS}
+                body_ref = self.crypto.seal_record(
+                    codec.dump_body(body),
+                    session_key,
+                    vault_format.body_aad(salt, entry["id"]),
+                )
+                length = len(body_ref)
+            meta = {k: v for k, v in entry.items() if k not in BODY_FIELDS}
+            meta["body"] = [offset, length]
+            index_entries.append(meta)
+            bodies.append(body_ref)
+            offset += length
+
+        index = {k: v for k, v in data.items() if k != "entries"}
+        index["entries"] = index_entries
+        with profiler.span("serialize"):
+            payload = codec.dump_index(index)
+        with profiler.span("compress"):
+            payload = compress(self.compression, payload)
+        sealed_index = self.crypto.seal_record(payload, session_key, prefix)
+        bodies_offset = len(prefix) + 4 + len(sealed_index)
 
         tmp_path = self.vault_path + ".tmp"
         try:
             fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
-            with os.fdopen(fd, "wb") as f:
-                f.write(encrypted_data)
+            with os.fdopen(fd, "wb") as f, profiler.span("write"):
+                f.write(prefix)
+                f.write(vault_format.encode_length(len(sealed_index)))
+                f.write(sealed_index)
+                for body_ref in bodies:
+                    if isinstance(body_ref, bytes):
+                        f.write(body_ref)
+                    elif self._mapping is not None:
+                        start, length = body_ref
+                        f.write(self._mapping[start : start + length])
+                    else:
+                        raise VaultCorruptError("Sealed body without a vault mapping.")
                 f.flush()
-                os.fsync(f.fileno())
+                with profiler.span("fsync"):
+                    os.fsync(f.fileno())
 
+            # Windows refuses to replace a file that is still mapped.
+            self._close_mapping(self._mapping)
+            self._mapping = None
             os.replace(tmp_path, self.vault_path)
 
             if os.name == "posix":
                 os.chmod(self.vault_path, 0o600)
 
-        except OSError:
+        except (OSError, HarpocratesError):
             if os.path.exists(tmp_path):
                 os.remove(tmp_path)
+            if self._mapping is None and self._sealed_bodies:
+                self._mapping = self._map_vault_file()
             raise
 
-    def get_entries(self) -> list[dict[str, Any]]:
-        """Returns a deep copy to prevent external mutation of internal state."""
-        return copy.deepcopy(self._data.get("entries", [])) if self._data else []
+        # Every body (old or freshly sealed) now lives in the new file.
+        self._mapping = self._map_vault_file()
+        self._sealed_bodies = {}
+        offset = bodies_offset
+        for entry, body_ref in zip(data["entries"], bodies):
+            length = len(body_ref) if isinstance(body_ref, bytes) else body_ref[1]
+            self._sealed_bodies[entry["id"]] = (offset, length)
+            offset += length
+        # The new base already contains every journaled mutation.
+        self.journal.bind(sealed_index[: self.crypto.nonce_size])
+        self.journal.discard()
 
-    def get_logs(self) -> list[dict[str, Any]]:
-        """Returns a deep copy of the audit logs."""
-        return copy.deepcopy(self._data.get("logs", [])) if self._data else []
+    def flush(self) -> None:
+        """Writes changes still pending in the background saver (no-op otherwise)."""
+        if self._saver is not None:
+            self._saver.flush()
 
-    def _append_log(self, action: str, details: str) -> None:
-        """Appends a log entry using a cryptographic Hash-Chain for integrity."""
+    def close(self) -> None:
+        """Flushes pending changes and stops the background saver."""
+        if self._saver is not None:
+            saver, self._saver = self._saver, None
+            saver.close()
+
+    def compact_journal(self) -> None:
+        """Folds pending journal records back into the base vault."""
+        if self.journal.record_count > 0 or os.path.exists(self.journal.path):
+            self.save_vault()
+
+    def convert_payload(self, codec_name: str) -> None:
+        """
+        Rewrites the vault with another payload codec ("json" or "binary").
+        Every body is decrypted once and resealed in the new encoding. Log
+        hashes cover a codec-independent canonical form (see audit_log), so
+        the chain, its checkpoint and the archives are kept as they are.
+        """
+        if self._data is None:
+            raise HarpocratesError("Vault is locked.")
+        if self._txn_ops is not None:
+            raise HarpocratesError("Cannot convert the vault inside a transaction.")
+        codec = get_codec(codec_name)
+        if codec.name == self.payload_codec:
+            return
+        for i in range(len(self._data["entries"])):
+            self._open_entry(i)
+        self._sealed_bodies = {}
+        previous, self.payload_codec = self.payload_codec, codec.name
+        try:
+            self.save_vault()
+        except BaseException:
+            self.payload_codec = previous
+            raise
+
+    def _check_credentials(self, master_password: str, secret_key: str) -> bytes:
+        """Returns the key the credentials derive, if it opens the vault key."""
+        if (
+            self._data is None
+            or self._session_key is None
+            or self._salt is None
+            or self._kdf_salt is None
+        ):
+            raise HarpocratesError("Vault is locked.")
+        kek = self.crypto.derive_session_key(
+            master_password, secret_key, self._kdf_salt, self.kdf_params
+        )
+        try:
+            if self._wrapped_key is None:
+                data_key = kek
+            else:
+                data_key = self.crypto.unwrap_key(
+                    kek, self._wrapped_key, vault_format.key_aad(self._salt)
+                )
+        except AuthenticationError:
+            data_key = b""
+        if not hmac.compare_digest(data_key, self._session_key):
+            raise AuthenticationError("Incorrect Master Password or Secret Key.")
+        return kek
+
+    def change_credentials(
+        self,
+        master_password: str,
+        secret_key: str,
+        new_master_password: str,
+        new_secret_key: str,
+    ) -> None:
+        """
+        Changes the Master Password and/or Secret Key. Only the wrapped data
+        key changes (a new Argon2 salt and a re-sealed 32-byte key): entry
+        bodies, the log archive and journal stay as they are.
+        """
+        self._check_credentials(master_password, secret_key)
+        kdf_salt = os.urandom(self.crypto.salt_size)
+        kek = self.crypto.derive_session_key(
+            new_master_password, new_secret_key, kdf_salt, self.kdf_params
+        )
+        self._rewrap(kek, kdf_salt, self.kdf_params)
+
+    def change_kdf_params(
+        self, master_password: str, secret_key: str, params: KdfParams
+    ) -> None:
+        """
+        Re-derives the key-encryption key with new Argon2 costs (e.g. from
+        calibration) under a fresh salt and re-wraps the data key with it.
+        The credentials are checked against the current envelope first.
+        """
+        if not params.within_bounds():
+            raise HarpocratesError(f"Unsupported Argon2 parameters: {params}")
+        self._check_credentials(master_password, secret_key)
+        kdf_salt = os.urandom(self.crypto.salt_size)
+        kek = self.crypto.derive_session_key(
+            master_password, secret_key, kdf_salt, params
+        )
+        self._rewrap(kek, kdf_salt, params)
+
+    def rotate_data_key(self, master_password: str, secret_key: str) -> None:
+        """
+        Replaces the data key itself and re-encrypts everything under it
+        (see _rekey), for when the old key may have been exposed.
+        """
+        kek = self._check_credentials(master_password, secret_key)
+        self._rekey(self.crypto.generate_data_key(), kek)
+
+    def _rewrap(self, kek: bytes, kdf_salt: bytes, params: KdfParams) -> None:
+        old_salt = self._kdf_salt
+        if self._session_key is None or self._salt is None or old_salt is None:
+            raise HarpocratesError("Vault is locked.")
+        if self._txn_ops is not None:
+            raise HarpocratesError("Cannot change the vault key inside a transaction.")
+        old = (old_salt, self.kdf_params, self._wrapped_key)
+        old_id = agent_key_id(old_salt, old[1])
+        self._kdf_salt, self.kdf_params = kdf_salt, params
+        self._wrapped_key = self.crypto.wrap_key(
+            kek, self._session_key, vault_format.key_aad(self._salt)
+        )
+        try:
+            self.save_vault()
+        except BaseException:
+            self._kdf_salt, self.kdf_params, self._wrapped_key = old
+            raise
+        self.agent.forget(old_id)
+        self.agent.put_key(agent_key_id(kdf_salt, params), self._session_key)
+
+    def _rekey(self, key: bytes, kek: bytes, verify: bool = True) -> None:
+        """
+        Switches the vault to a new data key, wrapped by `kek`: every body is
+        resealed, archived log segments are re-encrypted into a staging
+        directory that replaces the current one once the vault is saved, and
+        the genesis and checkpoint HMACs are re-signed. The audit chain must
+        verify under the old key first (unless the caller just re-signed it),
+        so re-signing cannot launder tampered records. Derived caches (HIBP
+        ranges) no longer open and are rebuilt.
+        """
+        if self._data is None or self._salt is None or self._kdf_salt is None:
+            raise HarpocratesError("Vault is locked.")
+        if self._txn_ops is not None:
+            raise HarpocratesError("Cannot change the vault key inside a transaction.")
+        if verify and not self.verify_log_integrity(full=True):
+            raise VaultCorruptError("Audit log integrity check failed; key unchanged.")
+        for i in range(len(self._data["entries"])):
+            self._open_entry(i)
+        # Rotate under the old key now: the save below must not add a segment
+        # to the directory that is about to be replaced.
+        restore_logs = self._rotate_logs()
+
+        staging = self._rekey_staging()
+        shutil.rmtree(staging.directory, ignore_errors=True)
+        salt = self._salt
+        old = (self._session_key, self._wrapped_key, self._data.copy())
+        old_archive_key = self.derive_subkey("log-archive")
+        genesis: Optional[dict[str, Any]] = None
+        try:
+            self._session_key = key
+            self._wrapped_key = self.crypto.wrap_key(
+                kek, key, vault_format.key_aad(salt)
+            )
+            archive_key = self.derive_subkey("log-archive")
+            # One segment in memory at a time.
+            for segment in self._data.get("log_archive", []):
+                seq = segment["seq"]
+                records = self.log_archive.read(seq, old_archive_key, salt)
+                genesis = genesis or records[0]
+                staging.write(seq, records, archive_key, salt)
+            self._update_genesis_hmac(genesis)
+            checkpoint = self._data.get("log_checkpoint")
+            if checkpoint:
+                checkpoint = dict(
+                    checkpoint,
+                    hmac=self._checkpoint_mac(checkpoint["count"], checkpoint["hash"]),
+                )
+                self._data["log_checkpoint"] = checkpoint
+            self._sealed_bodies = {}
+            self.save_vault()
+        except BaseException:
+            self._session_key, self._wrapped_key, data = old
+            self._data.update(data)
+            if restore_logs is not None:
+                restore_logs()
+            shutil.rmtree(staging.directory, ignore_errors=True)
+            raise
+        self.log_archive.replace_with(staging)
+        self.agent.put_key(agent_key_id(self._kdf_salt, self.kdf_params), key)
+
+    def _rekey_staging(self) -> LogArchive:
+        return LogArchive(self.vault_path + ".rekey", self.crypto)
+
+    def _finish_interrupted_rekey(self) -> None:
+        """
+        Completes a key change that stopped between saving the vault and
+        swapping in the re-encrypted log archive: the staged segments are
+        adopted if they open with the current key, discarded otherwise.
+        """
+        staging = self._rekey_staging()
+        manifest = self._data.get("log_archive", []) if self._data else []
+        if not os.path.isdir(staging.directory) or self._salt is None:
+            return
+        try:
+            key = self.derive_subkey("log-archive")
+            adopt = bool(manifest) and bool(staging.read(1, key, self._salt))
+        except HarpocratesError:
+            adopt = False
+        if adopt:
+            self.log_archive.replace_with(staging)
+        else:
+            shutil.rmtree(staging.directory, ignore_errors=True)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Groups mutations (adds, updates, deletes, audit events) into a single
+        atomic commit: one save_vault (or journal record) when the outermost
+        block exits. If the block or the commit fails, the changes made in it
+        are undone from a change log instead of a snapshot of the vault;
+        nested blocks act as savepoints.
+        """
+        outermost = self._txn_ops is None
+        if outermost:
+            # Keeps a background save from reading half-applied changes.
+            self._lock.acquire()
+        ops = self._txn_ops = [] if self._txn_ops is None else self._txn_ops
+        ops_mark = len(ops)
+        savepoint = len(self._undo)
+        try:
+            yield
+            if outermost and ops:
+                self._persist(ops)
+        except BaseException:
+            self._rollback(savepoint)
+            del ops[ops_mark:]
+            raise
+        finally:
+            if outermost:
+                self._txn_ops = None
+                self._undo = []
+                self._lock.release()
+
+    def _record_undo(self, undo: Callable[[], object]) -> None:
+        if self._txn_ops is not None:
+            self._undo.append(undo)
+
+    def _rollback(self, savepoint: int) -> None:
+        while len(self._undo) > savepoint:
+            self._undo.pop()()
+        # Cheaper to rebuild on the next search than to unwind incrementally.
+        self._drop_search_index()
+
+    def _commit(self, ops: list[dict[str, Any]]) -> None:
+        """Persists a mutation, or defers it to the enclosing transaction."""
+        if self._txn_ops is not None:
+            # Only the journal replays ops: a full save rewrites from memory, so a
+            # large import does not keep a second copy of every added entry.
+            self._txn_ops.extend(ops if self.journal_enabled else ops[:1])
+            return
+        self._persist(ops)
+
+    def _persist(self, ops: list[dict[str, Any]]) -> None:
+        """
+        Hands the save to the background saver in write-behind mode; otherwise
+        one journal record in journal mode, a full save if neither is on.
+        """
+        if self.write_behind_delay > 0 and self._session_key is not None:
+            if self._saver is None:
+                self._saver = WriteBehindSaver(self.save_vault, self.write_behind_delay)
+            self._saver.mark_dirty()
+            return
+        if not self.journal_enabled or self._session_key is None:
+            self.save_vault()
+            return
+        self.journal.append(self._session_key, {"ops": ops})
+        if self.journal.record_count >= config.journal_compact_threshold:
+            # The record is durable, so the change is committed: a failed fold
+            # must not roll memory back under it (a reload would replay it).
+            # The journal stays valid and the next commit retries.
+            try:
+                self.compact_journal()
+            except Exception as e:
+                logger.warning("Journal compaction failed, will retry: %s", e)
+
+    def _apply_op(self, op: dict[str, Any]) -> None:
+        """Applies a single journaled operation to the in-memory state."""
         if self._data is None:
             return
-        prev_hash = "0" * 64
-        if "logs" not in self._data:
-            self._data["logs"] = []
+        kind = op["op"]
+        entries: list[Entry] = self._data["entries"]
+        if kind == "add":
+            # The op keeps the plain dict for the journal; memory holds an Entry.
+            entry = Entry(op["entry"])
+            entries.append(entry)
+            self._record_undo(entries.pop)
+            if self._positions is not None:
+                self._positions[entry.get("id", "")] = len(self._data["entries"]) - 1
+            if self._search_index is not None:
+                self._search_index.add(entry.get("id", ""), entry)
+        elif kind == "update":
+            changes_body = any(field in op["fields"] for field in BODY_FIELDS)
+            # Index-only changes (title, username, URL) leave the body sealed.
+            if changes_body:
+                entry = self._open_entry(op["index"])
+            else:
+                entry = entries[op["index"]]
+            previous = {k: entry.get(k, _MISSING) for k in op["fields"]}
+            sealed = self._sealed_bodies.get(entry.get("id", ""))
+            entry.update(op["fields"])
+            if changes_body:
+                self._sealed_bodies.pop(entry.get("id", ""), None)
+            self._record_undo(lambda: self._restore_entry(entry, previous, sealed))
+            if self._search_index is not None:
+                self._search_index.add(entry.get("id", ""), entry)
+        elif kind == "delete":
+            index = op["index"]
+            removed = entries.pop(index)
+            sealed = self._sealed_bodies.pop(removed.get("id", ""), None)
+            self._record_undo(lambda: self._restore_entry(removed, {}, sealed, index))
+            self._positions = None
+            if self._search_index is not None:
+                self._search_index.remove(removed.get("id", ""))
+        elif kind == "log":
+            self._data.setdefault("logs", []).append(op["entry"])
+        else:
+            raise VaultCorruptError(f"Unknown journal operation: {kind}")
+
+    def _restore_entry(
+        self,
+        entry: Entry,
+        previous: dict[str, Any],
+        sealed: Optional[tuple[int, int]],
+        index: Optional[int] = None,
+    ) -> None:
+        """Undoes an update (previous field values) or a delete (re-insert at index)."""
+        if self._data is None:
+            raise HarpocratesError("Vault is locked.")
+        for key, value in previous.items():
+            if value is _MISSING:
+                entry.pop(key, None)
+            else:
+                entry[key] = value
+        if sealed is not None:
+            self._sealed_bodies[entry.get("id", "")] = sealed
+        if index is not None:
+            self._data["entries"].insert(index, entry)
+            self._positions = None
+
+    def _open_entry(self, index: int) -> Entry:
+        """Decrypts the body of an entry on first access and returns the live dict."""
+        if self._data is None:
+            raise IndexError(index)
+        entry: Entry = self._data["entries"][index]
+        # A background save may be swapping the mapping and body ranges.
+        with self._lock:
+            if "password" not in entry and self._session_key and self._salt:
+                body_range = self._sealed_bodies.get(entry.get("id", ""))
+                if body_range is None or self._mapping is None:
+                    raise VaultCorruptError(f"Missing body for entry: {entry['title']}")
+                start, length = body_range
+                with (
+                    memoryview(self._mapping) as view,
+                    view[start : start + length] as sealed,
+                ):
+                    plaintext = self.crypto.open_record_into(
+                        sealed,
+                        self._session_key,
+                        vault_format.body_aad(self._salt, entry["id"]),
+                    )
+                entry.update(self._codec.load_body(plaintext))
+        return entry
+
+    def list_entries(self) -> EntryView:
+        """Read-only view of the index data (no secrets); decrypts no entry body."""
+        entries = self._data.get("entries", []) if self._data else []
+        return EntryView(entries, hidden=BODY_FIELDS)
+
+    def _drop_search_index(self) -> None:
+        self._search_index = None
+        self._positions = None
+
+    def search(self, query: str, limit: int = 50) -> list[tuple[int, Record]]:
+        """
+        Ranked fuzzy search over titles, usernames and URLs. Returns
+        (index, index data) pairs, best match first, without decrypting any
+        entry body.
+        """
+        if not self._data:
+            return []
+        entries = self._data.get("entries", [])
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+            for entry in entries:
+                self._search_index.add(entry.get("id", ""), entry)
+        if self._positions is None:
+            self._positions = {e.get("id", ""): i for i, e in enumerate(entries)}
 
-        if len(self._data["logs"]) > 0:
-            last_log = self._data["logs"][0]
-            last_log_str = json.dumps(last_log, sort_keys=True).encode("utf-8")
-            prev_hash = hashlib.sha256(last_log_str).hexdigest()
+        listing = self.list_entries()
+        return [
+            (self._positions[entry_id], listing[self._positions[entry_id]])
+            for entry_id in self._search_index.search(query, limit)
+        ]
+
+    def index_of(self, entry_id: str) -> Optional[int]:
+        """Position of the entry with this id (ids survive deletes; positions do not)."""
+        if not self._data:
+            return None
+        if self._positions is None:
+            entries = self._data.get("entries", [])
+            self._positions = {e.get("id", ""): i for i, e in enumerate(entries)}
+        return self._positions.get(entry_id)
+
+    def get_entry(self, index: int) -> Record:
+        """Returns a read-only view of a single entry, decrypting only its own body."""
+        return MappingProxyType(self._open_entry(index))
+
+    def get_entries(self) -> EntryView:
+        """
+        Read-only view of the entries with their secrets. Bodies are decrypted
+        as items are accessed; callers cannot mutate the internal state.
+        """
+        entries = self._data.get("entries", []) if self._data else []
+        return EntryView(entries, open_entry=self._open_entry)
+
+    @property
+    def logs(self) -> LogView:
+        """Newest-first, read-only view of the audit log."""
+        return LogView(self._data.get("logs", []) if self._data else [])
+
+    def get_logs(self, limit: Optional[int] = None) -> list[Record]:
+        """Returns read-only live audit records, newest first (at most `limit`)."""
+        return self.logs[:limit]
+
+    def log_count(self) -> int:
+        """Number of audit records, archived segments included."""
+        if not self._data:
+            return 0
+        archived = sum(int(s["count"]) for s in self._data.get("log_archive", []))
+        return archived + len(self._data.get("logs", []))
+
+    def _read_segment(self, seq: int) -> list[dict[str, Any]]:
+        if self._salt is None:
+            raise HarpocratesError("Vault is locked.")
+        key = self.derive_subkey("log-archive")
+        return self.log_archive.read(seq, key, self._salt)
+
+    def iter_logs(self) -> Iterator[Record]:
+        """
+        Yields the whole audit history newest first: the live log, then the
+        archived segments, each decrypted only when the iteration reaches it.
+        """
+        yield from self.logs
+        manifest = list(self._data.get("log_archive", [])) if self._data else []
+        for segment in reversed(manifest):
+            yield from reversed(self._read_segment(segment["seq"]))
+
+    def _chain_anchor(self) -> str:
+        """prev_hash expected for the oldest live record: the last archived hash."""
+        manifest = self._data.get("log_archive", []) if self._data else []
+        return str(manifest[-1]["final_hash"]) if manifest else GENESIS_PREV_HASH
+
+    def _rotate_logs(self) -> Optional[Callable[[], None]]:
+        """
+        Moves the live log into an archive segment once it is big or old
+        enough (on append and on save). Returns a function that undoes the
+        rotation (for a save or transaction that then fails), or None if
+        nothing was rotated.
+        """
+        if self._data is None or self._salt is None:
+            return None
+        logs = self._data.get("logs", [])
+        if not logs:
+            return None
+        max_records = config.log_segment_max_records
+        max_age = config.log_segment_max_age_days
+        due = 0 < max_records <= len(logs)
+        if not due and max_age > 0:
+            try:
+                oldest = datetime.strptime(logs[0]["timestamp"], TIMESTAMP_FORMAT)
+            except (KeyError, TypeError, ValueError):
+                oldest = datetime.now()
+            due = datetime.now() - oldest >= timedelta(days=max_age)
+        if not due:
+            return None
+
+        manifest = self._data.setdefault("log_archive", [])
+        seq = len(manifest) + 1
+        # The segment must be durable before the vault stops referencing its records.
+        self.log_archive.write(seq, logs, self.derive_subkey("log-archive"), self._salt)
+        manifest.append(
+            {
+                "seq": seq,
+                "count": len(logs),
+                "first": logs[0].get("timestamp"),
+                "last": logs[-1].get("timestamp"),
+                "prev_hash": logs[0].get("prev_hash"),
+                "final_hash": record_digest(logs[-1]),
+            }
+        )
+        self._data["logs"] = []
+        checkpoint = self._data.pop("log_checkpoint", None)
+        data = self._data
+
+        def restore() -> None:
+            manifest.pop()
+            data["logs"] = logs
+            if checkpoint is not None:
+                data["log_checkpoint"] = checkpoint
+            self.log_archive.discard(seq)
+
+        return restore
+
+    def _append_log(self, action: str, details: str) -> dict[str, Any]:
+        """Appends a log entry using a cryptographic Hash-Chain for integrity."""
+        if self._data is None:
+            return {}
+        logs = self._data.setdefault("logs", [])
+        prev_hash = self._chain_anchor()
+        if logs:
+            # The newest record carries its own hash: no need to re-serialize it.
+            last_log = logs[-1]
+            prev_hash = last_log.get("hash") or record_digest(last_log)
 
         log_entry = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": datetime.now().strftime(TIMESTAMP_FORMAT),
             "action": action.upper(),
             "details": details,
             "prev_hash": prev_hash,
         }
-        self._data["logs"].insert(0, log_entry)
+        logs.append(stamp_hash(log_entry))
+        self._record_undo(logs.pop)
+        # Rotate as soon as the live log is full, not only when saving: one
+        # large transaction must not seal everything into a single segment.
+        if 0 < config.log_segment_max_records <= len(logs):
+            restore_logs = self._rotate_logs()
+            if restore_logs is not None:
+                self._record_undo(restore_logs)
+        return log_entry
 
     def add_audit_event(self, action: str, details: str) -> None:
-        self._append_log(action, details)
-        self.save_vault()
+        with self.transaction():
+            log_entry = self._append_log(action, details)
+            self._commit([{"op": "log", "entry": log_entry}])
+
+    def _new_entry(self, item: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "id": secrets.token_hex(8),
+            "title": item["title"],
+            "username": item["username"],
+            "password": item["password"],
+            "url": item.get("url", ""),
+            "notes": item.get("notes", ""),
+            "created_at": datetime.now().isoformat(),
+        }
 
     def add_entry(
         self,
@@ -179,26 +1111,32 @@ class VaultManager:
     ) -> bool:
         if self._data is None:
             return False
-        new_entry = {
-            "title": app_name,
-            "username": username,
-            "password": password,
-            "url": url,
-            "notes": notes,
-            "created_at": datetime.now().isoformat(),
-        }
-        self._data["entries"].append(new_entry)
-        self._append_log("CREATE", f"Entry added: {app_name}")
-        self.save_vault()
+        new_entry = self._new_entry(
+            {
+                "title": app_name,
+                "username": username,
+                "password": password,
+                "url": url,
+                "notes": notes,
+            }
+        )
+        op = {"op": "add", "entry": new_entry}
+        with self.transaction():
+            self._apply_op(op)
+            log_entry = self._append_log("CREATE", f"Entry added: {app_name}")
+            self._commit([op, {"op": "log", "entry": log_entry}])
         return True
 
     def delete_entry(self, index: int) -> bool:
         if not self._data:
             return False
         try:
-            removed = self._data["entries"].pop(index)
-            self._append_log("DELETE", f"Entry removed: {removed['title']}")
-            self.save_vault()
+            with self.transaction():
+                title = self._data["entries"][index]["title"]
+                op = {"op": "delete", "index": index}
+                self._apply_op(op)
+                log_entry = self._append_log("DELETE", f"Entry removed: {title}")
+                self._commit([op, {"op": "log", "entry": log_entry}])
             return True
         except IndexError:
             return False
@@ -207,86 +1145,219 @@ class VaultManager:
         if not self._data:
             return False
         try:
-            entry = self._data["entries"][index]
-            for k, v in new_data.items():
-                if v:
-                    entry[k] = v
-            entry["updated_at"] = datetime.now().isoformat()
-            self._append_log("UPDATE", f"Modified: {entry['title']}")
-            self.save_vault()
+            fields = {k: v for k, v in new_data.items() if v}
+            fields["updated_at"] = datetime.now().isoformat()
+            op = {"op": "update", "index": index, "fields": fields}
+            with self.transaction():
+                self._apply_op(op)
+                entry = self._data["entries"][index]
+                log_entry = self._append_log("UPDATE", f"Modified: {entry['title']}")
+                self._commit([op, {"op": "log", "entry": log_entry}])
             return True
         except IndexError:
             return False
 
-    def add_entries_bulk(self, new_entries_data: list[dict[str, Any]]) -> bool:
-        """Atomically imports multiple entries, rolling back on failure."""
+    def add_entries_bulk(
+        self, new_entries_data: list[dict[str, Any]], audit: bool = True
+    ) -> bool:
+        """
+        Atomically imports multiple entries, rolling back on failure. Callers
+        adding a stream in chunks pass audit=False and log the import once.
+        """
         if not new_entries_data or self._data is None:
             return True
 
-        original_state = copy.deepcopy(self._data)
-
+        ops: list[dict[str, Any]] = []
         try:
-            for item in new_entries_data:
-                new_entry = {
-                    "title": item["title"],
-                    "username": item["username"],
-                    "password": item["password"],
-                    "url": item.get("url", ""),
-                    "notes": item.get("notes", ""),
-                    "created_at": datetime.now().isoformat(),
-                }
-                self._data["entries"].append(new_entry)
+            with self.transaction():
+                for item in new_entries_data:
+                    op = {"op": "add", "entry": self._new_entry(item)}
+                    self._apply_op(op)
+                    ops.append(op)
 
-            self._append_log("IMPORT", f"Bulk imported {len(new_entries_data)} entries")
-            self.save_vault()
+                if audit:
+                    log_entry = self._append_log(
+                        "IMPORT", f"Bulk imported {len(new_entries_data)} entries"
+                    )
+                    ops.append({"op": "log", "entry": log_entry})
+                self._commit(ops)
             return True
 
         except Exception as e:
-            self._data = original_state
             raise RuntimeError(
                 f"Bulk import failed, memory changes rolled back: {str(e)}"
-            )
+            ) from e
 
-    def verify_log_integrity(self) -> bool:
-        if not self._data or "logs" not in self._data:
-            return True
+    def _checkpoint_mac(self, count: int, last_hash: str) -> str:
+        message = f"{count}:{last_hash}".encode("utf-8")
+        key = self.derive_subkey("log-checkpoint")
+        return hmac.HMAC(key, message, hashlib.sha256).hexdigest()
 
-        logs = self._data["logs"]
-        if not logs:
-            return True
+    def _checkpointed_count(self, logs: list[dict[str, Any]]) -> Optional[int]:
+        """
+        Returns how many leading records are vouched for by the signed
+        checkpoint (0 without one), or None if the checkpoint is forged or no
+        longer matches the log.
+        """
+        if self._data is None:
+            raise HarpocratesError("Vault is locked.")
+        checkpoint = self._data.get("log_checkpoint")
+        if checkpoint is None:
+            return 0
+        try:
+            count = int(checkpoint["count"])
+            last_hash = str(checkpoint["hash"])
+            mac = str(checkpoint["hmac"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not 0 < count <= len(logs):
+            return None
+        if not hmac.compare_digest(mac, self._checkpoint_mac(count, last_hash)):
+            return None
+        if not hmac.compare_digest(record_digest(logs[count - 1]), last_hash):
+            return None
+        return count
+
+    def _verify_genesis(self, genesis: dict[str, Any]) -> bool:
+        if self._data is None:
+            raise HarpocratesError("Vault is locked.")
+        if "prev_hash" not in genesis or not isinstance(genesis["prev_hash"], str):
+            return False
+        if not hmac.compare_digest(genesis["prev_hash"], GENESIS_PREV_HASH):
+            return False
+
+        expected_hmac = self._data.get("log_genesis_hmac")
+        if not expected_hmac or not self._session_key:
+            return False
 
-        MAX_VERIFY = 10_000
-        logs_to_check = logs[:MAX_VERIFY]
+        message = canonical_record(genesis)
+        mac = hmac.HMAC(self._session_key, message, hashlib.sha256)
+        calculated_hmac = mac.hexdigest()
 
-        for i in range(len(logs_to_check) - 1):
-            current_log = logs_to_check[i]
-            prev_log = logs_to_check[i + 1]
+        return hmac.compare_digest(calculated_hmac, expected_hmac)
 
-            if "prev_hash" not in current_log or not isinstance(
-                current_log["prev_hash"], str
-            ):
+    @staticmethod
+    def _verify_chain(
+        logs: list[dict[str, Any]], start: int, count: int, anchor: str
+    ) -> bool:
+        """
+        Checks records [start, count): their cached hash and the link to the
+        previous one (`anchor` for the very first record).
+        """
+        previous = record_digest(logs[start - 1]) if start > 0 else anchor
+        for i in range(start, count):
+            record = logs[i]
+            if not isinstance(record.get("prev_hash"), str) or not hmac.compare_digest(
+                record["prev_hash"], previous
+            ):  # timing-safe
                 return False
+            # Cached hashes are only a shortcut for appends; they must match the content.
+            previous = record_digest(record)
+            cached = record.get("hash")
+            if not isinstance(cached, str) or not hmac.compare_digest(cached, previous):
+                return False
+        return True
 
-            prev_log_str = json.dumps(prev_log, sort_keys=True).encode("utf-8")
-            expected_hash = hashlib.sha256(prev_log_str).hexdigest()
+    @staticmethod
+    def _verify_manifest(manifest: list[dict[str, Any]]) -> Optional[str]:
+        """Checks that archive segments chain by their boundary hashes; returns the last one."""
+        previous = GENESIS_PREV_HASH
+        for seq, segment in enumerate(manifest, 1):
+            prev_hash, final_hash = segment.get("prev_hash"), segment.get("final_hash")
+            if segment.get("seq") != seq or not isinstance(prev_hash, str):
+                return None
+            if not hmac.compare_digest(prev_hash, previous):
+                return None
+            if not isinstance(final_hash, str):
+                return None
+            previous = final_hash
+        return previous
 
+    def _verify_archives(self, manifest: list[dict[str, Any]]) -> bool:
+        """Decrypts every archive segment and checks it against the manifest."""
+        for segment in manifest:
+            try:
+                records = self._read_segment(segment["seq"])
+            except HarpocratesError:
+                return False
+            if not records or len(records) != segment["count"]:
+                return False
+            if segment["seq"] == 1 and not self._verify_genesis(records[0]):
+                return False
+            if not self._verify_chain(records, 0, len(records), segment["prev_hash"]):
+                return False
             if not hmac.compare_digest(
-                current_log["prev_hash"], expected_hash
-            ):  # timing-safe
+                record_digest(records[-1]), segment["final_hash"]
+            ):
                 return False
+        return True
 
-        genesis = logs[-1]
-        if "prev_hash" not in genesis or not isinstance(genesis["prev_hash"], str):
+    @profiler.timed("verify_log_integrity")
+    def verify_log_integrity(self, full: bool = False) -> bool:
+        """
+        Verifies the audit hash-chain. Records covered by the last signed
+        checkpoint are trusted, so a routine check only costs the records
+        appended since; `full` re-verifies the whole history, archived
+        segments included. On success the checkpoint advances to the newest
+        record (persisted on the next save).
+        """
+        if not self._data or "logs" not in self._data:
+            return True
+
+        logs: list[dict[str, Any]] = self._data["logs"]
+        # Fixed up front: records appended meanwhile are left for the next check.
+        count = len(logs)
+        manifest = list(self._data.get("log_archive", []))
+        anchor = self._verify_manifest(manifest)
+        if anchor is None:
             return False
-        if not hmac.compare_digest(genesis["prev_hash"], "0" * 64):
+        if full and not self._verify_archives(manifest):
             return False
+        if not count:
+            return True
 
-        expected_hmac = self._data.get("log_genesis_hmac")
-        if not expected_hmac or not self._session_key:
+        # Once rotated, the genesis record lives (and is checked) in segment 1.
+        if not manifest and not self._verify_genesis(logs[0]):
+            return False
+        trusted = self._checkpointed_count(logs)
+        if trusted is None:
+            return False
+        if not self._verify_chain(logs, 0 if full else trusted, count, anchor):
             return False
 
-        message = json.dumps(genesis, sort_keys=True).encode("utf-8")
-        mac = hmac.HMAC(self._session_key, message, hashlib.sha256)
-        calculated_hmac = mac.hexdigest()
+        newest = logs[count - 1]
+        last_hash = record_digest(newest)
+        mac = self._checkpoint_mac(count, last_hash)
+        # Hashing ran unlocked; publishing must not race a save reading _data,
+        # a rotation swapping the live log or a rollback popping records.
+        with self._lock:
+            data = self._data
+            if (
+                data is not None
+                and data.get("logs") is logs
+                and count <= len(logs)
+                and logs[count - 1] is newest
+            ):
+                data["log_checkpoint"] = {
+                    "count": count,
+                    "hash": last_hash,
+                    "hmac": mac,
+                }
+        return True
 
-        return hmac.compare_digest(calculated_hmac, expected_hmac)
+    def start_full_log_verification(
+        self, on_done: Callable[[bool], None]
+    ) -> threading.Thread:
+        """Re-verifies the whole audit history in a daemon thread and reports the result."""
+
+        def run() -> None:
+            try:
+                result = self.verify_log_integrity(full=True)
+            except HarpocratesError:
+                # The vault was locked while verifying.
+                result = False
+            on_done(result)
+
+        worker = threading.Thread(target=run, name="log-verification", daemon=True)
+        worker.start()
+        return worker
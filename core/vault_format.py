@@ -0,0 +1,102 @@
+import json
+import mmap
+import struct
+from typing import Any, Union
+from core.exceptions import VaultCorruptError
+
+V3_MAGIC = b"HPV3"
+
+# Fields sealed per entry; everything else (title, username, URL...) lives in the
+# encrypted index. Since format 5 the URL is indexed so it can be searched.
+BODY_FIELDS = ("password", "notes")
+
+_LEN = struct.Struct(">I")
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+class VaultFileV3:
+    """
+    Parsed layout of a v3 vault file:
+
+        magic | salt | header_len | header (plaintext JSON)
+              | index_len | sealed index | sealed entry bodies...
+
+    The plaintext header and everything before it are authenticated as
+    associated data of the sealed index. Entry bodies are addressed by
+    (offset, length) pairs stored inside the index.
+
+    Only the small plaintext parts are copied out of the buffer; the sealed
+    sections are described by offsets so they can be read in place from a
+    memory-mapped file.
+    """
+
+    def __init__(
+        self,
+        salt: bytes,
+        header: dict[str, Any],
+        prefix: bytes,
+        index_offset: int,
+        index_length: int,
+        bodies_offset: int,
+        size: int,
+    ) -> None:
+        self.salt = salt
+        self.header = header
+        self.prefix = prefix
+        self.index_offset = index_offset
+        self.index_length = index_length
+        self.bodies_offset = bodies_offset
+        self.size = size
+
+    @staticmethod
+    def is_v3(raw: Buffer) -> bool:
+        return bytes(raw[: len(V3_MAGIC)]) == V3_MAGIC
+
+    @classmethod
+    def parse(cls, raw: Buffer, salt_size: int) -> "VaultFileV3":
+        size = len(raw)
+        try:
+            pos = len(V3_MAGIC)
+            salt = bytes(raw[pos : pos + salt_size])
+            pos += salt_size
+            (header_len,) = _LEN.unpack_from(raw, pos)
+            pos += _LEN.size
+            header = json.loads(bytes(raw[pos : pos + header_len]))
+            pos += header_len
+            prefix = bytes(raw[:pos])
+            (index_len,) = _LEN.unpack_from(raw, pos)
+            pos += _LEN.size
+        except (struct.error, ValueError) as e:
+            raise VaultCorruptError(f"Malformed vault header: {e}") from e
+
+        if len(salt) != salt_size or pos + index_len > size:
+            raise VaultCorruptError("Vault file is truncated.")
+        return cls(salt, header, prefix, pos, index_len, pos + index_len, size)
+
+    def body_range(self, offset: int, length: int) -> tuple[int, int]:
+        """Translates an index (offset, length) pair into an absolute file range."""
+        start = self.bodies_offset + offset
+        if offset < 0 or length < 0 or start + length > self.size:
+            raise VaultCorruptError("Entry body lies outside the vault file.")
+        return start, length
+
+
+def build_prefix(salt: bytes, header: dict[str, Any]) -> bytes:
+    """Serializes the plaintext part of a v3 file (authenticated, not encrypted)."""
+    header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+    return V3_MAGIC + salt + _LEN.pack(len(header_bytes)) + header_bytes
+
+
+def encode_length(length: int) -> bytes:
+    return _LEN.pack(length)
+
+
+def body_aad(salt: bytes, entry_id: str) -> bytes:
+    """Binds a sealed body to its vault and entry so bodies cannot be swapped."""
+    return V3_MAGIC + salt + entry_id.encode("utf-8")
+
+
+def key_aad(salt: bytes) -> bytes:
+    """Binds the wrapped data key to its vault."""
+    return V3_MAGIC + b"data-key" + salt
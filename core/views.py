@@ -0,0 +1,114 @@
+from abc import abstractmethod
+from collections.abc import Mapping, Sequence
+from types import MappingProxyType
+from typing import Any, Callable, Iterator, Optional, Union, overload
+
+Record = Mapping[str, Any]
+
+
+class IndexFields(Mapping[str, Any]):
+    """Read-only view of an entry that hides its sealed fields (no copy)."""
+
+    __slots__ = ("_entry", "_hidden")
+
+    def __init__(self, entry: Mapping[str, Any], hidden: tuple[str, ...]) -> None:
+        self._entry = entry
+        self._hidden = hidden
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._hidden:
+            raise KeyError(key)
+        return self._entry[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return (k for k in self._entry if k not in self._hidden)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"IndexFields({dict(self)!r})"
+
+
+class _RecordView(Sequence[Record]):
+    """
+    Read-only sequence over live vault records. Items are handed out as
+    immutable mappings over the internal dicts, built only when accessed,
+    so reading never copies the vault. Records are flat (string values),
+    so the mappings cannot be used to change the vault.
+    """
+
+    def __init__(self, records: Sequence[Mapping[str, Any]]) -> None:
+        self._records = records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @abstractmethod
+    def _item(self, index: int) -> Record:
+        """Wraps the record at a non-negative, in-range index."""
+
+    @overload
+    def __getitem__(self, index: int) -> Record: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Record]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Record, list[Record]]:
+        if isinstance(index, slice):
+            return [self._item(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("record index out of range")
+        return self._item(index)
+
+    def __iter__(self) -> Iterator[Record]:
+        for i in range(len(self)):
+            yield self._item(i)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def pages(self, size: int) -> Iterator[list[Record]]:
+        """Yields consecutive pages of at most `size` records."""
+        for start in range(0, len(self), size):
+            yield self[start : start + size]
+
+
+class EntryView(_RecordView):
+    """
+    Entries in vault order. With `open_entry`, items include the secrets
+    (each body is decrypted on first access); otherwise `hidden` fields are
+    masked and nothing is decrypted.
+    """
+
+    def __init__(
+        self,
+        entries: Sequence[Mapping[str, Any]],
+        open_entry: Optional[Callable[[int], Mapping[str, Any]]] = None,
+        hidden: tuple[str, ...] = (),
+    ) -> None:
+        super().__init__(entries)
+        self._open_entry = open_entry
+        self._hidden = hidden
+
+    def _item(self, index: int) -> Record:
+        if self._open_entry is not None:
+            return MappingProxyType(self._open_entry(index))
+        return IndexFields(self._records[index], self._hidden)
+
+
+class LogView(_RecordView):
+    """Newest-first view over the chronologically stored audit log."""
+
+    def _item(self, index: int) -> Record:
+        return MappingProxyType(self._records[len(self._records) - 1 - index])
+
+    def __iter__(self) -> Iterator[Record]:
+        for record in reversed(self._records):
+            yield MappingProxyType(record)
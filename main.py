@@ -1,18 +1,110 @@
+import argparse
 import sys
-from app.cli import run_cli
+from app.cli import (
+    run_agent,
+    run_batch_mode,
+    run_calibrate,
+    run_cli,
+    run_import,
+    run_passwd,
+    run_rekey,
+)
+from core import profiler
+from core.config import config
 from core.exceptions import HarpocratesError
+from core.saver import flush_all
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="harpocrates", description="Harpocrates password vault")
+    parser.add_argument(
+        "--profile", action="store_true", help="print per-phase timings at exit"
+    )
+    parser.add_argument(
+        "--profile-json", metavar="FILE", help="write per-phase timings to a JSON file at exit"
+    )
+    commands = parser.add_subparsers(dest="command")
+    calibrate = commands.add_parser(
+        "calibrate", help="tune the Argon2 key derivation to this machine"
+    )
+    calibrate.add_argument(
+        "--target-ms", type=float, default=500, help="unlock time to aim for (default: 500)"
+    )
+    calibrate.add_argument(
+        "--max-memory-mib", type=int, default=256, help="Argon2 memory ceiling (default: 256)"
+    )
+    passwd = commands.add_parser(
+        "passwd", help="change the Master Password (re-wraps the vault key only)"
+    )
+    passwd.add_argument(
+        "--new-secret-key", action="store_true", help="also generate a new Secret Key"
+    )
+    commands.add_parser("rekey", help="re-encrypt the vault under a new random data key")
+    agent = commands.add_parser(
+        "agent", help="cache the unlocked vault key so later runs skip the password"
+    )
+    agent.add_argument("--timeout", type=float, help="idle seconds before keys are wiped")
+    agent.add_argument("--foreground", action="store_true", help="do not detach")
+    agent.add_argument("--stop", action="store_true", help="stop a running agent")
+    batch = commands.add_parser(
+        "batch", help="run JSON-lines commands (get/add/update/delete/search/export)"
+    )
+    batch.add_argument("file", nargs="?", default="-", help="command file (default: stdin)")
+    batch.add_argument(
+        "--atomic", action="store_true", help="discard every change if any command fails"
+    )
+    importer = commands.add_parser(
+        "import", help="stream a CSV, Bitwarden JSON or KeePass XML export into the vault"
+    )
+    importer.add_argument("file", help="export file, or - for stdin")
+    importer.add_argument(
+        "--format",
+        choices=("csv", "bitwarden", "keepass"),
+        help="export format (default: from the file extension; csv for stdin)",
+    )
+    importer.add_argument("--report", metavar="FILE", help="write skipped rows to this CSV file")
+    return parser.parse_args(argv)
+
 
 def main():
+    args = parse_args()
+    status = 0
+    profile = args.profile_json or ("text" if args.profile else config.profile)
+    if profile:
+        profiler.enable()
     try:
-        run_cli()
+        if args.command == "calibrate":
+            run_calibrate(args.target_ms, args.max_memory_mib)
+        elif args.command == "passwd":
+            run_passwd(args.new_secret_key)
+        elif args.command == "rekey":
+            run_rekey()
+        elif args.command == "agent":
+            run_agent(args.timeout, args.foreground, args.stop)
+        elif args.command == "batch":
+            status = 0 if run_batch_mode(args.file, args.atomic) else 1
+        elif args.command == "import":
+            status = 0 if run_import(args.file, args.format, args.report) else 1
+        else:
+            run_cli()
     except KeyboardInterrupt:
         print("\n\n[!] Interruption detected. Closing vault forcefully...")
     except HarpocratesError as e:
-        print(f"\n[X] Vault error: {e}")
+        print(f"\n[X] Vault error: {e}", file=sys.stderr)
+        status = 1
     except Exception as e:
-        print(f"\n[X] Unexpected system error: {e}")
+        print(f"\n[X] Unexpected system error: {e}", file=sys.stderr)
+        status = 1
     finally:
-        sys.exit(0)
+        try:
+            # Write-behind changes still pending (Ctrl+C lands here too).
+            flush_all()
+        except HarpocratesError as e:
+            print(f"[X] Unsaved changes lost: {e}", file=sys.stderr)
+            status = 1
+        if profile:
+            profiler.write_report(profile)
+        sys.exit(status)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
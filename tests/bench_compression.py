@@ -0,0 +1,81 @@
+"""
+Size and time benchmark for index compression.
+
+Serializes a synthetic index (entries plus a live audit log that is mostly
+logins, as in daily use) with each payload codec and compression algorithm,
+then seals it with AES-GCM as save_vault does. Reports the sealed size and
+the best-of-N time to save (serialize, compress, seal) and to load (open,
+decompress, parse).
+
+    python tests/bench_compression.py --entries 10000 --logs 5000
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_payload_codec import best_of, synthetic_index
+from core.audit_log import GENESIS_PREV_HASH, stamp_hash
+from core.compression import ALGORITHMS, compress, decompress
+from core.crypto import HarpocratesCrypto
+from core.payload_codec import CODECS
+
+# Share of each audit action in a live log (logins dominate).
+ACTIONS = [("LOGIN", "Access via CLI")] * 8 + [
+    ("UPDATE", "Updated entry: Service {i}"),
+    ("CREATE", "Created entry: Service {i}"),
+]
+
+
+def realistic_logs(count, entries, seed=7):
+    rng = random.Random(seed)
+    records, prev = [], GENESIS_PREV_HASH
+    for n in range(count):
+        action, details = rng.choice(ACTIONS)
+        record = stamp_hash({
+            "timestamp": f"2026-{1 + n % 12:02d}-{1 + n % 28:02d} 09:{n % 60:02d}:00",
+            "action": action,
+            "details": details.format(i=rng.randrange(max(entries, 1))),
+            "prev_hash": prev,
+        })
+        records.append(record)
+        prev = record["hash"]
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=10_000)
+    parser.add_argument("--logs", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    index = synthetic_index(args.entries, 0)
+    index["logs"] = realistic_logs(args.logs, args.entries)
+    crypto = HarpocratesCrypto()
+    key, aad = os.urandom(32), b"bench"
+
+    print(f"[{args.entries} entries, {args.logs} log records, best of {args.repeat}]")
+    print(f"    {'codec':<8}{'compression':<13}{'sealed KB':>10}{'save ms':>10}{'load ms':>10}")
+    for name, codec in CODECS.items():
+        for algorithm in ALGORITHMS:
+            def save():
+                return crypto.seal_record(compress(algorithm, codec.dump_index(index)), key, aad)
+
+            def load():
+                plaintext = crypto.open_record_into(bytearray(sealed), key, aad)
+                return codec.load_index(decompress(algorithm, plaintext))
+
+            sealed = save()
+            assert load() == index
+            print(
+                f"    {name:<8}{algorithm:<13}{len(sealed) / 1024:>10.0f}"
+                f"{best_of(args.repeat, save) * 1000:>10.1f}"
+                f"{best_of(args.repeat, load) * 1000:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Memory benchmark for the in-memory entry layout.
+
+Builds the same synthetic entries as plain dicts (the previous layout) and
+as slotted Entry objects, and reports the bytes allocated for each with
+tracemalloc. Field values are shared between both runs' inputs, so the
+difference is the per-entry container overhead (plus interned usernames).
+
+    python tests/bench_entry_memory.py --entries 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.entry import Entry
+
+ACCOUNTS = 20  # distinct e-mail addresses, as in a typical personal vault
+
+
+def synthetic_fields(count):
+    return [
+        {
+            "id": f"{i:016x}",
+            "title": f"Service {i}",
+            "username": f"user{i % ACCOUNTS}@example.com",
+            "url": f"https://service{i}.example.com",
+            "created_at": "2026-01-01T00:00:00",
+            "password": f"pw-{i:012d}",
+            "notes": "",
+        }
+        for i in range(count)
+    ]
+
+
+def measure(build, fields):
+    gc.collect()
+    tracemalloc.start()
+    entries = build(fields)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del entries
+    return current
+
+
+def as_dicts(fields):
+    # json.loads creates a fresh username string per entry.
+    return [dict(f, username="".join(f["username"])) for f in fields]
+
+
+def as_entries(fields):
+    return [Entry(dict(f, username="".join(f["username"]))) for f in fields]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    args = parser.parse_args()
+
+    fields = synthetic_fields(args.entries)
+    dict_bytes = measure(as_dicts, fields)
+    entry_bytes = measure(as_entries, fields)
+
+    mb = 1024 * 1024
+    print(f"[{args.entries} entries]")
+    print(f"    dict layout   : {dict_bytes / mb:8.1f} MB ({dict_bytes / args.entries:6.0f} B/entry)")
+    print(f"    Entry layout  : {entry_bytes / mb:8.1f} MB ({entry_bytes / args.entries:6.0f} B/entry)")
+    print(f"    reduction     : {100 * (1 - entry_bytes / dict_bytes):7.1f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Peak-memory benchmark for unlocking a large vault.
+
+Compares the previous copy-based load (f.read -> slice -> decrypt -> decode ->
+json.loads) against the memory-mapped, decrypt-into-buffer path used by
+VaultManager.load_vault. Each measurement runs in a fresh child process and
+reports its peak RSS.
+
+    python tests/bench_load_memory.py --size-mb 200
+"""
+import argparse
+import json
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+
+# Keep Argon2 cheap: this benchmark is about payload handling, not the KDF.
+os.environ.setdefault("ARGON2_MEMORY_COST", "8192")
+os.environ.setdefault("ARGON2_ITERATIONS", "1")
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.crypto import HarpocratesCrypto
+from core.exceptions import VaultMigrationRequired
+from core.vault import VaultManager
+from core.vault_format import VaultFileV3
+
+M_PASS = "BenchmarkPass123!"
+S_KEY = "benchmark-secret-key"
+NOTE_SIZE = 2048
+
+
+def peak_rss_mb():
+    # VmHWM belongs to this address space; ru_maxrss would survive exec and
+    # report the (much bigger) generator process instead.
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def synthetic_entries(size_mb):
+    count = max(1, size_mb * 1024 * 1024 // NOTE_SIZE)
+    return [
+        {
+            "id": secrets.token_hex(8),
+            "title": f"Service {i}",
+            "username": f"user{i}@example.com",
+            "password": secrets.token_urlsafe(18),
+            "url": f"https://service{i}.example.com",
+            "notes": secrets.token_hex(NOTE_SIZE // 2),
+            "created_at": "2026-01-01T00:00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def build_vaults(size_mb, workdir):
+    entries = synthetic_entries(size_mb)
+
+    v3_path = os.path.join(workdir, "bench_v3.hpro")
+    vault = VaultManager(v3_path)
+    vault.create_new_vault(M_PASS, S_KEY)
+    vault._data["entries"] = entries
+    vault.save_vault()
+
+    legacy_path = os.path.join(workdir, "bench_v2.hpro")
+    crypto = HarpocratesCrypto()
+    salt = os.urandom(crypto.salt_size)
+    key = crypto.derive_session_key(M_PASS, S_KEY, salt)
+    data = dict(vault._data, vault_format=2)
+    with open(legacy_path, "wb") as f:
+        f.write(crypto.encrypt_with_session_key(json.dumps(data), key, salt))
+    return v3_path, legacy_path
+
+
+def load_copy(path):
+    """The pre-mmap load path: several full-size copies of the payload."""
+    crypto = HarpocratesCrypto()
+    with open(path, "rb") as f:
+        raw = f.read()
+    if VaultFileV3.is_v3(raw):
+        parsed = VaultFileV3.parse(raw, crypto.salt_size)
+        key = crypto.derive_session_key(M_PASS, S_KEY, parsed.salt)
+        sealed_index = raw[parsed.index_offset : parsed.index_offset + parsed.index_length]
+        bodies = raw[parsed.bodies_offset :]
+        data = json.loads(crypto.open_record(sealed_index, key, parsed.prefix).decode("utf-8"))
+        return data, bodies
+    salt = raw[: crypto.salt_size]
+    key = crypto.derive_session_key(M_PASS, S_KEY, salt)
+    return json.loads(crypto.decrypt_with_session_key(raw, key, salt))
+
+
+def load_mmap(path):
+    vault = VaultManager(path)
+    try:
+        vault.load_vault(M_PASS, S_KEY)
+    except VaultMigrationRequired:
+        pass  # legacy vaults are fully decrypted before the migration prompt
+    return vault
+
+
+def run_child(mode, path):
+    loader = load_copy if mode == "copy" else load_mmap
+    result = loader(path)
+    print(f"{peak_rss_mb():.1f}")
+    del result
+
+
+def measure(mode, path):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, path],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=200)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"[1] Generating ~{args.size_mb} MB vaults...")
+        v3_path, legacy_path = build_vaults(args.size_mb, workdir)
+        for label, path in (("v3 (sealed bodies)", v3_path), ("v2 (single blob)", legacy_path)):
+            size = os.path.getsize(path) / (1024 * 1024)
+            copy_rss = measure("copy", path)
+            mmap_rss = measure("mmap", path)
+            print(f"\n[{label}] file size: {size:.1f} MB")
+            print(f"    copy-based load peak RSS : {copy_rss:8.1f} MB")
+            print(f"    mmap load peak RSS       : {mmap_rss:8.1f} MB")
+            print(f"    reduction                : {100 * (1 - mmap_rss / copy_rss):7.1f} %")
+
+
+if __name__ == "__main__":
+    main()
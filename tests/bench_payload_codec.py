@@ -0,0 +1,93 @@
+"""
+Serialization benchmark for the vault payload codecs.
+
+Builds a synthetic index (entries with body ranges, plus a hash-chained
+audit log) and reports, for JSON and the binary codec, the encoded size and
+the best-of-N time to encode and decode it. Encryption is left out: this is
+the part that grows faster than AES-GCM on large vaults.
+
+    python tests/bench_payload_codec.py --entries 100000 --logs 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.audit_log import GENESIS_PREV_HASH, stamp_hash
+from core.payload_codec import CODECS
+
+ACCOUNTS = 20
+
+
+def synthetic_index(entries, logs):
+    index_entries = []
+    for i in range(entries):
+        entry = {
+            "id": f"{i:016x}",
+            "title": f"Service {i}",
+            "username": f"user{i % ACCOUNTS}@example.com",
+            "url": f"https://service{i}.example.com",
+            "created_at": "2026-01-01T00:00:00",
+            "body": [i * 80, 80],
+        }
+        if i % 10 == 0:
+            entry["updated_at"] = "2026-02-01T00:00:00"
+        index_entries.append(entry)
+
+    records, prev = [], GENESIS_PREV_HASH
+    for i in range(logs):
+        record = stamp_hash({
+            "timestamp": "2026-01-01 00:00:00",
+            "action": "UPDATE",
+            "details": f"Updated entry: Service {i % max(entries, 1)}",
+            "prev_hash": prev,
+        })
+        records.append(record)
+        prev = record["hash"]
+
+    return {
+        "vault_format": 5,
+        "app_version": "2.0.0",
+        "entries": index_entries,
+        "logs": records,
+        "log_genesis_hmac": "0" * 64,
+    }
+
+
+def best_of(repeat, func):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--logs", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    index = synthetic_index(args.entries, args.logs)
+    body = {"password": "correct horse battery staple", "notes": ""}
+    print(f"[{args.entries} entries, {args.logs} log records, best of {args.repeat}]")
+    print(f"    {'codec':<8}{'size MB':>10}{'encode ms':>12}{'decode ms':>12}{'body us':>10}")
+    for name, codec in CODECS.items():
+        raw = codec.dump_index(index)
+        assert codec.load_index(bytearray(raw)) == index
+        encode = best_of(args.repeat, lambda: codec.dump_index(index))
+        decode = best_of(args.repeat, lambda: codec.load_index(bytearray(raw)))
+        raw_body = codec.dump_body(body)
+        body_time = best_of(args.repeat, lambda: codec.load_body(bytearray(raw_body)))
+        print(
+            f"    {name:<8}{len(raw) / 1024 / 1024:>10.1f}"
+            f"{encode * 1000:>12.0f}{decode * 1000:>12.0f}{body_time * 1e6:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
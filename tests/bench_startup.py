@@ -0,0 +1,86 @@
+"""
+Startup benchmark: time from launching Python to the password prompt.
+
+Runs `python -X importtime` on the CLI module in a fresh interpreter and
+reports the slowest imports (cumulative), then the best-of-N wall time to
+import the CLI and build a VaultManager, which is all that happens before
+the first prompt. Imports done by the interpreter itself (site) are left
+out so only the application's own cost is shown.
+
+    python tests/bench_startup.py --top 15 --repeat 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Everything that runs before getpass() in run_cli.
+STARTUP = "import app.cli; from core.vault import VaultManager; VaultManager()"
+
+
+def import_times(statement="import app.cli"):
+    """
+    Maps each module imported by `statement` in a fresh interpreter to its
+    (self, cumulative) import time in microseconds, from -X importtime.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        depth = len(name) - len(name.lstrip())
+        name = name.strip()
+        # Children are printed before their parent; site's subtree ends at "site".
+        if depth == 1 and name == "site":
+            times.clear()
+            continue
+        times[name] = (int(self_us), int(cumulative))
+    return times
+
+
+def startup_seconds(repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import time; t = time.perf_counter(); "
+                f"{STARTUP}; print(time.perf_counter() - t)",
+            ],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        best = min(best, float(proc.stdout.strip().splitlines()[-1]))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    times = import_times(STARTUP)
+    print(f"[slowest imports before the password prompt, {len(times)} modules]")
+    print(f"    {'module':<40}{'self ms':>10}{'total ms':>10}")
+    ranked = sorted(times.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative) in ranked[: args.top]:
+        print(f"    {name:<40}{self_us / 1000:>10.1f}{cumulative / 1000:>10.1f}")
+    print(f"\n[time to password prompt, best of {args.repeat}]")
+    print(f"    {startup_seconds(args.repeat) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
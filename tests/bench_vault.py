@@ -0,0 +1,339 @@
+"""
+Benchmark suite for the vault hot paths.
+
+Generates synthetic vaults (cached in --workdir, so later runs skip the
+set-up) and times, best of N, for each size:
+
+    derive_session_key      Argon2id with the configured costs
+    encrypt_with_session_key AES-GCM over as many bytes as the vault file
+    load_vault              unlock (index only) in a new VaultManager
+    save_vault              rewrite of an unlocked vault
+    get_entries             decrypting every entry body after an unlock
+    verify_log_integrity    full audit chain check, archives included
+    search_cold / search    first search (builds the index) / a later one
+    import_from_csv         importing as many rows as the vault has entries
+    import_bitwarden_json   the same rows as a Bitwarden JSON export
+    import_keepass_xml      the same rows as a KeePass 2 XML export
+
+Results are written as JSON (--output). With --compare, each metric is
+checked against a previous results file and the script exits with status 1
+if any got slower than --threshold (a ratio, 0.25 = 25 %) and by more than
+--min-delta-ms.
+
+    python tests/bench_vault.py --sizes 1000x10000 --output before.json
+    python tests/bench_vault.py --sizes 1000x10000 --compare before.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+from xml.sax.saxutils import escape
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import config
+from core.importer import import_file, import_from_csv
+from core.kdf import KdfParams
+from core.vault import VaultManager
+
+MASTER = "bench-master-password"
+SECRET = "bench-secret-key"
+# Synthetic vaults use the cheapest Argon2 costs, so unlock times measure the
+# vault itself; derive_session_key is timed with the configured costs.
+FAST_KDF = KdfParams(8 * 1024, 1, 1)
+PROFILES = {
+    "quick": ["10x1000", "1000x10000"],
+    "full": ["10x1000", "1000x10000", "10000x100000", "100000x1000000"],
+}
+SCHEMA = 1
+
+
+def parse_size(text):
+    entries, _, logs = text.lower().partition("x")
+    return int(entries), int(logs or 0)
+
+
+def _fast_kdf():
+    return patch.multiple(
+        config,
+        argon2_memory_cost=FAST_KDF.memory_cost,
+        argon2_iterations=FAST_KDF.iterations,
+        argon2_lanes=FAST_KDF.lanes,
+    )
+
+
+def generate_vault(path, entries, logs):
+    """
+    Writes a vault with `entries` entries and about `logs` audit records
+    (the live log rotates into archive segments as in real use).
+    """
+    for stale in (path, path + ".journal"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    shutil.rmtree(path + ".logs", ignore_errors=True)
+    vault = VaultManager(path)
+    with _fast_kdf():
+        vault.create_new_vault(MASTER, SECRET)
+    with vault.transaction():
+        vault.add_entries_bulk(
+            [
+                {
+                    "title": f"Service {i}",
+                    "username": f"user{i % 20}@example.com",
+                    "password": f"pw-{i:08d}-correct-horse",
+                    "url": f"https://service{i}.example.com",
+                    "notes": "" if i % 5 else f"Recovery codes for service {i}",
+                }
+                for i in range(entries)
+            ]
+        )
+        for i in range(max(logs - vault.log_count(), 0)):
+            vault.add_audit_event("LOGIN", f"Access {i}")
+    return vault
+
+
+def cached_vault(workdir, entries, logs):
+    path = os.path.join(workdir, f"bench_{entries}x{logs}.hpro")
+    if not os.path.exists(path):
+        generate_vault(path, entries, logs)
+    return path
+
+
+def scratch_copy(path, workdir):
+    """A throwaway copy (file and log archive) for benchmarks that write."""
+    copy = os.path.join(workdir, "scratch.hpro")
+    for stale in (copy, copy + ".journal"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    shutil.rmtree(copy + ".logs", ignore_errors=True)
+    shutil.copy(path, copy)
+    if os.path.isdir(path + ".logs"):
+        shutil.copytree(path + ".logs", copy + ".logs")
+    return copy
+
+
+def unlocked(path):
+    vault = VaultManager(path)
+    vault.load_vault(MASTER, SECRET)
+    return vault
+
+
+def best_of(repeat, run, setup=None):
+    """Best wall time of `run(state)`; `setup()` builds its state, untimed."""
+    best = float("inf")
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        run(state)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "url", "username", "password", "notes"])
+        for i in range(rows):
+            writer.writerow(
+                [f"Imported {i}", f"https://imported{i}.example.com", f"user{i}", f"pw{i}", ""]
+            )
+
+
+def write_bitwarden_json(path, rows):
+    """An unencrypted Bitwarden export with the rows of write_csv, as login items."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"encrypted": false, "folders": [], "items": [')
+        for i in range(rows):
+            item = {
+                "id": f"item-{i}",
+                "type": 1,
+                "name": f"Imported {i}",
+                "notes": None,
+                "favorite": False,
+                "login": {
+                    "uris": [{"match": None, "uri": f"https://imported{i}.example.com"}],
+                    "username": f"user{i}",
+                    "password": f"pw{i}",
+                    "totp": None,
+                },
+            }
+            f.write(("," if i else "") + json.dumps(item))
+        f.write("]}")
+
+
+def write_keepass_xml(path, rows):
+    """A KeePass 2 XML export with the rows of write_csv in one group."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n')
+        f.write("<KeePassFile><Meta><Generator>KeePass</Generator></Meta><Root><Group>")
+        f.write("<UUID>cm9vdA==</UUID><Name>Database</Name>")
+        for i in range(rows):
+            fields = {
+                "Title": f"Imported {i}",
+                "UserName": f"user{i}",
+                "Password": f"pw{i}",
+                "URL": f"https://imported{i}.example.com",
+                "Notes": "",
+            }
+            f.write("<Entry>")
+            for key, value in fields.items():
+                f.write(f"<String><Key>{key}</Key><Value>{escape(value)}</Value></String>")
+            f.write("</Entry>")
+        f.write("</Group></Root></KeePassFile>")
+
+
+def bench_case(workdir, entries, logs, repeat):
+    """Runs every benchmark on one vault size and returns {metric: seconds}."""
+    path = cached_vault(workdir, entries, logs)
+    reference = unlocked(path)
+    session_key, salt = reference._session_key, reference._salt
+    payload = os.urandom(os.path.getsize(path))
+    crypto = reference.crypto
+    query = f"service {entries // 2}"
+
+    def fresh_import_target():
+        target = os.path.join(workdir, "import.hpro")
+        for stale in (target, target + ".journal"):
+            if os.path.exists(stale):
+                os.remove(stale)
+        shutil.rmtree(target + ".logs", ignore_errors=True)
+        vault = VaultManager(target)
+        with _fast_kdf():
+            vault.create_new_vault(MASTER, SECRET)
+        return vault
+
+    exports = {}
+    for fmt, writer in (("csv", write_csv), ("json", write_bitwarden_json), ("xml", write_keepass_xml)):
+        exports[fmt] = os.path.join(workdir, f"import_{entries}.{fmt}")
+        if not os.path.exists(exports[fmt]):
+            writer(exports[fmt], entries)
+
+    return {
+        "derive_session_key": best_of(
+            repeat, lambda _: crypto.derive_session_key(MASTER, SECRET, salt, KdfParams.from_config())
+        ),
+        "encrypt_with_session_key": best_of(
+            repeat, lambda _: crypto.encrypt_with_session_key(payload, session_key, salt)
+        ),
+        "load_vault": best_of(repeat, lambda _: unlocked(path)),
+        "save_vault": best_of(
+            repeat, lambda v: v.save_vault(), lambda: unlocked(scratch_copy(path, workdir))
+        ),
+        "get_entries": best_of(
+            repeat, lambda v: [e["password"] for e in v.get_entries()], lambda: unlocked(path)
+        ),
+        "verify_log_integrity": best_of(
+            repeat, lambda v: v.verify_log_integrity(full=True), lambda: unlocked(path)
+        ),
+        "search_cold": best_of(repeat, lambda v: v.search(query), lambda: unlocked(path)),
+        "search": best_of(repeat, lambda _: reference.search(query)),
+        "import_from_csv": best_of(
+            repeat, lambda v: import_from_csv(exports["csv"], v), fresh_import_target
+        ),
+        "import_bitwarden_json": best_of(
+            repeat, lambda v: import_file(exports["json"], v), fresh_import_target
+        ),
+        "import_keepass_xml": best_of(
+            repeat, lambda v: import_file(exports["xml"], v), fresh_import_target
+        ),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(sizes, workdir, repeat=3, progress=print):
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    for size in sizes:
+        entries, logs = parse_size(size)
+        progress(f"[{entries} entries, {logs} log records, best of {repeat}]")
+        metrics = bench_case(workdir, entries, logs, repeat)
+        for metric, seconds in metrics.items():
+            progress(f"    {metric:<26}{seconds * 1000:>12.2f} ms")
+            results.append({"case": f"{entries}x{logs}", "metric": metric, "seconds": seconds})
+    return {
+        "schema": SCHEMA,
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "kdf": KdfParams.from_config().describe(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current, previous, threshold=0.25, min_delta=0.001):
+    """
+    Lines of (case, metric, before, after, ratio, regressed) for metrics in
+    both runs; `regressed` when after > before * (1 + threshold) and by more
+    than `min_delta` seconds (sub-millisecond timings are mostly noise).
+    """
+    before = {(r["case"], r["metric"]): r["seconds"] for r in previous["results"]}
+    rows = []
+    for r in current["results"]:
+        key = (r["case"], r["metric"])
+        if key not in before:
+            continue
+        ratio = r["seconds"] / before[key] if before[key] > 0 else float("inf")
+        regressed = ratio > 1 + threshold and r["seconds"] - before[key] > min_delta
+        rows.append((*key, before[key], r["seconds"], ratio, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--sizes", help="comma-separated ENTRIESxLOGS (overrides --profile)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workdir", default="bench_vaults", help="cache of generated vaults")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="previous results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(",") if args.sizes else PROFILES[args.profile]
+    results = run_suite(sizes, args.workdir, args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n[✓] Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        rows = compare(results, previous, args.threshold, args.min_delta_ms / 1000)
+        print(f"\n[comparison with {args.compare}, threshold +{args.threshold:.0%}]")
+        print(f"    {'case':<16}{'metric':<26}{'before ms':>11}{'after ms':>11}{'ratio':>8}")
+        for case, metric, before, after, ratio, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(
+                f"    {case:<16}{metric:<26}{before * 1000:>11.2f}{after * 1000:>11.2f}"
+                f"{ratio:>8.2f}{flag}"
+            )
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
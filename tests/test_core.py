@@ -1,19 +1,40 @@
 import hashlib
+import io
+import json
 import unittest
 import os
 import shutil
+import socket
+import contextlib
 import csv
 import sys
+import tempfile
+import threading
+import time
 from unittest.mock import patch
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.exceptions import VaultMigrationRequired
-from core.vault import VaultManager
+from core.agent import AgentClient, KeyAgent, agent_supported
+from core.batch import run_batch
+from core.saver import flush_all
+from core import profiler
+from core.config import Settings, config
+from core.exceptions import AuthenticationError, HarpocratesError, VaultCorruptError, VaultMigrationRequired
+from core.vault import VAULT_FORMAT, VaultManager
+from core.audit_log import record_digest, stamp_hash
 from core.crypto import HarpocratesCrypto
+from core.entry import Entry
+from core.compression import compress
+from core.kdf import KdfParams, calibrate
+from core.payload_codec import CODECS
 from core.generator import PasswordGenerator
 from core.auditor import PasswordAuditor
-from core.importer import import_from_csv
+from core import importer
+from core.importer import import_file, import_from_csv
+from core.secure_memory import wipe_buffer
+from tests.bench_startup import STARTUP, import_times
+from tests.bench_vault import compare, run_suite, unlocked
 
 class TestHarpocratesCore(unittest.TestCase):
 
@@ -36,11 +57,14 @@ class TestHarpocratesCore(unittest.TestCase):
             self.test_vault_file, 
             self.test_backup_file, 
             self.test_csv_file,
-            self.test_vault_file + ".tmp"
+            self.test_vault_file + ".tmp",
+            self.test_vault_file + ".journal",
         ]
         for file in files_to_clean:
             if os.path.exists(file):
                 os.remove(file)
+        shutil.rmtree(self.test_vault_file + ".logs", ignore_errors=True)
+        shutil.rmtree(self.test_vault_file + ".rekey.logs", ignore_errors=True)
         PasswordAuditor.clear_cache()
 
     def test_add_entry_stores_data_correctly(self):
@@ -132,7 +156,7 @@ class TestHarpocratesCore(unittest.TestCase):
             self.assertTrue(any(c.isdigit() for c in pw), f"Missing digit in: {pw}")
             self.assertTrue(any(c in valid_symbols for c in pw), f"Missing valid symbol in: {pw}")
 
-    @patch('core.auditor.requests.get')
+    @patch('core.auditor.requests.Session.get')
     def test_hibp_auditor_respects_kanonymity(self, mock_get):
         """Tests the HaveIBeenPwned API integration using mocked K-Anonymity."""
         
@@ -188,6 +212,171 @@ class TestHarpocratesCore(unittest.TestCase):
         self.assertEqual(entries[1]['title'], "Spotify")
         self.assertIn("Skipped 1 duplicates", msg)
 
+    def test_csv_import_streams_in_chunks_and_reports_skipped_rows(self):
+        """Rows reach the vault in fixed-size chunks; skipped ones go to the report file."""
+        self.vault.add_entry("GitHub", "dev1", "gitpass123")
+        with open(self.test_csv_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "url", "username", "password", "notes"])
+            for i in range(5):
+                writer.writerow([f"Service {i}", "", f"user{i}", f"pw{i}", ""])
+            writer.writerow(["github ", "", "DEV1", "other", ""])
+            writer.writerow(["No password", "", "someone", "", ""])
+            writer.writerow(["Service 0", "", "user0", "again", ""])
+        report = self.test_csv_file + ".skipped.csv"
+        self.addCleanup(os.remove, report)
+
+        chunks = []
+        bulk = self.vault.add_entries_bulk
+        with patch.object(self.vault, "add_entries_bulk", side_effect=lambda c, **kw: chunks.append(len(c)) or bulk(c, **kw)), \
+                patch.object(self.vault, "save_vault", wraps=self.vault.save_vault) as save:
+            qty, msg = import_from_csv(self.test_csv_file, self.vault, report, chunk_size=2)
+
+        self.assertEqual(qty, 5)
+        self.assertEqual(chunks, [2, 2, 1])
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(len(self.vault.list_entries()), 6)
+        self.assertIn("Skipped 2 duplicates", msg)
+        with open(report, newline='', encoding='utf-8') as f:
+            skipped = list(csv.DictReader(f))
+        self.assertEqual(
+            [(r["line"], r["title"], r["reason"]) for r in skipped],
+            [("7", "github", "duplicate"), ("8", "No password", "missing title or password"),
+             ("9", "Service 0", "duplicate")],
+        )
+
+        # "-" reads the same format from stdin.
+        with open(self.test_csv_file, 'w', newline='', encoding='utf-8') as f:
+            f.write("title,username,password\nFrom stdin,me,pw\n")
+        with open(self.test_csv_file, encoding='utf-8') as stdin, patch.object(sys, "stdin", stdin):
+            qty, _ = import_from_csv("-", self.vault)
+        self.assertEqual(qty, 1)
+        self.assertEqual(self.vault.list_entries()[-1]["title"], "From stdin")
+
+    def test_bitwarden_json_import_decodes_one_item_at_a_time(self):
+        """Logins stream out of a Bitwarden export read in small pieces; other items are reported."""
+        self.vault.add_entry("GitHub", "dev1", "gitpass123")
+        export = {
+            "encrypted": False,
+            "folders": [{"id": "f1", "name": "Work"}],
+            "items": [
+                {"type": 1, "name": "AWS", "notes": "root account",
+                 "login": {"username": "admin", "password": "aws-pw", "uris": [{"uri": "https://aws.example"}]}},
+                {"type": 2, "name": "Recovery codes", "notes": "1234", "secureNote": {"type": 0}},
+                {"type": 1, "name": "github", "login": {"username": "DEV1", "password": "x", "uris": None}},
+                {"type": 1, "name": "Router", "login": {"username": None, "password": "r-pw", "uris": []}},
+            ],
+            "collections": [],
+        }
+        path = self.test_csv_file.replace(".csv", ".json")
+        self.addCleanup(os.remove, path)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(export, f, indent=2)
+
+        buffered = []
+        real_fill = importer._JsonStream._fill
+        with patch.object(importer, "READ_SIZE", 7), \
+                patch.object(importer._JsonStream, "_fill", autospec=True,
+                             side_effect=lambda stream: real_fill(stream) or buffered.append(len(stream.buf))):
+            qty, msg = import_file(path, self.vault)
+
+        self.assertEqual(qty, 2)
+        entries = self.vault.get_entries()
+        self.assertEqual((entries[1]["title"], entries[1]["username"], entries[1]["password"], entries[1]["url"],
+                          entries[1]["notes"]), ("AWS", "admin", "aws-pw", "https://aws.example", "root account"))
+        self.assertEqual((entries[2]["title"], entries[2]["username"]), ("Router", ""))
+        self.assertIn("Skipped 1 duplicates", msg)
+        self.assertIn("Skipped (not a login): 1", msg)
+        # The buffer only ever holds about one item, never the whole document.
+        self.assertLess(max(buffered), os.path.getsize(path) // 3)
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"encrypted": true, "data": "..."}')
+        self.assertEqual(import_file(path, self.vault)[0], 0)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"items": [{"type": 1, "name": "Cut", "login": {"password": "p"')
+        qty, msg = import_file(path, self.vault)
+        self.assertEqual(qty, 0)
+        self.assertIn("Malformed JSON", msg)
+        self.assertEqual(len(self.vault.list_entries()), 3)
+
+    def test_bitwarden_json_import_decodes_a_large_item_once(self):
+        """An item spanning many reads is decoded once it is complete, not after every read."""
+        notes = 'line "quoted" \\ {not a brace} [x]\n' * 4000
+        items = [{"type": 1, "name": f"Site {i}", "notes": notes if i == 1 else "",
+                  "login": {"username": "me", "password": "pw", "uris": []}} for i in range(3)]
+        path = self.test_csv_file.replace(".csv", ".json")
+        self.addCleanup(os.remove, path)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"encrypted": False, "items": items}, f)
+
+        real_decode = json.JSONDecoder.raw_decode
+        with patch.object(importer, "READ_SIZE", 1024), \
+                patch.object(json.JSONDecoder, "raw_decode", autospec=True, side_effect=real_decode) as decode:
+            qty, _ = import_file(path, self.vault)
+
+        self.assertEqual(qty, 3)
+        self.assertEqual(self.vault.get_entries()[1]["notes"], notes)
+        # Two keys, the "encrypted" flag and three items: one decode each.
+        self.assertEqual(decode.call_count, 6)
+
+        # A number cut by a read is not decoded from its first piece.
+        with patch.object(importer, "READ_SIZE", 4):
+            stream = importer._JsonStream(io.StringIO("[-2500.5e1]"))
+            stream.expect("[")
+            self.assertEqual(stream.value(), -25005.0)
+
+    def test_keepass_xml_import_skips_history_and_recycle_bin(self):
+        """KeePass entries are read incrementally; old versions and deleted entries are not imported."""
+        path = self.test_csv_file.replace(".csv", ".xml")
+        self.addCleanup(os.remove, path)
+
+        def entry(title, user, password, history=""):
+            strings = "".join(f"<String><Key>{k}</Key><Value>{v}</Value></String>"
+                              for k, v in (("Title", title), ("UserName", user), ("Password", password),
+                                           ("URL", "https://example.org"), ("Notes", "a &amp; b")))
+            return f"<Entry><UUID>x</UUID>{strings}{history}</Entry>"
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="utf-8"?><KeePassFile>'
+                    '<Meta><RecycleBinUUID>Ymlu</RecycleBinUUID></Meta><Root><Group><UUID>cm9vdA==</UUID>'
+                    + entry("Mail", "me", "new-pw", "<History>" + entry("Mail", "me", "old-pw") + "</History>")
+                    + "<Group><UUID>c3Vi</UUID>" + entry("Bank", "me", "bank-pw") + "</Group>"
+                    + "<Group><UUID>Ymlu</UUID>" + entry("Deleted", "me", "gone") + "</Group>"
+                    # Groups after the bin (freed elements reuse its address) are imported.
+                    + "".join(f"<Group><UUID>g{i}</UUID><Name>n</Name>{entry(f'Later {i}', 'me', 'pw')}"
+                              "</Group>" for i in range(3000))
+                    + "</Group></Root></KeePassFile>")
+
+        parses = []
+        real_iterparse = importer.iterparse
+        with patch.object(importer, "iterparse",
+                          side_effect=lambda *a, **kw: parses.append(real_iterparse(*a, **kw)) or parses[-1]):
+            qty, msg = import_file(path, self.vault)
+
+        self.assertEqual(qty, 3002)
+        entries = self.vault.get_entries()
+        self.assertEqual([e["title"] for e in entries],
+                         ["Mail", "Bank"] + [f"Later {i}" for i in range(3000)])
+        self.assertEqual(entries[0]["password"], "new-pw")
+        self.assertEqual(entries[0]["notes"], "a & b")
+        self.assertIn("Skipped (in recycle bin): 1", msg)
+        # Every entry, group and Meta is dropped from the tree once read.
+        root = parses[0].root
+        self.assertEqual([e.tag for e in root.iter()], ["KeePassFile", "Root"])
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("<KeePassFile><Root><Group><Entry>")
+        self.assertIn("Malformed KeePass XML", import_file(path, self.vault)[1])
+        # Entity expansion (billion laughs) is refused rather than expanded.
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0"?><!DOCTYPE KeePassFile [<!ENTITY a "aaaaaaaaaa">'
+                    '<!ENTITY b "&a;&a;&a;&a;&a;&a;&a;&a;&a;&a;">]>'
+                    '<KeePassFile><Root><Group><Entry><String><Key>Title</Key><Value>&b;</Value>'
+                    '</String></Entry></Group></Root></KeePassFile>')
+        self.assertIn("Refused KeePass XML", import_file(path, self.vault)[1])
+        self.assertEqual(len(self.vault.list_entries()), 3002)
+
     def test_log_integrity_validation_cases(self):
         """Tests the hash-chain against valid and tampered states."""
         self.vault.add_entry("Service1", "user1", "pass1")
@@ -195,21 +384,22 @@ class TestHarpocratesCore(unittest.TestCase):
         
         self.assertTrue(self.vault.verify_log_integrity())
         
-        original_hash = self.vault._data['logs'][0]['prev_hash']
-        self.vault._data['logs'][0]['prev_hash'] = "1" * 64
+        original_hash = self.vault._data['logs'][-1]['prev_hash']
+        self.vault._data['logs'][-1]['prev_hash'] = "1" * 64
         self.assertFalse(self.vault.verify_log_integrity())
-        self.vault._data['logs'][0]['prev_hash'] = original_hash
+        self.vault._data['logs'][-1]['prev_hash'] = original_hash
         
-        self.vault._data['logs'][1]['details'] = "TAMPERED"
-        self.assertFalse(self.vault.verify_log_integrity())
+        # Records behind the signed checkpoint are only re-read by a full verification.
+        self.vault._data['logs'][-2]['details'] = "TAMPERED"
+        self.assertFalse(self.vault.verify_log_integrity(full=True))
 
     def test_log_integrity_detects_root_truncation(self):
         """Ensures that deleting the oldest log and faking genesis is detected via HMAC."""
         self.vault.add_entry("Service1", "user1", "pass1")
         self.vault.add_entry("Service2", "user2", "pass2")
         
-        self.vault._data['logs'].pop(-1)
-        self.vault._data['logs'][-1]['prev_hash'] = "0" * 64
+        self.vault._data['logs'].pop(0)
+        self.vault._data['logs'][0]['prev_hash'] = "0" * 64
         
         self.assertFalse(self.vault.verify_log_integrity())
 
@@ -222,34 +412,1066 @@ class TestHarpocratesCore(unittest.TestCase):
     def test_prev_hash_type_guard(self):
         """Ensures prev_hash type mismatch is caught to prevent exceptions during validation."""
         self.vault.add_entry("Service1", "user1", "pass1")
-        self.vault._data['logs'][0]['prev_hash'] = 12345
+        self.vault._data['logs'][-1]['prev_hash'] = 12345
         self.assertFalse(self.vault.verify_log_integrity())
 
-    def test_migration_v1_to_v2(self):
-        """Simulates loading a v1 vault and verifies the exception and migration process."""
-        self.vault._data['version'] = "1.6.0"
-        self.vault._data.pop('vault_format', None)
-        self.vault._data.pop('app_version', None)
-        self.vault._data.pop('log_genesis_hmac', None)
+    def test_log_verification_resumes_from_signed_checkpoint(self):
+        """After a verified check, only records appended since are hashed again."""
+        for i in range(20):
+            self.vault.add_audit_event("LOGIN", f"Access {i}")
+        self.assertTrue(self.vault.verify_log_integrity())
+        self.assertEqual(self.vault._data['log_checkpoint']['count'], len(self.vault._data['logs']))
+
+        self.vault.add_audit_event("LOGIN", "Access after checkpoint")
+        with patch('core.vault.record_digest', wraps=record_digest) as digest:
+            self.assertTrue(self.vault.verify_log_integrity())
+        # Checkpointed record, the new record, and the advanced checkpoint.
+        self.assertLessEqual(digest.call_count, 4)
+
         self.vault.save_vault()
-        
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded._data['log_checkpoint'], self.vault._data['log_checkpoint'])
+        self.assertTrue(reloaded.verify_log_integrity())
+
+    def test_forged_checkpoint_is_rejected(self):
+        """A checkpoint that is not signed with the session key invalidates the chain."""
+        self.vault.add_audit_event("LOGIN", "Access")
+        self.assertTrue(self.vault.verify_log_integrity())
+        self.vault._data['log_checkpoint']['hmac'] = "0" * 64
+        self.assertFalse(self.vault.verify_log_integrity())
+        self.assertFalse(self.vault.verify_log_integrity(full=True))
+
+    def test_full_log_verification_runs_in_background(self):
+        """The background job covers history older than the checkpoint."""
+        self.vault.add_entry("Service1", "user1", "pass1")
+        self.assertTrue(self.vault.verify_log_integrity())
+        self.vault._data['logs'][0]['details'] = "TAMPERED"
+        self.vault._update_genesis_hmac()
+
+        results = []
+        self.vault.start_full_log_verification(results.append).join(timeout=10)
+        self.assertEqual(results, [False])
+
+    def test_background_verification_and_saves_run_concurrently(self):
+        """Saves go on while the audit log is verified; the checkpoint is published under the lock."""
+        with self.vault.transaction():
+            for i in range(2000):
+                self.vault.add_audit_event("LOGIN", f"Access {i}")
+
+        results = []
+        with patch.object(config, "log_segment_max_records", 2010):
+            worker = self.vault.start_full_log_verification(results.append)
+            for i in range(20):
+                self.vault.add_audit_event("LOGIN", f"During {i}")
+            worker.join(timeout=30)
+        self.assertEqual(results, [True])
+
+        # Records a transaction rolls back are never covered by the checkpoint.
+        with self.assertRaises(RuntimeError):
+            with self.vault.transaction():
+                self.vault.add_audit_event("LOGIN", "rolled back")
+                worker = self.vault.start_full_log_verification(results.append)
+                worker.join(timeout=0.5)
+                raise RuntimeError("abort")
+        worker.join(timeout=30)
+        self.assertEqual(results, [True, True])
+        self.assertTrue(self.vault.verify_log_integrity())
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded.log_count(), self.vault.log_count())
+        self.assertTrue(reloaded.verify_log_integrity(full=True))
+
+    def test_log_rotation_archives_segments_by_size(self):
+        """A full live log moves to an encrypted segment chained by its final hash."""
+        with patch.object(config, "log_segment_max_records", 5):
+            for i in range(6):
+                self.vault.add_audit_event("LOGIN", f"Access {i}")
+        history = list(self.vault.iter_logs())
+
+        self.assertLess(len(self.vault.get_logs()), 5)
+        self.assertEqual(self.vault.log_count(), len(history))
+        segment = self.vault.log_archive.path_for(1)
+        self.assertTrue(os.path.exists(segment))
+        with open(segment, 'rb') as f:
+            self.assertNotIn(b"Access", f.read())
+
+        final_hash = self.vault._data['log_archive'][-1]['final_hash']
+        self.assertEqual(self.vault._data['logs'][0]['prev_hash'], final_hash)
+        self.assertTrue(self.vault.verify_log_integrity())
+        self.assertTrue(self.vault.verify_log_integrity(full=True))
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(list(reloaded.iter_logs()), history)
+        self.assertEqual(history[-1]['action'], 'SYSTEM')
+
+    def test_log_rotates_within_a_transaction_and_rolls_back_with_it(self):
+        """A large transaction seals bounded segments; a rolled-back one leaves none behind."""
+        with patch.object(config, "log_segment_max_records", 5):
+            with self.assertRaises(RuntimeError):
+                with self.vault.transaction():
+                    for i in range(12):
+                        self.vault.add_audit_event("LOGIN", f"Dropped {i}")
+                    self.assertEqual(len(self.vault._data["log_archive"]), 2)
+                    raise RuntimeError("abort")
+            self.assertEqual(self.vault._data.get("log_archive", []), [])
+            self.assertFalse(os.path.exists(self.vault.log_archive.path_for(1)))
+            self.assertEqual(self.vault.log_count(), 1)
+            self.assertTrue(self.vault.verify_log_integrity())
+
+            with self.vault.transaction():
+                for i in range(23):
+                    self.vault.add_audit_event("LOGIN", f"Access {i}")
+
+        manifest = self.vault._data["log_archive"]
+        self.assertEqual([s["count"] for s in manifest], [5] * 4)
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded.log_count(), 24)
+        self.assertEqual(next(reloaded.iter_logs())["details"], "Access 22")
+        self.assertTrue(reloaded.verify_log_integrity(full=True))
+
+    def test_failed_save_undoes_the_log_rotation_it_started(self):
+        """A save that fails after rotating leaves no rolled-back record in the archive."""
+        real_replace = os.replace
+
+        def failing_replace(src, dst):
+            if dst == self.vault.vault_path:
+                raise OSError("disk full")
+            real_replace(src, dst)
+
+        with patch.object(config, "log_segment_max_records", 3):
+            self.vault.add_audit_event("LOGIN", "a")
+            with patch("core.vault.os.replace", side_effect=failing_replace):
+                with self.assertRaises(OSError):
+                    self.vault.add_audit_event("LOGIN", "b")
+            self.assertEqual(next(self.vault.iter_logs())["details"], "a")
+            self.assertEqual(self.vault._data.get("log_archive", []), [])
+            self.assertFalse(os.path.exists(self.vault.log_archive.path_for(1)))
+
+            self.vault.add_audit_event("LOGIN", "c")
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        details = [r["details"] for r in reloaded.iter_logs()]
+        self.assertNotIn("b", details)
+        self.assertEqual(details[:2], ["c", "a"])
+        self.assertTrue(reloaded.verify_log_integrity(full=True))
+
+    def test_log_rotation_by_age_and_archive_tampering(self):
+        """Old segments rotate on save; a missing segment fails full verification."""
+        self.vault._data['logs'][0]['timestamp'] = "2020-01-01 00:00:00"
+        stamp_hash(self.vault._data['logs'][0])
+        self.vault._update_genesis_hmac()
+        with patch.object(config, "log_segment_max_age_days", 30):
+            self.vault.add_audit_event("LOGIN", "Access")
+        self.assertEqual(len(self.vault._data['log_archive']), 1)
+        self.assertEqual(self.vault.get_logs(), [])
+
+        self.vault.add_audit_event("LOGIN", "Access after rotation")
+        self.assertTrue(self.vault.verify_log_integrity(full=True))
+
+        os.remove(self.vault.log_archive.path_for(1))
+        self.assertTrue(self.vault.verify_log_integrity())
+        self.assertFalse(self.vault.verify_log_integrity(full=True))
+
+    @staticmethod
+    def _legacy_logs(data):
+        """Pre-v4 layout: newest-first logs without their cached hash."""
+        data['logs'] = [{k: v for k, v in log.items() if k != 'hash'} for log in reversed(data['logs'])]
+
+    def _write_legacy_vault(self, data):
+        """Writes a pre-v3 single-blob vault (salt + nonce + AES-GCM(JSON))."""
+        self._legacy_logs(data)
+        data['entries'] = [dict(e) for e in data['entries']]
+        salt = os.urandom(self.crypto.salt_size)
+        key = self.crypto.derive_session_key(self.m_pass, self.s_key, salt)
+        with open(self.test_vault_file, 'wb') as f:
+            f.write(self.crypto.encrypt_with_session_key(json.dumps(data), key, salt))
+
+    def test_migration_v1_to_current(self):
+        """Simulates loading a v1 vault and verifies the exception and migration process."""
+        self.vault.add_entry("Legacy", "old", "oldpass")
+        data = self.vault._data
+        data['version'] = "1.6.0"
+        data.pop('vault_format', None)
+        data.pop('app_version', None)
+        data.pop('log_genesis_hmac', None)
+        for entry in data['entries']:
+            entry.pop('id')
+        self._write_legacy_vault(data)
+
         migrated_vault = VaultManager(self.test_vault_file)
-        
-        # Note: load_vault intentionally populates _session_key and _data in memory 
-        # BEFORE raising the exception. This partial initialization state allows 
-        # migrate_to_v2() to proceed without requiring re-derivation of the master keys.
+
+        # Note: load_vault keeps the decrypted data and session key as pending
+        # migration state BEFORE raising the exception, so migrate()
+        # can proceed without requiring re-derivation of the master keys.
         with self.assertRaises(VaultMigrationRequired):
             migrated_vault.load_vault(self.m_pass, self.s_key)
-    
+
         self.assertTrue(hasattr(migrated_vault, '_pending_migration_data'))
         self.assertIsNone(migrated_vault._data)
-        
-        migrated_vault.migrate_to_v2()
-        
+
+        # The pre-v3 name still works, as an alias of migrate().
+        with self.assertWarns(DeprecationWarning):
+            migrated_vault.migrate_to_v2()
+
         self.assertFalse(hasattr(migrated_vault, '_pending_migration_data'))
-        self.assertEqual(migrated_vault._data['vault_format'], 2)
+        self.assertEqual(migrated_vault._data['vault_format'], VAULT_FORMAT)
         self.assertEqual(migrated_vault._data['app_version'], "2.0.0")
         self.assertIn('log_genesis_hmac', migrated_vault._data)
+        self.assertNotIn('version', migrated_vault._data)
+
+    def test_migration_v2_to_v3_seals_entries_individually(self):
+        """A v2 single-blob vault migrates to v3 and keeps its entries and log chain."""
+        self.vault.add_entry("GitHub", "dev", "ghpass", "https://github.com", "work")
+        data = self.vault._data
+        data['vault_format'] = 2
+        for entry in data['entries']:
+            entry.pop('id')
+        self._write_legacy_vault(data)
+
+        migrated_vault = VaultManager(self.test_vault_file)
+        with self.assertRaises(VaultMigrationRequired):
+            migrated_vault.load_vault(self.m_pass, self.s_key)
+        migrated_vault.migrate()
+
+        with open(self.test_vault_file, 'rb') as f:
+            self.assertEqual(f.read(4), b"HPV3")
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        entry = reloaded.get_entry(0)
+        self.assertEqual(entry['password'], "ghpass")
+        self.assertEqual(entry['notes'], "work")
+        self.assertIn('id', entry)
+        self.assertTrue(reloaded.verify_log_integrity())
+
+    def test_migration_v3_to_v4_reorders_logs_chronologically(self):
+        """v3 newest-first logs are stored in append order with cached hashes."""
+        self.vault.add_entry("Service1", "user1", "pass1", "https://s1.example", "n1")
+        expected = [log['action'] for log in self.vault.get_logs()]
+        self._legacy_logs(self.vault._data)
+        self.vault._data['vault_format'] = 3
+        self.vault.save_vault()
+
+        migrated_vault = VaultManager(self.test_vault_file)
+        with self.assertRaises(VaultMigrationRequired):
+            migrated_vault.load_vault(self.m_pass, self.s_key)
+        migrated_vault.migrate()
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded._data['logs'][0]['action'], 'SYSTEM')
+        self.assertEqual([log['action'] for log in reloaded.get_logs()], expected)
+        self.assertTrue(all('hash' in log for log in reloaded._data['logs']))
+        # Secrets survive the migration; the URL moved to the index.
+        self.assertEqual(reloaded.list_entries()[0]['url'], "https://s1.example")
+        self.assertEqual(reloaded.get_entry(0)['password'], "pass1")
+        self.assertEqual(reloaded.get_entry(0)['notes'], "n1")
+        self.assertTrue(reloaded.verify_log_integrity())
+
+    def test_log_append_uses_cached_hash(self):
+        """Appending chains to the stored hash of the newest record without rehashing it."""
+        self.vault.add_entry("Service1", "user1", "pass1")
+        newest = self.vault._data['logs'][-1]
+        with patch('core.vault.record_digest', side_effect=AssertionError("history rehashed")):
+            self.vault.add_audit_event("LOGIN", "Access via CLI")
+        self.assertEqual(self.vault._data['logs'][-1]['prev_hash'], newest['hash'])
+        self.assertEqual(self.vault.logs[0]['action'], 'LOGIN')
+        self.assertEqual(self.vault.get_logs(limit=2)[1]['action'], 'CREATE')
+
+        self.vault._data['logs'][-2]['hash'] = "f" * 64
+        self.assertFalse(self.vault.verify_log_integrity())
+
+    def test_search_ranks_fuzzy_matches_over_title_username_and_url(self):
+        """Exact title matches rank first; typos and other fields still match."""
+        self.vault.add_entry("GitHub", "dev", "p1", "https://github.com")
+        self.vault.add_entry("GitLab", "ops", "p2", "https://gitlab.com")
+        self.vault.add_entry("Work mail", "github-bot", "p3", "https://mail.example")
+
+        titles = [e['title'] for _, e in self.vault.search("github")]
+        self.assertEqual(titles[0], "GitHub")
+        self.assertIn("Work mail", titles)
+        self.assertEqual(self.vault.search("githbu")[0][1]['title'], "GitHub")
+        self.assertEqual(self.vault.search("gitlab.com")[0][1]['title'], "GitLab")
+        self.assertEqual(self.vault.search("example"), [(2, self.vault.list_entries()[2])])
+        self.assertEqual({e['title'] for _, e in self.vault.search("gi")}, {"GitHub", "GitLab", "Work mail"})
+        self.assertNotIn('password', self.vault.search("github")[0][1])
+
+    def test_search_index_follows_mutations(self):
+        """Adds, updates, deletes and bulk imports are reflected without a rebuild."""
+        self.vault.add_entry("Netflix", "viewer", "np")
+        self.vault.add_entry("Steam", "gamer", "sp")
+        self.assertEqual(self.vault.search("steam")[0][0], 1)
+        index = self.vault._search_index
+
+        self.vault.update_entry(0, {"title": "Disney Plus"})
+        self.assertEqual(self.vault.search("netflix"), [])
+        self.assertEqual(self.vault.search("disney")[0][0], 0)
+
+        self.vault.delete_entry(0)
+        self.assertEqual(self.vault.search("steam")[0][0], 0)
+
+        self.vault.add_entries_bulk([{"title": "Spotify", "username": "music", "password": "x"}])
+        idx, entry = self.vault.search("spotify")[0]
+        self.assertEqual(self.vault.get_entry(idx)['password'], "x")
+        self.assertIs(self.vault._search_index, index)
+
+    def test_v3_load_decrypts_entry_bodies_lazily(self):
+        """Listing needs only the index; bodies are opened one at a time on demand."""
+        self.vault.add_entry("Netflix", "viewer", "np", "https://netflix.com", "n1")
+        self.vault.add_entry("Steam", "gamer", "sp")
+
+        reloaded = VaultManager(self.test_vault_file)
+        with patch.object(reloaded.crypto, 'open_record_into', wraps=reloaded.crypto.open_record_into) as opened:
+            reloaded.load_vault(self.m_pass, self.s_key)
+            self.assertEqual(opened.call_count, 1)
+
+            listing = reloaded.list_entries()
+            self.assertEqual([e['title'] for e in listing], ["Netflix", "Steam"])
+            self.assertNotIn('password', listing[0])
+            self.assertEqual(opened.call_count, 1)
+
+            self.assertEqual(reloaded.get_entry(1)['password'], "sp")
+            self.assertEqual(opened.call_count, 2)
+
+    def test_read_views_are_immutable_and_copy_free(self):
+        """Entries and logs are handed out as read-only views, never deep copies."""
+        self.vault.add_entry("Netflix", "viewer", "np", "https://netflix.com", "n1")
+        self.vault.add_entry("Steam", "gamer", "sp")
+
+        with patch('copy.deepcopy', side_effect=AssertionError("deepcopy")):
+            entries = self.vault.get_entries()
+            listing = self.vault.list_entries()
+            logs = self.vault.get_logs()
+            entry = self.vault.get_entry(0)
+
+        with self.assertRaises(TypeError):
+            entries[0]['password'] = "changed"
+        with self.assertRaises(TypeError):
+            entry['title'] = "changed"
+        with self.assertRaises(TypeError):
+            logs[0]['details'] = "changed"
+        with self.assertRaises(TypeError):
+            entries[0] = {}
+        self.assertEqual(self.vault.get_entry(0)['password'], "np")
+
+        self.assertNotIn('password', listing[1])
+        self.assertEqual(dict(listing[1]), {k: v for k, v in entries[1].items() if k not in ('password', 'notes')})
+        self.assertEqual([len(page) for page in listing.pages(1)], [1, 1])
+        self.assertEqual(entries[-1]['title'], "Steam")
+
+    def test_get_entries_view_decrypts_bodies_on_access(self):
+        """Iterating the entries view opens each body only when it is reached."""
+        self.vault.add_entry("Netflix", "viewer", "np")
+        self.vault.add_entry("Steam", "gamer", "sp")
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        with patch.object(reloaded.crypto, 'open_record_into', wraps=reloaded.crypto.open_record_into) as opened:
+            entries = reloaded.get_entries()
+            self.assertEqual(opened.call_count, 0)
+            self.assertEqual(entries[1]['password'], "sp")
+            self.assertEqual(opened.call_count, 1)
+
+    def test_transaction_commits_mixed_mutations_in_one_save(self):
+        """Adds, updates, deletes and audit events inside a transaction cost one save."""
+        self.vault.add_entry("Old", "u", "p0")
+        with patch.object(self.vault, 'save_vault', wraps=self.vault.save_vault) as save:
+            with self.vault.transaction():
+                self.vault.add_entry("A", "u", "p1")
+                self.vault.add_entry("B", "u", "p2")
+                self.vault.update_entry(1, {"password": "p1-new"})
+                self.vault.delete_entry(0)
+                self.vault.add_audit_event("HIBP_CLEAN", "Full scan passed successfully")
+                self.assertEqual(save.call_count, 0)
+            self.assertEqual(save.call_count, 1)
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual([e['title'] for e in reloaded.list_entries()], ["A", "B"])
+        self.assertEqual(reloaded.get_entry(0)['password'], "p1-new")
+        self.assertEqual(reloaded.get_logs()[0]['action'], "HIBP_CLEAN")
+        self.assertTrue(reloaded.verify_log_integrity())
+
+    def test_transaction_rolls_back_from_change_log(self):
+        """A failing block (or commit) restores entries, sealed bodies and logs."""
+        self.vault.add_entry("Keep", "u", "p1", "https://keep.example", "n1")
+        self.vault.add_entry("Drop", "u", "p2")
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        before = [dict(e) for e in reloaded.list_entries()]
+        log_count = reloaded.log_count()
+
+        with patch('copy.deepcopy', side_effect=AssertionError("snapshot")):
+            with self.assertRaises(ValueError):
+                with reloaded.transaction():
+                    reloaded.update_entry(0, {"password": "changed", "title": "Renamed"})
+                    reloaded.delete_entry(1)
+                    reloaded.add_entry("New", "u", "p3")
+                    raise ValueError("abort")
+
+        self.assertEqual([dict(e) for e in reloaded.list_entries()], before)
+        self.assertEqual(reloaded.log_count(), log_count)
+        self.assertEqual(reloaded.get_entry(0)['password'], "p1")
+        self.assertEqual(reloaded.get_entry(1)['password'], "p2")
+        self.assertEqual(reloaded.search("drop")[0][0], 1)
+
+        with patch.object(reloaded, 'save_vault', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                reloaded.add_entry("Unsaved", "u", "p4")
+        self.assertEqual(len(reloaded.list_entries()), 2)
+        self.assertTrue(reloaded.verify_log_integrity())
+
+    def test_nested_transaction_is_a_savepoint(self):
+        """A failed inner block is undone without discarding the outer one."""
+        self.vault.journal_enabled = True
+        with self.vault.transaction():
+            self.vault.add_entry("Outer", "u", "p1")
+            try:
+                with self.vault.transaction():
+                    self.vault.add_entry("Inner", "u", "p2")
+                    raise KeyError("inner")
+            except KeyError:
+                pass
+            self.assertFalse(self.vault.update_entry(5, {"title": "missing"}))
+        self.assertEqual(self.vault.journal.record_count, 1)
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual([e['title'] for e in reloaded.list_entries()], ["Outer"])
+        self.assertTrue(reloaded.verify_log_integrity())
+
+    def test_entries_are_compact_slotted_records(self):
+        """Entries live as slotted objects that keep the dict-shaped API."""
+        entry = Entry({"title": "T", "username": "user@example.com", "category": "work"})
+        self.assertFalse(hasattr(entry, '__dict__'))
+        self.assertNotIn('password', entry)
+        self.assertEqual(entry.get('password', "-"), "-")
+        entry.update(password="p")
+        self.assertEqual(dict(entry), {"title": "T", "username": "user@example.com", "password": "p", "category": "work"})
+        del entry['category']
+        self.assertEqual(len(entry), 3)
+        self.assertIs(Entry({"username": "".join("user@example.com")})['username'], entry['username'])
+
+        self.vault.add_entry("GitHub", "dev", "ghpass", "https://github.com")
+        self.vault._data['entries'][0]['category'] = "work"
+        self.vault.save_vault()
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertIsInstance(reloaded._data['entries'][0], Entry)
+        self.assertEqual(reloaded.list_entries()[0]['category'], "work")
+        self.assertEqual(reloaded.get_entry(0)['password'], "ghpass")
+
+    def test_binary_table_codec_round_trips_irregular_records(self):
+        """Binary tables keep missing fields, NULs, non-ASCII text and non-string values."""
+        codec = CODECS["binary"]
+        index = {
+            "vault_format": VAULT_FORMAT,
+            "log_checkpoint": {"count": 2, "hash": "ab", "hmac": "cd"},
+            "entries": [
+                {"id": "1", "title": "Ñandú\x00", "body": [0, 40], "extra": 7},
+                {"id": "2", "title": "", "body": [40, 41], "extra": {"k": [1, "x"]}},
+                {"id": "3", "title": "🔑", "body": [81, 12], "updated_at": "2026-01-01"},
+            ],
+            "logs": [],
+        }
+        self.assertEqual(codec.load_index(bytearray(codec.dump_index(index))), index)
+        body = {"password": "pässwörd", "notes": "line1\nline2"}
+        self.assertEqual(codec.load_body(bytearray(codec.dump_body(body))), body)
+
+        raw = codec.dump_index(index)
+        for damaged in (raw[:-1], raw + b"\x00", b"HPB0" + raw[4:]):
+            with self.assertRaises(VaultCorruptError):
+                codec.load_index(bytearray(damaged))
+
+    def test_binary_payload_vault_converts_in_both_directions(self):
+        """A vault can be converted to the binary payload codec and back without losing data."""
+        self.vault.add_entry("GitHub", "dev", "ghpass", "https://github.com", "2FA on")
+        self.vault.add_entry("Mail", "me", "mailpass")
+        chain_before = [dict(r) for r in self.vault.logs]
+
+        self.vault.convert_payload("binary")
+        with open(self.test_vault_file, "rb") as f:
+            self.assertIn(b'"codec": "binary"', f.read(200))
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded.payload_codec, "binary")
+        self.assertEqual(reloaded.get_entry(0)['notes'], "2FA on")
+        self.assertEqual(reloaded.list_entries()[0]['url'], "https://github.com")
+        self.assertEqual([dict(r) for r in reloaded.logs], chain_before)
+        self.assertTrue(reloaded.verify_log_integrity(full=True))
+
+        reloaded.update_entry(1, {"password": "mailpass-2"})
+        reloaded.convert_payload("json")
+        with open(self.test_vault_file, "rb") as f:
+            self.assertNotIn(b'"codec"', f.read(200))
+        back = VaultManager(self.test_vault_file)
+        back.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(back.payload_codec, "json")
+        self.assertEqual(back.get_entry(0)['password'], "ghpass")
+        self.assertEqual(back.get_entry(1)['password'], "mailpass-2")
+        self.assertTrue(back.verify_log_integrity(full=True))
+
+        with self.assertRaises(HarpocratesError):
+            back.convert_payload("xml")
+
+    def test_cli_backup_copies_the_open_vault_and_its_archive(self):
+        """The backup command copies the vault at vault_path, not a default file name."""
+        from app.cli import CommandDispatcher
+        self.vault.add_entry("GitHub", "dev", "ghpass")
+        with patch.object(config, "log_segment_max_records", 2):
+            self.vault.add_audit_event("LOGIN", "rotate")
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir, True)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(workdir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            CommandDispatcher(self.vault).cmd_backup()
+
+        [backup] = [f for f in os.listdir(workdir) if f.endswith(".hpro")]
+        self.assertTrue(os.path.isdir(backup + ".logs"))
+        restored = VaultManager(backup)
+        restored.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(restored.get_entry(0)["password"], "ghpass")
+        self.assertTrue(restored.verify_log_integrity(full=True))
+
+    def test_unlock_keeps_the_recorded_codec_unless_vault_codec_is_set(self):
+        """Opening a binary vault on a host without VAULT_CODEC does not rewrite it."""
+        from app.cli import _apply_storage_settings
+        self.vault.add_entry("GitHub", "dev", "ghpass")
+        self.vault.convert_payload("binary")
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+
+        with patch.object(config, "vault_codec", None), \
+                patch.object(reloaded, "convert_payload") as convert:
+            _apply_storage_settings(reloaded)
+        convert.assert_not_called()
+        with patch.object(config, "vault_codec", "json"), contextlib.redirect_stdout(io.StringIO()):
+            _apply_storage_settings(reloaded)
+        self.assertEqual(reloaded.payload_codec, "json")
+
+    def test_compressed_index_is_recorded_and_loaded_automatically(self):
+        """The sealed index can be compressed; loads read the algorithm from the header."""
+        self.vault.add_entry("GitHub", "dev", "ghpass", "https://github.com")
+        with self.vault.transaction():
+            for _ in range(300):
+                self.vault.add_audit_event("LOGIN", "Access via CLI")
+        plain_size = os.path.getsize(self.test_vault_file)
+
+        for algorithm in ("zlib", "lzma"):
+            self.vault.compression = algorithm
+            self.vault.save_vault()
+            with open(self.test_vault_file, "rb") as f:
+                self.assertIn(f'"compression": "{algorithm}"'.encode(), f.read(200))
+            self.assertLess(os.path.getsize(self.test_vault_file), plain_size / 3)
+
+            reloaded = VaultManager(self.test_vault_file)
+            self.assertEqual(reloaded.compression, "none")
+            reloaded.load_vault(self.m_pass, self.s_key)
+            self.assertEqual(reloaded.get_entry(0)['password'], "ghpass")
+            self.assertEqual(len(reloaded.logs), 302)
+            self.assertTrue(reloaded.verify_log_integrity(full=True))
+            # A host with default settings saves it back with the recorded algorithm.
+            self.assertEqual(reloaded.compression, algorithm)
+            reloaded.add_audit_event("LOGIN", "Access via CLI")
+            with open(self.test_vault_file, "rb") as f:
+                self.assertIn(f'"compression": "{algorithm}"'.encode(), f.read(200))
+
+        with self.assertRaises(HarpocratesError):
+            compress("brotli", b"data")
+
+    def test_kdf_calibration_fills_the_time_budget(self):
+        """Calibration keeps the memory ceiling and adds passes up to the target time."""
+        def timer(params):  # 10 ms setup + 1 ms per MiB and pass
+            return 0.010 + params.memory_cost / 1024 * params.iterations / 1000
+
+        params, seconds = calibrate(0.5, max_memory_cost=64 * 1024, lanes=2, timer=timer)
+        self.assertEqual(params, KdfParams(64 * 1024, 7, 2))
+        self.assertLessEqual(seconds, 0.5)
+        # A single pass over the ceiling is too slow: memory is halved instead.
+        params, _ = calibrate(0.1, max_memory_cost=1024 * 1024, lanes=1, timer=timer)
+        self.assertEqual(params, KdfParams(64 * 1024, 1, 1))
+
+    def test_kdf_params_are_read_from_the_vault_header(self):
+        """Unlocking uses the Argon2 costs stored in the vault, not the local settings."""
+        stored = KdfParams.from_config()
+        with open(self.test_vault_file, "rb") as f:
+            self.assertIn(b'"kdf": {', f.read(300))
+
+        with patch.object(config, "argon2_iterations", stored.iterations + 1):
+            reloaded = VaultManager(self.test_vault_file)
+            reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded.kdf_params, stored)
+
+        with self.assertRaises(VaultCorruptError):
+            KdfParams.from_header({"kdf": {"name": "argon2id", "memory_cost": 2**40, "iterations": 1, "lanes": 1}})
+
+    def _archive_bytes(self):
+        with open(self.vault.log_archive.path_for(1), 'rb') as f:
+            return f.read()
+
+    def _log_history(self):
+        """An entry, and enough audit events to archive a log segment."""
+        self.vault.add_entry("GitHub", "dev", "ghpass")
+        with patch.object(config, "log_segment_max_records", 3):
+            for i in range(4):
+                self.vault.add_audit_event("LOGIN", f"Access {i}")
+        return [dict(r) for r in self.vault.iter_logs()]
+
+    def test_change_kdf_params_only_rewraps_the_data_key(self):
+        """New Argon2 costs re-seal the 32-byte data key; entries and archived logs are untouched."""
+        history = self._log_history()
+        data_key, archived = self.vault._session_key, self._archive_bytes()
+        fast = KdfParams(8 * 1024, 1, 1)
+
+        with self.assertRaises(AuthenticationError):
+            self.vault.change_kdf_params("wrong", self.s_key, fast)
+        with patch.object(self.vault, "_open_entry", side_effect=AssertionError("re-encrypted")):
+            self.vault.change_kdf_params(self.m_pass, self.s_key, fast)
+        self.assertEqual(self.vault._session_key, data_key)
+        self.assertEqual(self._archive_bytes(), archived)
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded.kdf_params, fast)
+        self.assertEqual(reloaded.get_entry(0)['password'], "ghpass")
+        self.assertEqual([dict(r) for r in reloaded.iter_logs()], history)
+        self.assertTrue(reloaded.verify_log_integrity(full=True))
+
+    def test_change_credentials_locks_out_the_old_password(self):
+        """A password change re-wraps the data key: the old credentials stop opening the vault."""
+        self._log_history()
+        self.vault.change_credentials(self.m_pass, self.s_key, "new-master", "new-secret")
+
+        with self.assertRaises(AuthenticationError):
+            VaultManager(self.test_vault_file).load_vault(self.m_pass, self.s_key)
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault("new-master", "new-secret")
+        self.assertEqual(reloaded._session_key, self.vault._session_key)
+        self.assertEqual(reloaded.get_entry(0)['password'], "ghpass")
+        with self.assertRaises(AuthenticationError):
+            reloaded.change_credentials(self.m_pass, self.s_key, "x", "y")
+
+    def test_rotate_data_key_reencrypts_bodies_and_log_archive(self):
+        """Rotating the data key re-encrypts everything bound to it, under the same password."""
+        history = self._log_history()
+        data_key, archived = self.vault._session_key, self._archive_bytes()
+
+        self.vault.rotate_data_key(self.m_pass, self.s_key)
+        self.assertNotEqual(self.vault._session_key, data_key)
+        self.assertNotEqual(self._archive_bytes(), archived)
+        self.assertFalse(os.path.exists(self.test_vault_file + ".rekey.logs"))
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded.get_entry(0)['password'], "ghpass")
+        self.assertEqual([dict(r) for r in reloaded.iter_logs()], history)
+        self.assertTrue(reloaded.verify_log_integrity(full=True))
+
+    def test_migration_v5_to_v6_adopts_a_wrapped_data_key(self):
+        """A v5 vault keyed directly by Argon2 moves to a random data key on migration."""
+        history = self._log_history()
+        vault = self.vault
+        # Rewrite it as v5: the key derived with the file salt, no envelope.
+        derived = self.crypto.derive_session_key(self.m_pass, self.s_key, vault._salt, vault.kdf_params)
+        vault._kdf_salt = vault._salt
+        vault._rekey(derived, derived)
+        vault._wrapped_key = None
+        vault._data['vault_format'] = 5
+        vault.save_vault()
+
+        migrated_vault = VaultManager(self.test_vault_file)
+        with self.assertRaises(VaultMigrationRequired):
+            migrated_vault.load_vault(self.m_pass, self.s_key)
+        migrated_vault.migrate()
+        self.assertIsNotNone(migrated_vault._wrapped_key)
+        self.assertNotEqual(migrated_vault._session_key, derived)
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded._data['vault_format'], VAULT_FORMAT)
+        self.assertEqual(reloaded.get_entry(0)['password'], "ghpass")
+        self.assertEqual([dict(r) for r in reloaded.iter_logs()], history)
+        self.assertTrue(reloaded.verify_log_integrity(full=True))
+
+    def _start_agent(self, timeout=60):
+        directory = tempfile.mkdtemp()
+        os.chmod(directory, 0o700)
+        self.addCleanup(shutil.rmtree, directory, True)
+        agent = KeyAgent(os.path.join(directory, "agent.sock"), timeout=timeout)
+        ready = threading.Event()
+        thread = threading.Thread(target=agent.serve_forever, args=(ready,), daemon=True)
+        thread.start()
+        self.assertTrue(ready.wait(5))
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(agent.stop)
+        return agent, thread
+
+    @unittest.skipUnless(agent_supported(), "needs Unix domain sockets")
+    def test_agent_unlocks_later_sessions_without_argon2(self):
+        """A key cached by one unlock opens the vault in a new session without credentials."""
+        agent, _ = self._start_agent()
+        self.vault.add_entry("GitHub", "dev", "ghpass")
+        first = VaultManager(self.test_vault_file)
+        first.agent = AgentClient(agent.path)
+        with self.assertRaises(AuthenticationError):
+            first.load_vault("wrong", self.s_key)
+        with self.assertRaises(AuthenticationError):
+            first.load_vault()  # nothing cached yet
+        first.load_vault(self.m_pass, self.s_key)
+
+        second = VaultManager(self.test_vault_file)
+        second.agent = AgentClient(agent.path)
+        with patch.object(HarpocratesCrypto, "derive_session_key", side_effect=AssertionError("Argon2 ran")):
+            second.load_vault()
+        self.assertEqual(second.get_entry(0)['password'], "ghpass")
+        # Typed credentials are always checked, even with a cached key.
+        third = VaultManager(self.test_vault_file)
+        third.agent = AgentClient(agent.path)
+        with self.assertRaises(AuthenticationError):
+            third.load_vault("wrong", self.s_key)
+
+    @unittest.skipUnless(agent_supported(), "needs Unix domain sockets")
+    def test_agent_wipes_keys_and_exits_when_idle(self):
+        """The agent forgets every key and removes its socket after the idle timeout."""
+        agent, thread = self._start_agent(timeout=0.2)
+        client = AgentClient(agent.path)
+        client.put_key("vault", b"\x01" * 32)
+        self.assertEqual(client.status()["keys"], 1)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(agent._keys, {})
+        self.assertFalse(client.available())
+        self.assertIsNone(client.get_key("vault"))
+
+    @unittest.skipUnless(agent_supported(), "needs Unix domain sockets")
+    def test_agent_client_sends_nothing_to_a_socket_others_can_plant(self):
+        """A listener in a world-writable directory never receives the vault key."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        os.chmod(directory, 0o777)
+        path = os.path.join(directory, "agent.sock")
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(listener.close)
+        listener.bind(path)
+        listener.listen()
+        listener.settimeout(0.2)
+
+        self.vault.agent = AgentClient(path)
+        self.vault.load_vault(self.m_pass, self.s_key)
+        self.assertFalse(self.vault.agent.available())
+        with self.assertRaises(socket.timeout):
+            listener.accept()
+
+    def test_batch_runs_commands_with_one_save(self):
+        """Batch mode answers every command as a JSON line and saves once."""
+        self.vault.add_entry("GitHub", "dev", "ghpass")
+        gh_id = self.vault.list_entries()[0]["id"]
+        commands = [
+            '{"op": "add", "title": "AWS", "username": "root", "password": "awspass"}',
+            '{"op": "add", "title": "Mail", "username": "me", "length": 16}',
+            f'{{"op": "update", "id": "{gh_id}", "fields": {{"password": "new"}}}}',
+            '# comments and blank lines are skipped',
+            '',
+            '{"op": "get", "index": 1}',
+            '{"op": "search", "query": "aws"}',
+            '{"op": "delete", "index": 9}',
+            '{"op": "export"}',
+        ]
+        out = io.StringIO()
+        with patch.object(self.vault, "save_vault", wraps=self.vault.save_vault) as save:
+            summary = run_batch(self.vault, commands, out)
+        self.assertEqual(save.call_count, 1)
+
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(results[1]["password"]), 16)
+        self.assertEqual(results[3]["entry"]["password"], "awspass")
+        self.assertEqual(results[4]["results"][0]["title"], "AWS")
+        self.assertEqual(results[5], {"ok": False, "line": 8, "error": "no entry at index 9"})
+        self.assertEqual([e["title"] for e in results[6]["entries"]], ["GitHub", "AWS", "Mail"])
+        self.assertEqual(summary, results[-1])
+        self.assertEqual((summary["applied"], summary["failed"], summary["saved"]), (6, 1, True))
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded.get_entry(0)["password"], "new")
+        self.assertEqual(len(reloaded.list_entries()), 3)
+
+    def test_atomic_batch_discards_all_changes_on_error(self):
+        """With atomic, one bad command leaves the vault as it was."""
+        commands = [
+            '{"op": "add", "title": "AWS", "username": "root", "password": "p"}',
+            '{"op": "update", "index": 0, "fields": {"id": "forged"}}',
+        ]
+        out = io.StringIO()
+        summary = run_batch(self.vault, commands, out, atomic=True)
+        self.assertFalse(summary["saved"])
+        self.assertIn("unknown fields: id", out.getvalue())
+        self.assertEqual(len(self.vault.list_entries()), 0)
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(len(reloaded.list_entries()), 0)
+
+    def test_batch_reports_a_failed_save_in_the_commit_line(self):
+        """The commit line is written after the save: a failed save is reported, not "saved": true."""
+        commands = ['{"op": "add", "title": "AWS", "username": "root", "password": "p"}']
+        out = io.StringIO()
+        with patch.object(VaultManager, "_write_vault", side_effect=OSError("disk full")):
+            summary = run_batch(self.vault, commands, out, event=("LOGIN", "Access via batch"))
+        self.assertEqual(json.loads(out.getvalue().splitlines()[-1]), summary)
+        self.assertEqual((summary["ok"], summary["saved"]), (False, False))
+        self.assertIn("disk full", summary["error"])
+        self.assertEqual(len(self.vault.list_entries()), 0)
+        self.assertNotIn("Access via batch", [log["details"] for log in self.vault.get_logs()])
+
+    def test_startup_defers_heavy_imports(self):
+        """Nothing only one menu command needs is imported before the password prompt."""
+        times = import_times(STARTUP)
+        self.assertIn("app.cli", times)
+        for module in ("requests", "zxcvbn", "pyperclip", "core.auditor", "core.importer"):
+            self.assertNotIn(module, times)
+
+    def test_write_behind_coalesces_commits_into_one_save(self):
+        """In write-behind mode a burst of changes returns at once and is saved once."""
+        self.vault.write_behind_delay = 0.2
+        self.addCleanup(self.vault.close)
+        write = VaultManager._write_vault
+        with patch.object(VaultManager, "_write_vault", autospec=True, side_effect=write) as save:
+            for i in range(5):
+                self.vault.add_entry(f"Service {i}", "user", f"pass{i}")
+            self.vault.update_entry(0, {"password": "changed"})
+            self.assertEqual(save.call_count, 0)
+            self.assertTrue(self.vault._saver.pending)
+
+            deadline = time.monotonic() + 5
+            while self.vault._saver.pending and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(save.call_count, 1)
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(len(reloaded.list_entries()), 5)
+        self.assertEqual(reloaded.get_entry(0)["password"], "changed")
+
+    def test_write_behind_flushes_pending_changes_on_exit(self):
+        """flush_all (exit, auto-lock, Ctrl+C) writes changes before the delay runs out."""
+        self.vault.write_behind_delay = 60
+        self.addCleanup(self.vault.close)
+        self.vault.add_entry("GitHub", "dev", "ghpass")
+        unsaved = VaultManager(self.test_vault_file)
+        unsaved.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(len(unsaved.list_entries()), 0)
+
+        flush_all()
+        self.assertFalse(self.vault._saver.pending)
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded.get_entry(0)["password"], "ghpass")
+
+    def test_failed_background_save_is_reported_and_retried(self):
+        """A background save error surfaces on the next change; flush retries it."""
+        self.vault.write_behind_delay = 0.05
+        self.addCleanup(self.vault.close)
+        with patch.object(VaultManager, "_write_vault", side_effect=OSError("disk full")):
+            self.vault.add_entry("GitHub", "dev", "ghpass")
+            deadline = time.monotonic() + 5
+            while self.vault._saver._error is None and time.monotonic() < deadline:
+                time.sleep(0.02)
+            with self.assertRaises(HarpocratesError):
+                self.vault.add_entry("Mail", "me", "mailpass")
+        self.assertEqual(len(self.vault.list_entries()), 1)  # the failed change rolled back
+        self.vault.flush()
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual([e["title"] for e in reloaded.list_entries()], ["GitHub"])
+
+    def test_benchmark_suite_reports_and_compares_every_metric(self):
+        """The vault benchmark times each hot path and flags slowdowns past the threshold."""
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir, True)
+        with patch.object(config, "argon2_memory_cost", 8 * 1024), patch.object(config, "argon2_iterations", 1):
+            results = run_suite(["5x20"], workdir, repeat=1, progress=lambda _: None)
+        metrics = {r["metric"] for r in results["results"]}
+        self.assertTrue({"derive_session_key", "load_vault", "save_vault", "import_from_csv",
+                         "import_bitwarden_json", "import_keepass_xml"} <= metrics)
+        self.assertEqual(len(unlocked(os.path.join(workdir, "bench_5x20.hpro")).list_entries()), 5)
+
+        slower = json.loads(json.dumps(results))
+        slower["results"][0]["seconds"] = results["results"][0]["seconds"] * 2 + 0.01
+        flagged = [row[1] for row in compare(slower, results) if row[-1]]
+        self.assertEqual(flagged, [results["results"][0]["metric"]])
+
+    def test_profiler_breaks_down_unlock_and_save_by_phase(self):
+        """With profiling on, each command reports nested spans; off, nothing is recorded."""
+        self.vault.add_entry("GitHub", "dev", "ghpass")
+        profiler.reset()
+        profiler.enable()
+        self.addCleanup(profiler.reset)
+        self.addCleanup(profiler.enable, False)
+        with profiler.command("unlock"):
+            VaultManager(self.test_vault_file).load_vault(self.m_pass, self.s_key)
+        with profiler.command("add"):
+            self.vault.add_entry("Mail", "me", "mailpass")
+
+        spans = {(r["command"], r["span"]): r for r in profiler.results()}
+        for path in ("load_vault", "load_vault/derive_session_key", "load_vault/decrypt", "load_vault/parse"):
+            self.assertIn(("unlock", path), spans)
+        for path in ("save_vault/serialize", "save_vault/encrypt", "save_vault/write/fsync"):
+            self.assertIn(("add", path), spans)
+        self.assertGreaterEqual(spans[("unlock", "(wall time)")]["total_ms"], spans[("unlock", "load_vault")]["total_ms"])
+
+        out = io.StringIO()
+        profiler.write_report("text", out)
+        self.assertIn("[unlock]", out.getvalue())
+        report = os.path.join(tempfile.mkdtemp(), "profile.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(report), True)
+        profiler.write_report(report)
+        with open(report) as f:
+            self.assertEqual(len(json.load(f)["spans"]), len(spans))
+
+        profiler.enable(False)
+        profiler.reset()
+        self.vault.add_entry("Bank", "me", "bankpass")
+        self.assertEqual(profiler.results(), [])
+
+    def test_profile_setting_treats_falsy_values_as_off(self):
+        """HARPOCRATES_PROFILE=0/false disables profiling rather than naming a JSON file."""
+        for value, expected in (("0", ""), ("False", ""), ("off", ""), ("1", "1"), ("out.json", "out.json")):
+            with patch.dict(os.environ, {"HARPOCRATES_PROFILE": value}):
+                self.assertEqual(Settings().profile, expected, value)
+
+    def test_v3_save_reuses_unchanged_sealed_bodies(self):
+        """Saving after an index-only change does not re-encrypt untouched entry bodies."""
+        self.vault.add_entry("Keep", "u", "p1")
+        self.vault.add_entry("Change", "u", "p2")
+        def sealed_body(entry_id):
+            start, length = self.vault._sealed_bodies[entry_id]
+            return self.vault._mapping[start:start + length]
+
+        keep_id, change_id = [e['id'] for e in self.vault._data['entries']]
+        keep_before, change_before = sealed_body(keep_id), sealed_body(change_id)
+
+        self.vault.update_entry(1, {"password": "p2-new"})
+        self.assertEqual(sealed_body(keep_id), keep_before)
+        self.assertNotEqual(sealed_body(change_id), change_before)
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded.get_entry(0)['password'], "p1")
+        self.assertEqual(reloaded.get_entry(1)['password'], "p2-new")
+
+    def test_decrypt_into_buffer_matches_and_rejects_tampering(self):
+        """In-place decryption yields a wipeable bytearray and still authenticates data."""
+        key = os.urandom(32)
+        sealed = bytearray(self.crypto.seal_record(b"secret payload", key, b"ctx"))
+
+        plaintext = self.crypto.open_record_into(memoryview(sealed), key, b"ctx")
+        self.assertIsInstance(plaintext, bytearray)
+        self.assertEqual(plaintext, b"secret payload")
+        wipe_buffer(plaintext)
+        self.assertEqual(plaintext, bytearray(len(b"secret payload")))
+
+        with self.assertRaises(AuthenticationError):
+            self.crypto.open_record_into(memoryview(sealed), key, b"other-ctx")
+        sealed[-1] ^= 0x01
+        with self.assertRaises(AuthenticationError):
+            self.crypto.open_record_into(memoryview(sealed), key, b"ctx")
+
+    def test_journal_mode_appends_without_rewriting_base(self):
+        """Mutations in journal mode leave the base blob untouched and are replayed on load."""
+        self.vault.journal_enabled = True
+        with open(self.test_vault_file, 'rb') as f:
+            base_before = f.read()
+
+        self.vault.add_entry("GitLab", "dev", "pw1")
+        self.vault.add_entry("Discord", "gamer", "pw2")
+        self.vault.update_entry(0, {"password": "pw1-rotated"})
+        self.vault.delete_entry(1)
+        self.vault.add_audit_event("LOGIN", "Journal Test")
+
+        with open(self.test_vault_file, 'rb') as f:
+            self.assertEqual(f.read(), base_before)
+        self.assertTrue(os.path.exists(self.vault.journal.path))
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(reloaded.get_entries(), self.vault.get_entries())
+        self.assertEqual(reloaded.get_logs(), self.vault.get_logs())
+        self.assertTrue(reloaded.verify_log_integrity())
+
+    def test_journal_compaction_folds_records_into_base(self):
+        """Reaching the threshold (or compacting manually) rewrites the base and drops the journal."""
+        self.vault.journal_enabled = True
+        with patch.object(config, "journal_compact_threshold", 3):
+            self.vault.add_entry("A", "u", "p")
+            self.vault.add_entry("B", "u", "p")
+            self.assertEqual(self.vault.journal.record_count, 2)
+            self.vault.add_entry("C", "u", "p")
+
+        self.assertFalse(os.path.exists(self.vault.journal.path))
+        self.vault.add_entry("D", "u", "p")
+        self.vault.compact_journal()
+        self.assertFalse(os.path.exists(self.vault.journal.path))
+
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual([e['title'] for e in reloaded.get_entries()], ["A", "B", "C", "D"])
+
+    def test_failed_compaction_keeps_the_journaled_change(self):
+        """Once journaled a change is committed, even if folding it into the base fails."""
+        self.vault.journal_enabled = True
+        real_replace = os.replace
+
+        def failing_replace(src, dst):
+            if dst == self.vault.vault_path:
+                raise OSError("disk full")
+            real_replace(src, dst)
+
+        with patch.object(config, "journal_compact_threshold", 3):
+            self.vault.add_entry("A", "u", "p")
+            self.vault.add_entry("B", "u", "p")
+            with patch("core.vault.os.replace", side_effect=failing_replace):
+                with self.assertLogs("core.vault", "WARNING"):
+                    self.assertTrue(self.vault.delete_entry(0))
+                self.assertEqual([e['title'] for e in self.vault.list_entries()], ["B"])
+                with self.assertLogs("core.vault", "WARNING"):
+                    self.vault.update_entry(0, {"notes": "edited B"})
+            self.assertEqual(self.vault.journal.record_count, 4)
+            self.vault.add_entry("C", "u", "p")
+
+        self.assertFalse(os.path.exists(self.vault.journal.path))
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(
+            [(e['title'], e['notes']) for e in reloaded.get_entries()],
+            [("B", "edited B"), ("C", "")],
+        )
+        self.assertTrue(reloaded.verify_log_integrity(full=True))
+
+    def test_journal_detects_tampered_record_and_ignores_torn_tail(self):
+        """A modified record fails authentication; an interrupted append is dropped."""
+        self.vault.journal_enabled = True
+        self.vault.add_entry("First", "u", "p")
+        self.vault.add_entry("Second", "u", "p")
+
+        with open(self.vault.journal.path, 'ab') as f:
+            f.write(b"\x00\x00\x01\x00partial")
+        reloaded = VaultManager(self.test_vault_file)
+        reloaded.load_vault(self.m_pass, self.s_key)
+        self.assertEqual(len(reloaded.get_entries()), 2)
+
+        with open(self.vault.journal.path, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xFF]))
+        with self.assertRaises(AuthenticationError):
+            VaultManager(self.test_vault_file).load_vault(self.m_pass, self.s_key)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
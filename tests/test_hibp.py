@@ -0,0 +1,217 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.auditor import (
+    BreachScanner,
+    OnlineRangeBackend,
+    PasswordAuditor,
+    PwnedRangeBackend,
+    TokenBucket,
+)
+from core.exceptions import HIBPDatabaseError
+from core.hibp_cache import RangeCache
+from core.hibp_offline import OfflineRangeDatabase, build_offline_database
+
+
+def sha1_hex(password):
+    return hashlib.sha1(password.encode('utf-8')).hexdigest().upper()
+
+
+class TestOfflineRangeDatabase(unittest.TestCase):
+
+    def setUp(self):
+        """Builds a small sorted dump and its binary database in a temp dir."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dump_path = os.path.join(self.tmp.name, "pwned.txt")
+        self.db_path = os.path.join(self.tmp.name, "pwned.hpdb")
+
+        self.leaked = {"password": 2500, "123456": 37000000, "letmein": 12}
+        # Neighbours sharing the prefix of "password" exercise the binary search.
+        prefix = sha1_hex("password")[:5]
+        records = {sha1_hex(p): c for p, c in self.leaked.items()}
+        records.update({prefix + f"{i:035X}": i + 1 for i in range(50)})
+        with open(self.dump_path, "w", encoding="ascii") as f:
+            for h in sorted(records):
+                f.write(f"{h}:{records[h]}\n")
+        self.record_count = len(records)
+        self.db = None
+
+    def tearDown(self):
+        if self.db:
+            self.db.close()
+        PasswordAuditor.set_backend(None)
+        self.tmp.cleanup()
+
+    def test_import_and_lookup(self):
+        """Imported hashes are found with their counts; unknown hashes return 0."""
+        self.assertEqual(build_offline_database(self.dump_path, self.db_path), self.record_count)
+        self.db = OfflineRangeDatabase(self.db_path)
+
+        for password, count in self.leaked.items():
+            h = sha1_hex(password)
+            self.assertEqual(self.db.lookup(h[:5], h[5:]), count)
+
+        safe = sha1_hex("Correct-Horse-Battery-Staple-42")
+        self.assertEqual(self.db.lookup(safe[:5], safe[5:]), 0)
+
+    def test_password_auditor_uses_offline_backend(self):
+        """check_pwned answers from the local database without any network access."""
+        build_offline_database(self.dump_path, self.db_path)
+        self.db = OfflineRangeDatabase(self.db_path)
+        PasswordAuditor.set_backend(self.db)
+
+        self.assertEqual(PasswordAuditor.check_pwned("letmein"), 12)
+        self.assertEqual(PasswordAuditor.check_pwned("not-in-the-dump"), 0)
+
+        class NoLookup(PwnedRangeBackend):
+            pass
+
+        # A backend without lookup fails when created, not on its first query.
+        with self.assertRaises(TypeError):
+            NoLookup()
+
+    def test_unsorted_dump_and_missing_database_are_rejected(self):
+        """Import requires hash order; a missing database raises a clear error."""
+        with open(self.dump_path, "a", encoding="ascii") as f:
+            f.write("0000000000000000000000000000000000000001:1\n")
+        with self.assertRaises(HIBPDatabaseError):
+            build_offline_database(self.dump_path, self.db_path)
+        self.assertFalse(os.path.exists(self.db_path + ".tmp"))
+
+        with self.assertRaises(HIBPDatabaseError):
+            OfflineRangeDatabase(self.db_path).lookup("00000", "0" * 35)
+
+
+class CountingBackend(PwnedRangeBackend):
+    """In-memory backend that records every range query it receives."""
+
+    def __init__(self, leaked):
+        self.leaked = {sha1_hex(p): c for p, c in leaked.items()}
+        self.queried = []
+        self.lock = threading.Lock()
+
+    def lookup(self, prefix, suffix):
+        return self.range_counts(prefix, [suffix])[suffix]
+
+    def range_counts(self, prefix, suffixes):
+        with self.lock:
+            self.queried.append(prefix)
+        return {s: self.leaked.get(prefix + s, 0) for s in suffixes}
+
+
+class TestBreachScanner(unittest.TestCase):
+
+    def test_scan_fetches_each_prefix_once_and_reports_every_entry(self):
+        """Entries sharing a SHA-1 prefix are answered by a single range query."""
+        backend = CountingBackend({"password": 2500, "letmein": 12})
+        items = [(0, "password"), (1, "unique-pass-1"), (2, "password"), (3, "letmein")]
+
+        results = dict(BreachScanner(backend, workers=4).scan(items))
+
+        self.assertEqual(results, {0: 2500, 1: 0, 2: 2500, 3: 12})
+        self.assertEqual(sorted(backend.queried), sorted({sha1_hex(p)[:5] for _, p in items}))
+
+    @patch('core.auditor.requests.Session.get')
+    def test_online_backend_reuses_pooled_session(self, mock_get):
+        """The online backend issues one GET per range through its shared session."""
+        pwned = sha1_hex("password")
+
+        class MockResponse:
+            def __init__(self, text):
+                self.text = text
+
+            def raise_for_status(self):
+                pass
+
+        mock_get.side_effect = lambda url, *a, **kw: MockResponse(
+            f"{pwned[5:]}:2500" if url.endswith(pwned[:5]) else "")
+        backend = OnlineRangeBackend(rate=0, pool_size=4)
+
+        results = dict(BreachScanner(backend).scan([(0, "password"), (1, "password"), (2, "x")]))
+
+        self.assertEqual(results, {0: 2500, 1: 2500, 2: 0})
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_token_bucket_limits_request_rate(self):
+        """Beyond the burst capacity, acquisitions are spaced at 1/rate seconds."""
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+
+class TestRangeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "vault.hpro.hibpcache")
+        self.key = os.urandom(32)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ttl_and_size_bounded_lru_eviction(self):
+        """Expired ranges miss; the least recently used range is evicted first."""
+        cache = RangeCache(ttl=60, max_bytes=10)
+        cache.put("AAAAA", "1234")
+        cache.put("BBBBB", "5678")
+        cache.get("AAAAA")
+        cache.put("CCCCC", "9012")
+        self.assertIsNone(cache.get("BBBBB"))
+        self.assertEqual(cache.get("AAAAA"), "1234")
+
+        cache.put("DDDDD", "x", fetched_at=time.time() - 120)
+        self.assertIsNone(cache.get("DDDDD"))
+
+    def test_persisted_cache_is_encrypted_and_keyed(self):
+        """Ranges survive a restart only for the right key and are not stored in clear."""
+        cache = RangeCache()
+        cache.attach(self.path, self.key)
+        cache.put("ABCDE", "0018A45C4D1DEF81644B54AB7F969B88D65:10")
+        cache.save()
+
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        self.assertNotIn(b"ABCDE", raw)
+        self.assertNotIn(b"0018A45C4D1DEF81644B54AB7F969B88D65", raw)
+
+        restored = RangeCache()
+        restored.attach(self.path, self.key)
+        self.assertEqual(restored.get("ABCDE"), "0018A45C4D1DEF81644B54AB7F969B88D65:10")
+
+        other = RangeCache()
+        other.attach(self.path, os.urandom(32))
+        self.assertEqual(len(other), 0)
+        self.assertFalse(os.path.exists(self.path))
+
+    @patch('core.auditor.requests.Session.get')
+    def test_repeated_scans_hit_the_cache(self, mock_get):
+        """A second scan (even after a restart) does not refetch known prefixes."""
+        mock_get.return_value.text = ""
+        mock_get.return_value.raise_for_status = lambda: None
+        items = [(0, "password"), (1, "letmein")]
+
+        backend = OnlineRangeBackend(rate=0)
+        backend.cache.attach(self.path, self.key)
+        list(BreachScanner(backend).scan(items))
+        list(BreachScanner(backend).scan(items))
+        self.assertEqual(mock_get.call_count, 2)
+        backend.cache.save()
+
+        restarted = OnlineRangeBackend(rate=0)
+        restarted.cache.attach(self.path, self.key)
+        list(BreachScanner(restarted).scan(items))
+        self.assertEqual(mock_get.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()